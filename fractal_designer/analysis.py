@@ -0,0 +1,229 @@
+"""
+Contractivity analysis of an IFS, run before any points are computed. The operator norm of a map's linear part bounds
+how much it can stretch distances, and its spectral radius is how much its iterates stretch them in the long run.
+Over all products of k maps, the largest norm to the power 1/k bounds the contraction factor of the whole system from
+above, and the largest spectral radius to the power 1/k bounds it from below. A discrete system whose lower bound
+reaches 1 has no attractor. The chaos game only needs its maps to contract on average, which holds when the expected
+log-norm of those products, weighted by their probabilities, is negative.
+
+For a system that does contract, the attractor lies in a box found by mapping a box around the fixed points with
+every map and taking the bounding box of the images until it stops shrinking. The contraction rate also sets the
+number of burn-in steps the chaos game needs before its chains are within a tiny fraction of that box from the
+attractor.
+"""
+
+import functools
+import math
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+import numpy as np
+
+from fractal_designer.engine import ChaosGame, NDArrayFloat64, normalize_weights, stack_transformations
+from fractal_designer.raster import Bounds
+from fractal_designer.viewport import invariant_ball
+
+# Products of up to this many maps are examined, as long as there are at most MAX_PRODUCTS of them
+MAX_PRODUCT_DEPTH = 6
+MAX_PRODUCTS = 4096
+MAX_BOX_ITERATIONS = 500
+BOX_TOLERANCE = 1e-6
+# Burn-in brings the chains this close to the attractor, relative to the size of its bounding box
+BURN_IN_TOLERANCE = 1e-6
+MIN_BURN_IN = 8
+MAX_BURN_IN = 2000
+PILOT_POINTS = 20_000
+PILOT_TAIL = 0.002
+
+Coefficients = tuple[tuple[float, float, float, float, float, float], ...]
+
+
+@dataclass(frozen=True)
+class SystemAnalysis:
+    norms: NDArrayFloat64
+    spectral_radii: NDArrayFloat64
+    # (N, 2) fixed point of every map, NaN where the map has none
+    fixed_points: NDArrayFloat64
+    # Upper and lower bounds on the contraction factor of the whole system
+    contraction: float
+    contraction_lower: float
+    # Expected log-contraction of one chaos-game step, negative when the game converges; None in discrete mode
+    lyapunov: float | None
+    bounds: Bounds | None
+    burn_in: int
+
+    @property
+    def contractive(self) -> bool:
+        """Whether the system is proven to converge."""
+        if self.lyapunov is not None:
+            return self.lyapunov < 0
+        return self.contraction < 1
+
+    @property
+    def divergent(self) -> bool:
+        """
+        Whether the system is turned away. A discrete system is only turned away once some product of maps grows in
+        the long run, so one whose bounds straddle 1 is drawn without a proof that it converges.
+        """
+        if self.lyapunov is not None:
+            return not self.contractive
+        return self.contraction_lower >= 1
+
+    def problem(self) -> str | None:
+        """Why the system cannot be drawn, or None if it can."""
+        if not self.divergent:
+            return None
+        expanding = [index for index, radius in enumerate(self.spectral_radii) if radius >= 1]
+        culprit = ""
+        if expanding:
+            radius = self.spectral_radii[expanding[0]]
+            culprit = f" Transformation {expanding[0]} on its own scales by {radius:.3g} in the long run."
+        if self.lyapunov is not None:
+            return (
+                f"This system does not contract on average (rate {math.exp(self.lyapunov):.3g} per step), so the "
+                f"chaos game would run off to infinity.{culprit} Scale down a-d or lower the probabilities of the "
+                "transformations that expand."
+            )
+        return (
+            f"This system does not shrink distances (it scales them by at least {self.contraction_lower:.3g} per "
+            f"iteration), so it has no attractor.{culprit} Scale down a-d until every transformation shrinks."
+        )
+
+    def caveat(self) -> str | None:
+        """A warning for a system that is drawn although it is not proven to converge, or None."""
+        if self.contractive or self.divergent:
+            return None
+        return (
+            f"This system is not proven to shrink distances: no transformation grows in the long run, but products of "
+            f"up to {MAX_PRODUCT_DEPTH} of them still stretch distances by up to {self.contraction:.3g}. It is drawn "
+            "within the memory budget, and deeper iterations may not settle."
+        )
+
+
+def norms_and_radii(linear: NDArrayFloat64) -> tuple[NDArrayFloat64, NDArrayFloat64]:
+    """Operator norms and spectral radii of a stack of 2x2 matrices, in closed form."""
+    a, b, c, d = linear[:, 0, 0], linear[:, 0, 1], linear[:, 1, 0], linear[:, 1, 1]
+    frobenius, determinant, trace = a * a + b * b + c * c + d * d, a * d - b * c, a + d
+    norms = np.sqrt((frobenius + np.sqrt(np.maximum(frobenius**2 - 4 * determinant**2, 0))) / 2)
+    # Complex eigenvalues come in a conjugate pair, whose modulus is the square root of the determinant
+    discriminant = trace**2 / 4 - determinant
+    root = np.sqrt(np.abs(discriminant))
+    radii = np.where(discriminant >= 0, np.abs(trace) / 2 + root, np.sqrt(np.abs(determinant)))
+    return norms, radii
+
+
+def product_norms(
+    linear: NDArrayFloat64, probabilities: NDArrayFloat64
+) -> list[tuple[NDArrayFloat64, NDArrayFloat64, NDArrayFloat64]]:
+    """Operator norms, spectral radii and probabilities of every product of k maps, for k = 1, 2, ..."""
+    levels: list[tuple[NDArrayFloat64, NDArrayFloat64, NDArrayFloat64]] = []
+    products, weights = linear, probabilities
+    for _ in range(MAX_PRODUCT_DEPTH):
+        levels.append((*norms_and_radii(products), weights))
+        if len(products) * len(linear) > MAX_PRODUCTS:
+            break
+        products = np.einsum("mij,kjl->mkil", products, linear).reshape(-1, 2, 2)
+        weights = (weights[:, np.newaxis] * probabilities).reshape(-1)
+    return levels
+
+
+def fixed_points(maps: NDArrayFloat64) -> NDArrayFloat64:
+    linear, translation = maps[:, :, :2], maps[:, :, 2]
+    points = np.full([len(maps), 2], np.nan)
+    regular = np.abs(np.linalg.det(np.eye(2)[np.newaxis] - linear)) > 1e-12
+    if regular.any():
+        points[regular] = np.linalg.solve(
+            np.eye(2)[np.newaxis] - linear[regular], translation[regular][:, :, np.newaxis]
+        )[:, :, 0]
+    return points
+
+
+def attractor_bounds(maps: NDArrayFloat64) -> Bounds | None:
+    """
+    A box that contains the attractor: start from the box around an invariant disc, which the fixed points are inside,
+    and replace it by the bounding box of its images until it settles. None when no invariant disc exists.
+    """
+    ball = invariant_ball(maps)
+    if ball is None:
+        return None
+    linear, translation = maps[:, :, :2], maps[:, :, 2]
+    low, high = ball.center - ball.radius, ball.center + ball.radius
+    for _ in range(MAX_BOX_ITERATIONS):
+        center, half = (low + high) / 2, (high - low) / 2
+        # The image of a box under x -> Ax + t is centered on A c + t with half extents |A| h
+        centers = linear @ center + translation
+        halves = np.abs(linear) @ half
+        new_low, new_high = (centers - halves).min(axis=0), (centers + halves).max(axis=0)
+        settled = np.max(np.abs(new_low - low) + np.abs(new_high - high)) <= BOX_TOLERANCE * max(
+            float(np.max(high - low)), 1e-12
+        )
+        low, high = np.maximum(low, new_low), np.minimum(high, new_high)
+        if settled:
+            break
+    return float(low[0]), float(high[0]), float(low[1]), float(high[1])
+
+
+def pilot_bounds(maps: NDArrayFloat64, weights: Sequence[float], burn_in: int) -> Bounds | None:
+    """
+    Box around all but PILOT_TAIL of the points of a short chaos game, for systems that only contract on average. Their
+    chains make rare, arbitrarily long excursions, which would otherwise set the scale.
+    """
+    pilot = ChaosGame(maps, weights, burn_in=burn_in, seed=0).advance(PILOT_POINTS)
+    finite = np.isfinite(pilot.x) & np.isfinite(pilot.y)
+    if not finite.any():
+        return None
+    (x_min, x_max), (y_min, y_max) = (
+        np.quantile(values[finite], [PILOT_TAIL / 2, 1 - PILOT_TAIL / 2]) for values in (pilot.x, pilot.y)
+    )
+    return float(x_min), float(x_max), float(y_min), float(y_max)
+
+
+def burn_in_steps(rate: float, bounds: Bounds | None) -> int:
+    """Steps for chains started in the unit square to come within BURN_IN_TOLERANCE of the attractor."""
+    if rate >= 0:
+        return MAX_BURN_IN
+    if bounds is None:
+        spread = 1.0
+    else:
+        x_min, x_max, y_min, y_max = bounds
+        spread = max(x_max, 1.0) - min(x_min, 0.0) + max(y_max, 1.0) - min(y_min, 0.0)
+    steps = math.ceil(math.log(BURN_IN_TOLERANCE / spread) / rate) if rate > -math.inf else 1
+    return min(max(steps, MIN_BURN_IN), MAX_BURN_IN)
+
+
+@functools.lru_cache(maxsize=256)
+def analyze_system(coefficients: Coefficients, weights: tuple[float, ...] | None = None) -> SystemAnalysis:
+    """Analyze the maps of coefficients. Without weights the system is judged as a discrete one."""
+    maps = stack_transformations(coefficients)
+    linear = maps[:, :, :2]
+    probabilities = normalize_weights(weights or (1.0,) * len(maps), len(maps))
+    levels = product_norms(linear, probabilities)
+
+    # Every product bounds the contraction factor of the system from above by its norm and from below by its spectral
+    # radius, taken to the power 1 / length
+    contraction = min(float(np.max(norms)) ** (1 / k) for k, (norms, _, _) in enumerate(levels, 1))
+    contraction_lower = max(float(np.max(radii)) ** (1 / k) for k, (_, radii, _) in enumerate(levels, 1))
+
+    lyapunov = None
+    if weights is not None:
+        # Maps that are never chosen do not take part in the chaos game
+        lyapunov = min(
+            float(np.sum(chance[chance > 0] * np.log(np.maximum(norms[chance > 0], 1e-300)))) / k
+            for k, (norms, _, chance) in enumerate(levels, 1)
+        )
+    rate = lyapunov if lyapunov is not None else math.log(max(contraction, 1e-300))
+
+    bounds = attractor_bounds(maps)
+    if bounds is None and weights is not None and rate < 0:
+        bounds = pilot_bounds(maps, weights, burn_in_steps(rate, None))
+
+    return SystemAnalysis(
+        norms=levels[0][0],
+        spectral_radii=levels[0][1],
+        fixed_points=fixed_points(maps),
+        contraction=contraction,
+        contraction_lower=contraction_lower,
+        lyapunov=lyapunov,
+        bounds=bounds,
+        burn_in=burn_in_steps(rate, bounds),
+    )
@@ -0,0 +1,343 @@
+"""
+Parameter-sweep animations that morph one IFS into another. The a-f coefficients and probabilities are interpolated
+linearly over F frames, and every frame plays the chaos game with the same starting points and the same sequence of
+uniform random numbers, so a point only moves between frames because the maps moved. This removes the flicker of
+independently seeded frames, and it lets all frames advance together as (F, chains) arrays that share one random draw
+per step:
+
+    python -m fractal_designer.animation gallery.toml --start triangle --end fern --frames 60 --output morph
+
+A system with fewer transformations is padded with copies of its last map at probability zero, which then fade in.
+"""
+
+import argparse
+import sys
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import plotly.colors
+import plotly.graph_objects as go
+from plotly.basedatatypes import BaseTraceType
+
+from fractal_designer.engine import (
+    DEFAULT_BURN_IN,
+    NDArrayFloat32,
+    NDArrayFloat64,
+    NDArrayInt8,
+    _check,  # pyright: ignore [reportPrivateUsage]
+    stack_transformations,
+)
+from fractal_designer.raster import (
+    Bounds,
+    NDArrayUInt32,
+    density_trace,
+    encode_plot_png,
+    finite_bounds,
+    square_view,
+    tone_map,
+)
+from fractal_designer.render import load_definitions
+
+DEFAULT_FRAMES = 30
+DEFAULT_POINTS = 200_000
+DEFAULT_NUM_CHAINS = 1024
+DEFAULT_RESOLUTION = (400, 400)
+# Points computed per batch across all frames, which bounds the memory of a batch independently of F
+BATCH_POINTS = 4_000_000
+BOUNDS_PADDING = 0.02
+
+Coefficients = Sequence[Sequence[float]]
+
+
+@dataclass(frozen=True)
+class Sweep:
+    maps: NDArrayFloat64
+    weights: NDArrayFloat64
+
+    def __len__(self) -> int:
+        return len(self.maps)
+
+
+@dataclass(frozen=True)
+class SweepResult:
+    counts: NDArrayUInt32
+    bounds: Bounds
+    num_points: int
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    @property
+    def nbytes(self) -> int:
+        return self.counts.nbytes
+
+
+def _padded_system(
+    coefficients: Coefficients, weights: Sequence[float] | None, size: int
+) -> tuple[NDArrayFloat64, NDArrayFloat64]:
+    maps = stack_transformations(coefficients)
+    probabilities = np.full(len(maps), 1 / len(maps)) if weights is None else np.asarray(weights, dtype=np.float64)
+    padding = size - len(maps)
+    return (
+        np.concatenate([maps, np.repeat(maps[-1:], padding, axis=0)]),
+        np.concatenate([probabilities / probabilities.sum(), np.zeros(padding)]),
+    )
+
+
+def interpolate(
+    start: Coefficients,
+    end: Coefficients,
+    num_frames: int,
+    start_weights: Sequence[float] | None = None,
+    end_weights: Sequence[float] | None = None,
+) -> Sweep:
+    """Linear interpolation from one system to another over num_frames frames that include both ends."""
+    size = max(len(start), len(end))
+    start_maps, start_probabilities = _padded_system(start, start_weights, size)
+    end_maps, end_probabilities = _padded_system(end, end_weights, size)
+
+    t = np.linspace(0, 1, max(num_frames, 1))
+    maps = start_maps + t[:, np.newaxis, np.newaxis, np.newaxis] * (end_maps - start_maps)
+    weights = start_probabilities + t[:, np.newaxis] * (end_probabilities - start_probabilities)
+    return Sweep(maps, weights / weights.sum(axis=1, keepdims=True))
+
+
+class SweepChaosGame:
+    """
+    The chaos game for every frame of a sweep at once. Frame f and chain c share the uniform u drawn for chain c at
+    each step, and pick the map whose cumulative probability interval in frame f contains u, so neighboring frames
+    pick the same map almost everywhere and their chains stay close.
+    """
+
+    def __init__(
+        self,
+        sweep: Sweep,
+        *,
+        num_chains: int = DEFAULT_NUM_CHAINS,
+        burn_in: int = DEFAULT_BURN_IN,
+        seed: int | np.random.Generator | None = None,
+    ):
+        self.sweep = sweep
+        self.num_chains = max(1, num_chains)
+        self.num_points = 0
+        self.rng = np.random.default_rng(seed)
+        # (N - 1, F) thresholds between consecutive maps. A map with probability zero has an empty interval and is
+        # never picked
+        self.thresholds = np.cumsum(sweep.weights, axis=1)[:, :-1].T.astype(np.float32)
+
+        start = self.rng.random([2, 1, self.num_chains], dtype=np.float32)
+        self.x: NDArrayFloat32 = np.repeat(start[0], len(sweep), axis=0)
+        self.y: NDArrayFloat32 = np.repeat(start[1], len(sweep), axis=0)
+        self._iterate(self.rng.random([burn_in, self.num_chains], dtype=np.float32))
+
+    def _iterate(
+        self,
+        uniforms: NDArrayFloat32,
+        x_out: NDArrayFloat32 | None = None,
+        y_out: NDArrayFloat32 | None = None,
+        indices_out: NDArrayInt8 | None = None,
+        should_stop: Callable[[], bool] | None = None,
+    ) -> None:
+        # Each coefficient as one flat array over frames and maps, indexed by frame * N + map. Frames are compared
+        # visually rather than summed over millions of steps, so float32 state is precise enough and halves the traffic
+        num_frames, num_maps = self.sweep.maps.shape[:2]
+        coefficients = self.sweep.maps.reshape(num_frames * num_maps, 6).T.astype(np.float32)
+        # int8 offsets keep the flat indices int8 too when every index fits
+        offsets: np.typing.NDArray[np.int8 | np.intp] = np.arange(num_frames, dtype=np.intp) * num_maps
+        if num_frames * num_maps <= 127:
+            offsets = offsets.astype(np.int8)
+        x, y = self.x, self.y
+
+        for step, u in enumerate(uniforms):
+            _check(should_stop)
+            idx = np.zeros([num_frames, self.num_chains], dtype=np.int8)
+            for threshold in self.thresholds:
+                idx += u >= threshold[:, np.newaxis]
+
+            flat = idx + offsets[:, np.newaxis]
+            a, b, e, c, d, f = (np.take(coefficient, flat) for coefficient in coefficients)
+            x, y = a * x + b * y + e, c * x + d * y + f
+            if x_out is not None and y_out is not None and indices_out is not None:
+                x_out[:, step] = x
+                y_out[:, step] = y
+                indices_out[:, step] = idx
+
+        # Every operand is float32, so these return x and y themselves and only tell the type checker so
+        self.x, self.y = x.astype(np.float32, copy=False), y.astype(np.float32, copy=False)
+
+    def advance(
+        self, num_steps: int, should_stop: Callable[[], bool] | None = None
+    ) -> tuple[NDArrayFloat32, NDArrayFloat32, NDArrayInt8]:
+        """The next num_steps steps of every chain in every frame, as (F, num_steps * chains) x, y and map indices."""
+        shape = (len(self.sweep), num_steps, self.num_chains)
+        x_out = np.empty(shape, dtype=np.float32)
+        y_out = np.empty(shape, dtype=np.float32)
+        indices_out = np.empty(shape, dtype=np.int8)
+        self._iterate(
+            self.rng.random([num_steps, self.num_chains], dtype=np.float32), x_out, y_out, indices_out, should_stop
+        )
+        self.num_points += num_steps * self.num_chains
+        frames = len(self.sweep)
+        return x_out.reshape(frames, -1), y_out.reshape(frames, -1), indices_out.reshape(frames, -1)
+
+
+def sweep_density(
+    sweep: Sweep,
+    num_points: int = DEFAULT_POINTS,
+    resolution: tuple[int, int] = DEFAULT_RESOLUTION,
+    bounds: Bounds | None = None,
+    *,
+    num_chains: int = DEFAULT_NUM_CHAINS,
+    seed: int | None = None,
+    should_stop: Callable[[], bool] | None = None,
+) -> SweepResult:
+    """
+    (F, C, H, W) density histograms of num_points points per frame. Without bounds, the view is fitted to the first
+    batch of every frame.
+    """
+    width, height = resolution
+    num_frames = len(sweep)
+    num_transformations = sweep.maps.shape[1]
+    game = SweepChaosGame(sweep, num_chains=num_chains, seed=seed)
+    counts = np.zeros([num_frames, num_transformations, height, width], dtype=np.uint32)
+    steps_per_batch = max(1, BATCH_POINTS // (num_frames * game.num_chains))
+
+    while game.num_points < num_points:
+        remaining = num_points - game.num_points
+        x, y, indices = game.advance(min(steps_per_batch, -(-remaining // game.num_chains)), should_stop)
+        x, y, indices = x[:, :remaining], y[:, :remaining], indices[:, :remaining]
+        if bounds is None:
+            # One view around every frame, so that it does not move during the animation
+            bounds = square_view(finite_bounds(x, y) or (0.0, 1.0, 0.0, 1.0), BOUNDS_PADDING)
+
+        x_min, x_max, y_min, y_max = bounds
+        columns = ((x - x_min) * (width / (x_max - x_min))).astype(np.intp)
+        rows = ((y - y_min) * (height / (y_max - y_min))).astype(np.intp)
+        # Points outside the view go to one extra bin past the end, which is cheaper than compressing them away
+        size = num_transformations * height * width
+        flat = (indices.astype(np.intp) * height + rows) * width + columns
+        flat[(columns < 0) | (columns >= width) | (rows < 0) | (rows >= height)] = size
+        for frame in range(num_frames):
+            histogram = np.bincount(flat[frame], minlength=size + 1)[:size]
+            counts[frame] += histogram.reshape(counts[frame].shape).astype(np.uint32)
+
+    return SweepResult(counts, bounds or (0.0, 1.0, 0.0, 1.0), min(game.num_points, num_points))
+
+
+def frame_traces(
+    result: SweepResult, colors: Sequence[str], should_stop: Callable[[], bool] | None = None
+) -> list[BaseTraceType]:
+    """One Image trace per frame, tone mapped and encoded a frame at a time."""
+    traces: list[BaseTraceType] = []
+    for counts in result.counts:
+        _check(should_stop)
+        traces.append(density_trace(tone_map(counts, colors), result.bounds))
+    return traces
+
+
+def sweep_traces(
+    sweep: Sweep,
+    colors: Sequence[str],
+    num_points: int = DEFAULT_POINTS,
+    resolution: tuple[int, int] = DEFAULT_RESOLUTION,
+    *,
+    seed: int | None = None,
+    should_stop: Callable[[], bool] | None = None,
+) -> tuple[list[BaseTraceType], Bounds]:
+    """
+    The encoded frames of a sweep and the view they share. The histograms of every frame are far larger than their
+    images, so they are dropped as soon as the frames are encoded.
+    """
+    result = sweep_density(sweep, num_points, resolution, seed=seed, should_stop=should_stop)
+    return frame_traces(result, colors, should_stop), result.bounds
+
+
+def animation_figure(traces: Sequence[BaseTraceType], bounds: Bounds, frame_duration: int = 100) -> go.Figure:
+    """A standalone Plotly figure with one frame per trace, a play button and a frame slider."""
+    x_min, x_max, y_min, y_max = bounds
+    play = {"frame": {"duration": frame_duration, "redraw": True}, "fromcurrent": True, "transition": {"duration": 0}}
+    pause = {"frame": {"duration": 0, "redraw": False}, "mode": "immediate"}
+    return go.Figure(
+        data=[traces[0]],
+        frames=[{"data": [trace], "name": str(index)} for index, trace in enumerate(traces)],
+        layout=go.Layout(
+            xaxis={"range": [x_min, x_max], "showgrid": False},
+            yaxis={"range": [y_min, y_max], "showgrid": False, "scaleanchor": "x"},
+            updatemenus=[
+                {
+                    "type": "buttons",
+                    "buttons": [
+                        {"label": "Play", "method": "animate", "args": [None, play]},
+                        {"label": "Pause", "method": "animate", "args": [[None], pause]},
+                    ],
+                }
+            ],
+            sliders=[
+                {
+                    "steps": [
+                        {"label": str(index), "method": "animate", "args": [[str(index)], pause]}
+                        for index in range(len(traces))
+                    ]
+                }
+            ],
+        ),
+    )
+
+
+def write_frames(result: SweepResult, directory: Path, colors: Sequence[str]) -> list[Path]:
+    """Write every frame as a numbered PNG file and return the paths in order."""
+    directory.mkdir(parents=True, exist_ok=True)
+    digits = len(str(len(result) - 1))
+    paths: list[Path] = []
+    for index, counts in enumerate(result.counts):
+        path = directory / f"frame_{index:0{digits}d}.png"
+        path.write_bytes(encode_plot_png(tone_map(counts, colors)))
+        paths.append(path)
+    return paths
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m fractal_designer.animation", description="Render a morph between two IFS definitions."
+    )
+    parser.add_argument("definitions", type=Path, help="JSON or TOML file of IFS definitions")
+    parser.add_argument("--start", help="name of the first definition (default: the first in the file)")
+    parser.add_argument("--end", help="name of the last definition (default: the second in the file)")
+    parser.add_argument("-f", "--frames", type=int, default=DEFAULT_FRAMES, help="number of frames")
+    parser.add_argument("-n", "--points", type=int, default=DEFAULT_POINTS, help="chaos-game points per frame")
+    parser.add_argument("-o", "--output", type=Path, default=Path("frames"), help="directory for the PNG frames")
+    parser.add_argument("--html", type=Path, default=None, help="also write a Plotly animation to this HTML file")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the shared random numbers")
+    parser.add_argument(
+        "--cdn", action="store_true", help="load plotly.js from a CDN instead of embedding it in the HTML file"
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        definitions = {definition.name: definition for definition in load_definitions(args.definitions)}
+        names = list(definitions)
+        start = definitions[args.start or names[0]]
+        end = definitions[args.end or names[1]]
+    except (OSError, ValueError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+    except (KeyError, IndexError):
+        print("error: the file needs two definitions, or --start and --end must name existing ones", file=sys.stderr)
+        return 1
+
+    sweep = interpolate(start.coefficients, end.coefficients, args.frames, start.weights, end.weights)
+    result = sweep_density(sweep, args.points, seed=args.seed)
+    colors = plotly.colors.qualitative.G10
+    paths = write_frames(result, args.output, colors)
+    print(f"{len(paths)} frames of {args.points} points -> {args.output}")
+    if args.html is not None:
+        figure = animation_figure(frame_traces(result, colors), result.bounds)
+        figure.write_html(args.html, include_plotlyjs="cdn" if args.cdn else True)
+        print(f"animation -> {args.html}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
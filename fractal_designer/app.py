@@ -7,70 +7,137 @@ manipulation purposes.
 Author: Alexander Kral
 """
 
-import random
-from typing import Callable
+import time
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, replace
+from typing import Literal, cast
 
 import numpy as np
-import plotly.express as px
+import plotly.colors
 import plotly.graph_objects as go
-
+from plotly.basedatatypes import BaseTraceType
 from shiny import App, Inputs, Outputs, Session, module, reactive, render, ui
 from shinywidgets import output_widget, render_widget
+from starlette.applications import Starlette
+from starlette.routing import BaseRoute, Mount, Route
+
+from fractal_designer.analysis import SystemAnalysis, analyze_system
+from fractal_designer.assets import ASSET_PREFIX, load_assets
+from fractal_designer.backends import get_backend
+from fractal_designer.cache import attractor_cache, attractor_key
+from fractal_designer.dimension import BoxCounter, DimensionEstimate
+from fractal_designer.engine import DEFAULT_BURN_IN, ChaosResult, DiscreteResult, stack_transformations
+from fractal_designer.jobs import CancelToken, QueueFullError, job_runner
+from fractal_designer.lod import level_of_detail
+from fractal_designer.metrics import RenderTimings, metrics_endpoint, render_metrics
+from fractal_designer.parallel import DensityResult, default_workers, sharded_density
+from fractal_designer.presets import PRESETS, Preset
+from fractal_designer.raster import (
+    Bounds,
+    NDArrayUInt32,
+    accumulate_density,
+    density_trace,
+    empty_density,
+    square_view,
+    tone_map,
+)
+from fractal_designer.traces import lod_traces, point_traces
+from fractal_designer.transport import compact, group_by_index
+from fractal_designer.viewport import ViewportChaosGame
+
+FORMULA = (
+    "\\begin{bmatrix} a & b \\\\ c & d \\end{bmatrix} \\times "
+    "\\begin{bmatrix} x \\\\ y \\end{bmatrix} + "
+    "\\begin{bmatrix} e \\\\ f \\end{bmatrix}"
+)
+
+
+@dataclass(frozen=True)
+class RenderRequest:
+    mode: str
+    coefficients: tuple[tuple[float, float, float, float, float, float], ...]
+    weights: tuple[float, ...] | None
+    iterations: int
+    viewport: Bounds = (0.0, 1.0, 0.0, 1.0)
+    render_mode: str = "points"
+    workers: int = 1
+    # Chaos-game steps discarded before the first point, from the contraction rate of the system
+    burn_in: int = DEFAULT_BURN_IN
+
+
+@dataclass(frozen=True)
+class Drawing:
+    """A computed result and the traces that draw it, both built in the job pool."""
+
+    result: DiscreteResult | ChaosResult | DensityResult
+    traces: Sequence[BaseTraceType]
+    # Measured in the job and added to the timings of the render once it is drawn
+    timings: RenderTimings
 
 
-NDArrayFloat32 = np.typing.NDArray[np.float32]
+@dataclass
+class ProgressiveRender:
+    key: str
+    game: ViewportChaosGame
+    target: int
+    render_mode: str
+    bounds: Bounds
+    counts: NDArrayUInt32
+    num_transformations: int
+    token: CancelToken
+    timings: RenderTimings
+    counter: BoxCounter | None = None
+
+
+class DesignerSession:
+    """
+    Mutable state belonging to one browser session. FractalDesigner itself only holds the UI tree and other resources
+    that every session can share, and server() creates one of these per connection.
+    """
+
+    def __init__(self):
+        self.num_transformations: reactive.Value[int] = reactive.value(0)
+        self.transformation_servers: reactive.Value[list[reactive.Value[list[reactive.Value[float]]]]] = reactive.value(
+            []
+        )
+        self.card_servers: list[reactive.Value[list[reactive.Value[float]]]] = []
+        self.active_request: reactive.Value[RenderRequest | None] = reactive.value(None)
+        self.progressive: reactive.Value[ProgressiveRender | None] = reactive.value(None)
+        self.timings: RenderTimings | None = None
+        self.last_timings: reactive.Value[dict[str, object] | None] = reactive.value(None)
+        self.viewport: reactive.Value[Bounds] = reactive.value(RenderRequest.viewport)
+        # The system the view was last fitted to, so that re-rendering it keeps the user's zoom
+        self.fitted: tuple[object, ...] | None = None
+        self.statistics: reactive.Value[DimensionEstimate | None] = reactive.value(None)
+        self.animation: reactive.Value[list[BaseTraceType] | None] = reactive.value(None)
+        # Live preview: the latest valid request that has not been fully rendered yet, and when it last changed
+        self.edits: reactive.Value[int] = reactive.value(0)
+        self.pending: RenderRequest | None = None
+        self.previewed = False
+        self.last_edit = 0.0
 
 
 class FractalDesigner:
     def __init__(self):
+        self.assets = load_assets(FORMULA)
         self.app_ui = ui.page_sidebar(
             ui.sidebar(
-                ui.p(
-                    """
-                            $$
-                                \\begin{bmatrix} a & b \\\\ c & d \\end{bmatrix} \\times
-                                \\begin{bmatrix} x \\\\ y \\end{bmatrix} +
-                                \\begin{bmatrix} e \\\\ f \\end{bmatrix}
-                            $$
-                        """
-                ),
-                ui.output_ui("create_transformation"),
+                ui.p(ui.HTML(self.assets.math) if self.assets.math is not None else f"$$ {FORMULA} $$"),
+                ui.div(id="transformation_cards"),
+                ui.input_switch("debug", "Show render timings"),
+                ui.panel_conditional("input.debug", ui.output_ui("debug_panel")),
                 width=500,
             ),
-            ui.head_content(
-                ui.tags.script(
-                    src="https://code.jquery.com/jquery-3.7.1.min.js",
-                    integrity="sha256-/JqT3SQfawRcv/BIHPThkBvs0OEvtFFmqPF/lYI/Cxo=",
-                    crossorigin="anonymous",
-                ),
-                ui.tags.script(
-                    src="https://cdn.jsdelivr.net/npm/webfontloader@1.6.28/webfontloader.js",
-                    integrity="sha256-4O4pS1SH31ZqrSO2A/2QJTVjTPqVe+jnYgOWUVr7EEc=",
-                    crossorigin="anonymous",
-                    defer=True,
-                ),
-                ui.tags.link(
-                    rel="stylesheet",
-                    href="https://cdn.jsdelivr.net/npm/katex@0.16.25/dist/katex.min.css",
-                    integrity="sha384-WcoG4HRXMzYzfCgiyfrySxx90XSl2rxY5mnVY5TwtWE6KLrArNKn0T/mOgNL0Mmi",
-                    crossorigin="anonymous",
-                ),
-                ui.tags.script(
-                    src="https://cdn.jsdelivr.net/npm/katex@0.16.25/dist/katex.min.js",
-                    integrity="sha384-J+9dG2KMoiR9hqcFao0IBLwxt6zpcyN68IgwzsCSkbreXUjmNVRhPFTssqdSGjwQ",
-                    crossorigin="anonymous",
-                    defer=True,
-                ),
-                ui.tags.script(
-                    src="https://cdn.jsdelivr.net/npm/katex@0.16.25/dist/contrib/auto-render.min.js",
-                    integrity="sha384-hCXGrW6PitJEwbkoStFjeJxv+fSOOQKOPbJxSfM6G5sWZjAyWhXiTIIAmQqnlLlh",
-                    crossorigin="anonymous",
-                    defer=True,
+            ui.head_content(*self.assets.head),
+            ui.div(
+                output_widget("plot"),
+                ui.card(
+                    ui.card_header("Attractor Statistics"),
+                    ui.output_ui("statistics_panel"),
+                    style="min-width: 18rem",
                 ),
-                ui.include_js("fractal_designer/js/app.js", defer=True),
-                ui.include_css("fractal_designer/css/app.min.css"),
+                class_="main-display",
             ),
-            output_widget("plot").add_class("main-display"),
             ui.div(
                 ui.input_radio_buttons("radio_mode", "Mode:", {"discrete": "Discrete", "continuous": "Continuous"}),
                 class_="main-display",
@@ -78,13 +145,30 @@ class FractalDesigner:
             ui.panel_conditional(
                 "input.radio_mode === 'discrete'",
                 ui.input_numeric(
-                    "iterations_discrete", "Number of Iterations:", 1, min=1, max=8, update_on="blur", width="20ch"
+                    "iterations_discrete",
+                    "Number of Iterations:",
+                    1,
+                    min=1,
+                    max=FractalDesigner.max_iterations_discrete,
+                    update_on="blur",
+                    width="20ch",
                 ),
             ).add_class("main-display"),
             ui.panel_conditional(
                 "input.radio_mode === 'continuous'",
                 ui.input_numeric(
-                    "iterations_continuous", "Number of Iterations:", 1, min=1, max=5000, update_on="blur", width="20ch"
+                    "iterations_continuous",
+                    "Number of Iterations:",
+                    1,
+                    min=1,
+                    max=FractalDesigner.max_iterations_continuous,
+                    update_on="blur",
+                    width="20ch",
+                ),
+                ui.input_radio_buttons("render_mode", "Render:", {"points": "Points", "density": "Density"}),
+                ui.input_switch("progressive", "Progressive rendering", value=True),
+                ui.panel_conditional(
+                    "input.render_mode === 'density'", ui.input_switch("sharded", "Use all cores", value=False)
                 ),
             ).add_class("main-display"),
             ui.div(ui.input_action_button("add_transformation", "Add Transformation"), class_="main-display"),
@@ -93,29 +177,71 @@ class FractalDesigner:
             ),
             ui.div(
                 ui.input_action_button("graph_transformations", "Graph Transformations").add_class("main-display"),
+                ui.input_switch("live_preview", "Live preview", value=False),
                 class_="main-display",
             ),
             ui.div(
                 ui.input_select(
                     "preset",
                     "Preset Fractals:",
-                    {"Discrete": {"triangle": "Sierpiński triangle"}, "Random": {"fern": "Fern"}},
+                    {
+                        "Discrete": {
+                            name: preset.label for name, preset in PRESETS.items() if preset.mode == "discrete"
+                        },
+                        "Random": {
+                            name: preset.label for name, preset in PRESETS.items() if preset.mode == "continuous"
+                        },
+                    },
                 ),
                 class_="main-display",
             ),
             ui.div(ui.input_action_button("graph_preset", "Show Preset"), class_="main-display"),
+            ui.div(
+                ui.input_select("animate_from", "Morph From:", FractalDesigner.preset_choices()),
+                ui.input_select("animate_to", "To:", FractalDesigner.preset_choices(), selected="fern"),
+                ui.input_numeric(
+                    "animation_frames",
+                    "Frames:",
+                    FractalDesigner.animation_frames,
+                    min=2,
+                    max=FractalDesigner.max_animation_frames,
+                    width="12ch",
+                ),
+                class_="main-display",
+            ),
+            ui.div(ui.input_action_button("animate", "Animate"), class_="main-display"),
+            ui.div(ui.output_ui("animation_controls"), class_="main-display"),
         )
 
-        self.num_transformations: reactive.Value[int] = reactive.value(0)
-        self.transformation_servers: reactive.Value[list[reactive.Value[list[reactive.Value[float]]]]] = reactive.value(
-            []
-        )
-        self.num_added = 0
-        self.num_removed = 0
-        self.num_preset = 0
-
     min_transformation = -2.00
     max_transformation = 2.00
+    max_transformations = 8
+    max_iterations_discrete = 30
+    max_iterations_continuous = 20_000_000
+    max_discrete_bytes = 256 * 2**20
+    density_resolution = (500, 500)
+    plot_resolution = (500, 500)
+    view_padding = 0.05
+    chaos_seed = 0
+    progressive_first_batch = 10_000
+    progressive_max_batch = 1_000_000
+    # Every point drawn as a marker is held and redrawn by the browser, so larger renders are drawn as a density image
+    max_browser_points = 1_000_000
+    shard_workers = default_workers()
+    statistics_max_level = 10
+    backend = get_backend()
+    animation_frames = 30
+    max_animation_frames = 120
+    animation_points = 200_000
+    animation_interval = 100
+    preview_debounce = 0.25
+    preview_settle = 1.0
+    preview_points = 20_000
+    preview_depth = 5
+
+    @staticmethod
+    def preset_choices() -> dict[str, str]:
+        return {name: preset.label for name, preset in PRESETS.items()}
 
     @staticmethod
     @module.ui
@@ -129,6 +255,7 @@ class FractalDesigner:
         f: float = 0,
         p: float = 0,
         hide_p: bool = True,
+        update_on: Literal["change", "blur"] = "blur",
     ) -> ui.Tag:
         return ui.card(
             ui.div(f"Transformation {transformation_num}", class_="card-title"),
@@ -141,7 +268,7 @@ class FractalDesigner:
                         min=FractalDesigner.min_transformation,
                         max=FractalDesigner.max_transformation,
                         step=0.01,
-                        update_on="blur",
+                        update_on=update_on,
                         width="10ch",
                     ),
                     class_="input-a",
@@ -154,7 +281,7 @@ class FractalDesigner:
                         min=FractalDesigner.min_transformation,
                         max=FractalDesigner.max_transformation,
                         step=0.01,
-                        update_on="blur",
+                        update_on=update_on,
                         width="10ch",
                     ),
                     class_="input-b",
@@ -167,7 +294,7 @@ class FractalDesigner:
                         min=FractalDesigner.min_transformation,
                         max=FractalDesigner.max_transformation,
                         step=0.01,
-                        update_on="blur",
+                        update_on=update_on,
                         width="10ch",
                     ),
                     class_="input-c",
@@ -180,7 +307,7 @@ class FractalDesigner:
                         min=FractalDesigner.min_transformation,
                         max=FractalDesigner.max_transformation,
                         step=0.01,
-                        update_on="blur",
+                        update_on=update_on,
                         width="10ch",
                     ),
                     class_="input-d",
@@ -193,7 +320,7 @@ class FractalDesigner:
                         min=FractalDesigner.min_transformation,
                         max=FractalDesigner.max_transformation,
                         step=0.01,
-                        update_on="blur",
+                        update_on=update_on,
                         width="10ch",
                     ),
                     class_="input-e",
@@ -206,7 +333,7 @@ class FractalDesigner:
                         min=FractalDesigner.min_transformation,
                         max=FractalDesigner.max_transformation,
                         step=0.01,
-                        update_on="blur",
+                        update_on=update_on,
                         width="10ch",
                     ),
                     class_="input-f",
@@ -219,7 +346,7 @@ class FractalDesigner:
                         min=FractalDesigner.min_transformation,
                         max=FractalDesigner.max_transformation,
                         step=0.01,
-                        update_on="blur",
+                        update_on=update_on,
                         width="10ch",
                     ),
                     class_="input-p",
@@ -227,7 +354,7 @@ class FractalDesigner:
                 class_="matrix",
             ),
             style="max-width: 20em;" if hide_p else "max-width: 25em;",
-            id="transformation",
+            id=module.resolve_id("card"),
         ).add_class("wrapper")
 
     @staticmethod
@@ -249,18 +376,139 @@ class FractalDesigner:
 
         return transformation
 
+    @staticmethod
+    def compute_request(
+        request: RenderRequest, should_stop: Callable[[], bool] | None = None
+    ) -> DiscreteResult | ChaosResult | DensityResult:
+        if request.mode == "discrete":
+            key = attractor_key(
+                "discrete",
+                request.coefficients,
+                depth=request.iterations,
+                max_bytes=FractalDesigner.max_discrete_bytes,
+                viewport=repr(request.viewport),
+            )
+            return attractor_cache.get_or_compute(
+                key,
+                lambda: FractalDesigner.backend.iterate_discrete(
+                    stack_transformations(request.coefficients),
+                    request.iterations,
+                    request.viewport,
+                    FractalDesigner.plot_resolution,
+                    max_bytes=FractalDesigner.max_discrete_bytes,
+                    should_stop=should_stop,
+                ),
+            )
+
+        maps = stack_transformations(request.coefficients)
+        if request.render_mode == "density":
+            key = attractor_key(
+                "density",
+                request.coefficients,
+                request.weights,
+                num_points=request.iterations,
+                seed=FractalDesigner.chaos_seed,
+                burn_in=request.burn_in,
+                workers=request.workers,
+                backend=FractalDesigner.backend.name,
+                viewport=repr(request.viewport),
+            )
+
+            def compute_density() -> DensityResult:
+                if request.workers > 1:
+                    return sharded_density(
+                        maps,
+                        request.weights or (),
+                        request.iterations,
+                        request.viewport,
+                        FractalDesigner.density_resolution,
+                        workers=request.workers,
+                        burn_in=request.burn_in,
+                        seed=FractalDesigner.chaos_seed,
+                        backend=FractalDesigner.backend.name,
+                        should_stop=should_stop,
+                    )
+                counts = empty_density(len(maps), FractalDesigner.density_resolution)
+                drawn = FractalDesigner.backend.accumulate_density(
+                    counts,
+                    maps,
+                    request.weights or (),
+                    request.iterations,
+                    request.viewport,
+                    burn_in=request.burn_in,
+                    seed=FractalDesigner.chaos_seed,
+                    should_stop=should_stop,
+                )
+                return DensityResult(counts, request.viewport, drawn, 1)
+
+            return attractor_cache.get_or_compute(key, compute_density)
+
+        key = attractor_key(
+            "continuous",
+            request.coefficients,
+            request.weights,
+            num_points=request.iterations,
+            seed=FractalDesigner.chaos_seed,
+            burn_in=request.burn_in,
+            viewport=repr(request.viewport),
+        )
+        return attractor_cache.get_or_compute(
+            key,
+            lambda: FractalDesigner.backend.iterate_chaos(
+                maps,
+                request.weights or (),
+                request.iterations,
+                request.viewport,
+                burn_in=request.burn_in,
+                seed=FractalDesigner.chaos_seed,
+                should_stop=should_stop,
+            ),
+        )
+
+    @staticmethod
+    def draw_request(request: RenderRequest, should_stop: Callable[[], bool] | None = None) -> Drawing:
+        """
+        Compute a request and build its traces. Level of detail, rasterizing and tone mapping can take as long as the
+        computation, so they run in the same job rather than on the event loop.
+        """
+        timings = RenderTimings(request.mode)
+        with timings.stage("compute"):
+            result = FractalDesigner.compute_request(request, should_stop)
+
+        num_transformations = len(request.coefficients)
+        colors = plotly.colors.qualitative.G10
+        traces: Sequence[BaseTraceType] = []
+        with timings.stage("traces"):
+            if isinstance(result, DiscreteResult) and len(result):
+                timings.count("polygons", len(result))
+                timings.count("vertices", len(result) * result.polygons.shape[2])
+                lod = level_of_detail(result, num_transformations, request.viewport, FractalDesigner.plot_resolution)
+                traces = lod_traces(lod, num_transformations, request.viewport, colors)
+                timings.count("rasterized", lod.num_rasterized)
+            elif isinstance(result, DensityResult) and len(result):
+                timings.count("points", len(result))
+                timings.count("workers", result.workers)
+                traces = [density_trace(tone_map(result.counts, colors), result.bounds)]
+            elif isinstance(result, ChaosResult) and len(result):
+                timings.count("points", len(result))
+                traces = point_traces(result, colors)
+        return Drawing(result, traces, timings)
+
     def server(self, input: Inputs, output: Outputs, session: Session):
-        @reactive.calc
-        def compute_transformation() -> list[tuple[int, NDArrayFloat32]] | None:
-            input.graph_transformations()
+        state = DesignerSession()
 
-            _transformation_servers = self.transformation_servers.get()
+        def read_request(quiet: bool = False) -> RenderRequest | None:
+            """The request described by the inputs, or None if they are invalid, which is explained unless quiet."""
 
-            transformations: list[NDArrayFloat32] = []
+            def show(m: ui.Tag) -> None:
+                if not quiet:
+                    ui.modal_show(m)
 
-            new_points: list[tuple[int, NDArrayFloat32]] = []
+            _transformation_servers = state.transformation_servers.get()
 
-            def validate_value(name: str, value: int | float) -> int | float:
+            coefficients: list[tuple[float, float, float, float, float, float]] = []
+
+            def validate_value(name: str, value: float) -> int | float:
                 try:
                     assert isinstance(value, (int, float))
                 except AssertionError:
@@ -269,7 +517,7 @@ class FractalDesigner:
                         title="Type Error",
                         easy_close=True,
                     )
-                    ui.modal_show(m)
+                    show(m)
                     raise ValueError
                 if (value < FractalDesigner.min_transformation) or (value > FractalDesigner.max_transformation):
                     m = ui.modal(
@@ -277,7 +525,7 @@ class FractalDesigner:
                         title="Range Error",
                         easy_close=True,
                     )
-                    ui.modal_show(m)
+                    show(m)
                     raise ValueError
                 return value
 
@@ -292,41 +540,22 @@ class FractalDesigner:
                 except ValueError:
                     return
 
-                transformations.append(
-                    np.array(
-                        [
-                            [a, b, e],
-                            [c, d, f],
-                            [0, 0, 1],
-                        ]
-                    )
-                )
+                coefficients.append((a, b, c, d, e, f))
 
             try:
-                if input.radio_mode.get() == "discrete":
-                    old_points: list[tuple[int, NDArrayFloat32]] = [
-                        (0, np.array([[0, 0, 1], [0, 1, 1], [1, 1, 1], [1, 0, 1]]).T)
-                    ]
-
-                    if input.iterations_discrete() > 8:
+                if input.radio_mode.get() == "discrete" and coefficients:
+                    if input.iterations_discrete() > FractalDesigner.max_iterations_discrete:
                         raise TypeError
 
-                    for _ in range(input.iterations_discrete()):
-                        new_points = []
-                        for polygon in old_points:
-                            for i, transformation in enumerate(transformations):
-                                new_points.append((i, transformation @ polygon[1]))
+                    return RenderRequest("discrete", tuple(coefficients), None, input.iterations_discrete())
 
-                            old_points = new_points
-
-                elif input.radio_mode.get() == "continuous" and transformations:
-                    point: NDArrayFloat32 = np.array([0, 0, 1]).T
+                elif input.radio_mode.get() == "continuous" and coefficients:
                     weights: list[float] = []
 
-                    if input.iterations_continuous() > 5000:
+                    if input.iterations_continuous() > FractalDesigner.max_iterations_continuous:
                         raise TypeError
 
-                    for server in _transformation_servers:
+                    for server_number, server in enumerate(_transformation_servers):
                         try:
                             weights.append(validate_value("p", server.get()[6]()))
                         except ValueError:
@@ -338,217 +567,657 @@ class FractalDesigner:
                             title="Probability Error",
                             easy_close=True,
                         )
-                        ui.modal_show(m)
+                        show(m)
+                        return
+
+                    if any(weight < 0 for weight in weights):
+                        m = ui.modal(
+                            "Probabilities must not be negative. Please check your input and try again.",
+                            title="Probability Error",
+                            easy_close=True,
+                        )
+                        show(m)
                         return
 
-                    for _ in range(input.iterations_continuous()):
-                        idx = range(len(transformations))
-                        transformation_idx = random.choices(idx, weights=weights)[0]
-                        transformation = transformations[transformation_idx]
-                        point = transformation @ point
-                        point = point.T
-                        new_points.append((transformation_idx, point))
+                    return RenderRequest(
+                        "continuous", tuple(coefficients), tuple(weights), input.iterations_continuous()
+                    )
             except TypeError:
                 m = ui.modal(
-                    f"The number of iterations is invalid. Valid values are numbers that range between 1 and {8 if input.radio_mode.get() == 'discrete' else 5000}",
+                    f"The number of iterations is invalid. Valid values are numbers that range between 1 and {FractalDesigner.max_iterations_discrete if input.radio_mode.get() == 'discrete' else FractalDesigner.max_iterations_continuous}",
                     title="Type Error",
                     easy_close=True,
                 )
-                ui.modal_show(m)
+                show(m)
+                return
+
+        @reactive.calc
+        def validate_transformation() -> RenderRequest | None:
+            input.graph_transformations()
+            return read_request()
+
+        def finish_render(outcome: str = "ok") -> None:
+            timings = state.timings
+            if timings is None:
+                return
+            state.timings = None
+            timings.outcome = outcome
+            render_metrics.record(timings)
+            state.last_timings.set(timings.as_dict())
+
+        @reactive.extended_task
+        async def analyze_request(
+            request: RenderRequest, timings: RenderTimings, preview: bool, quiet: bool
+        ) -> tuple[RenderRequest, SystemAnalysis, RenderTimings, bool, bool]:
+            # The analysis runs a pilot chaos game, which would stall every session if it ran on the event loop
+            with timings.stage("analyze"):
+                analysis = await job_runner.run(analyze_system, request.coefficients, request.weights)
+            return request, analysis, timings, preview, quiet
+
+        @reactive.extended_task
+        async def compute_transformation(
+            request: RenderRequest, token: CancelToken, timings: RenderTimings
+        ) -> tuple[Drawing, RenderTimings]:
+            drawing = await job_runner.run(FractalDesigner.draw_request, request, token)
+            return drawing, timings
+
+        @reactive.extended_task
+        async def advance_chaos(render: ProgressiveRender, num_points: int) -> tuple[ProgressiveRender, ChaosResult]:
+            with render.timings.stage("compute"):
+                batch = await job_runner.run(render.game.advance, num_points, render.token)
+            return render, batch
+
+        def next_batch(render: ProgressiveRender) -> int:
+            produced = render.game.num_points
+            batch = min(max(FractalDesigner.progressive_first_batch, produced), FractalDesigner.progressive_max_batch)
+            return min(batch, render.target - produced)
+
+        def start_progressive(request: RenderRequest, timings: RenderTimings) -> None:
+            key = attractor_key(
+                "continuous",
+                request.coefficients,
+                request.weights,
+                seed=FractalDesigner.chaos_seed,
+                burn_in=request.burn_in,
+                viewport=repr(request.viewport),
+            )
+            render_mode = request.render_mode
+            current = state.progressive.get()
+
+            if (
+                current is not None
+                and current.key == key
+                and current.render_mode == render_mode
+                and current.game.num_points <= request.iterations
+            ):
+                # Same system with a higher iteration count: keep what is on screen and only compute the difference
+                current.target = request.iterations
+                current.timings = timings
+                if current.game.num_points == current.target:
+                    finish_render()
+                elif advance_chaos.status() != "running" and current.game.num_points < current.target:
+                    if current.token.cancelled:
+                        current.token = CancelToken()
+                    advance_chaos.invoke(current, next_batch(current))
+                return
+
+            advance_chaos.cancel()
+            plot.widget.data = []  # pyright: ignore [reportOptionalMemberAccess, reportUnknownMemberType]
+
+            num_transformations = len(request.coefficients)
+
+            render = ProgressiveRender(
+                key=key,
+                game=ViewportChaosGame(
+                    stack_transformations(request.coefficients),
+                    request.weights or (),
+                    request.viewport,
+                    burn_in=request.burn_in,
+                    seed=FractalDesigner.chaos_seed,
+                ),
+                target=request.iterations,
+                render_mode=render_mode,
+                bounds=request.viewport,
+                counts=empty_density(num_transformations, FractalDesigner.density_resolution),
+                num_transformations=num_transformations,
+                token=CancelToken(),
+                timings=timings,
+            )
+
+            if render_mode == "points":
+                for index in range(num_transformations):
+                    plot.widget.add_scatter(  # pyright: ignore [reportOptionalMemberAccess, reportUnknownMemberType]
+                        x=[],
+                        y=[],
+                        marker_color=plotly.colors.qualitative.G10[index],
+                        name=f"Transformation {index}",
+                        legendgroup=f"Transformation {index}",
+                        mode="markers",
+                    )
+
+            state.statistics.set(None)
+            state.progressive.set(render)
+            advance_chaos.invoke(render, next_batch(render))
+
+        @reactive.effect
+        def append_progressive_batch():
+            if advance_chaos.status() == "error":
                 return
-            return new_points
+            render, batch = advance_chaos.result()
+
+            with reactive.isolate():
+                if render is not state.progressive.get():
+                    return
+
+            render.timings.count("points", len(batch))
+            render.counter = measure_attractor(render.counter, batch, render.timings)
+            if render.render_mode == "density":
+                with render.timings.stage("traces"):
+                    accumulate_density(render.counts, batch.x, batch.y, batch.indices, render.bounds)
+                    image = tone_map(render.counts, plotly.colors.qualitative.G10)
+                    trace = density_trace(image, render.bounds)
+                with (
+                    render.timings.stage("send"),
+                    plot.widget.batch_update(),  # pyright: ignore [reportOptionalMemberAccess, reportUnknownMemberType]
+                ):
+                    plot.widget.data = []  # pyright: ignore [reportOptionalMemberAccess, reportUnknownMemberType]
+                    plot.widget.add_trace(trace)  # pyright: ignore [reportOptionalMemberAccess, reportUnknownMemberType]
+            else:
+                with render.timings.stage("traces"):
+                    order, offsets = group_by_index(batch.indices, render.num_transformations)
+                    x, y = compact(batch.x)[order], compact(batch.y)[order]
+                    # Each batch gets traces of its own in the legend group of its transformation, so that only the
+                    # new points are sent to the browser
+                    traces = [
+                        go.Scatter(
+                            x=x[offsets[index] : offsets[index + 1]],
+                            y=y[offsets[index] : offsets[index + 1]],
+                            marker_color=plotly.colors.qualitative.G10[index],
+                            name=f"Transformation {index}",
+                            legendgroup=f"Transformation {index}",
+                            showlegend=False,
+                            mode="markers",
+                        )
+                        for index in range(render.num_transformations)
+                        if offsets[index + 1] > offsets[index]
+                    ]
+                with render.timings.stage("send"):
+                    plot.widget.add_traces(traces)  # pyright: ignore [reportOptionalMemberAccess, reportUnknownMemberType]
+
+            if render.game.num_points < render.target:
+                advance_chaos.invoke(render, next_batch(render))
+            elif render.timings is state.timings:
+                finish_render()
 
         @render_widget  # pyright: ignore [reportArgumentType]
         def plot():
-            figure = go.Figure(
-                layout_autosize=False,
-                layout_width=500,
-                layout_height=500,
-                layout_xaxis_range=[0, 1],
-                layout_xaxis_tickmode="auto",
-                layout_yaxis_range=[0, 1],
-                layout_yaxis_tickmode="auto",
-                layout_xaxis_autorange=False,
-                layout_yaxis_autorange=False,
-                layout_legend_orientation="h",
+            x_min, x_max, y_min, y_max = RenderRequest.viewport
+            # The pinned plotly stubs leave out FigureWidget, whose methods mirror those of Figure
+            figure = cast(
+                go.Figure,
+                go.FigureWidget(  # pyright: ignore [reportAttributeAccessIssue, reportUnknownMemberType]
+                    layout_autosize=False,
+                    layout_width=FractalDesigner.plot_resolution[0],
+                    layout_height=FractalDesigner.plot_resolution[1],
+                    layout_xaxis_range=[x_min, x_max],
+                    layout_xaxis_tickmode="auto",
+                    layout_yaxis_range=[y_min, y_max],
+                    layout_yaxis_tickmode="auto",
+                    layout_xaxis_autorange=False,
+                    layout_yaxis_autorange=False,
+                    layout_legend_orientation="h",
+                ),
             )
             # figure.update_layout(autosize=False, width=500, height=500, xaxis_range = [0, 1], yaxis_range = [0, 1], xaxis_autorange = False)
             # figure.update_yaxes(scaleanchor="x", scaleratio=1)
+
+            def update_viewport(layout: object, x_range: tuple[float, float], y_range: tuple[float, float]) -> None:
+                state.viewport.set((float(x_range[0]), float(x_range[1]), float(y_range[0]), float(y_range[1])))
+
+            # Zooming and panning in the browser relayouts the figure, which moves the ranges. The stubs declare the
+            # watched properties as one list, while plotly takes them as separate arguments
+            figure.layout.on_change(update_viewport, "xaxis.range", "yaxis.range")  # pyright: ignore [reportArgumentType]
             return figure
 
         @reactive.effect
         @reactive.event(input.graph_transformations)
         def regraph_transformations():
-            new_points = compute_transformation()
-            plot.widget.data = []  # pyright: ignore [reportOptionalMemberAccess, reportUnknownMemberType]
-            _num_transformations = self.num_transformations.get()
+            # A render that is still in flight is superseded by this one
+            finish_render("cancelled")
+            timings = RenderTimings(input.radio_mode.get(), session.id)
+            state.timings = timings
+
+            with timings.stage("validate"):
+                request = validate_transformation()
+
+            if request is None:
+                analyze_request.cancel()
+                compute_transformation.cancel()
+                state.active_request.set(None)
+                finish_render("invalid")
+                return
 
-            if input.radio_mode.get() == "discrete" and new_points:
-                # transformations_plotted: set[int] = set()
+            state.pending = None
+            analyze_and_render(request, timings)
 
-                indices: np.typing.NDArray[np.int32] = np.zeros([len(new_points)], dtype=np.int32)
+        def analyze_and_render(
+            request: RenderRequest, timings: RenderTimings, preview: bool = False, quiet: bool = False
+        ) -> None:
+            # Until the analysis is back there is nothing on screen that zooming or editing could re-render
+            analyze_request.cancel()
+            state.active_request.set(None)
+            analyze_request.invoke(request, timings, preview, quiet)
 
-                for i in range(_num_transformations):
-                    polygon_points: list[NDArrayFloat32] = []
+        @reactive.effect
+        def render_analyzed():
+            # report_computation_error explains a failed task, while raising its error here would end the session
+            if analyze_request.status() == "error":
+                return
+            request, analysis, timings, preview, quiet = analyze_request.result()
 
-                    for j in range(i, len(new_points), _num_transformations):
-                        polygon_points.append(new_points[j][1])
+            with reactive.isolate():
+                # A system without an attractor is turned away before any iterations are spent on it
+                problem = analysis.problem()
+                if problem is not None:
+                    if not quiet:
+                        ui.modal_show(ui.modal(problem, title="Divergence Error", easy_close=True))
+                    finish_render("invalid")
+                    return
 
-                    x_list_discrete: list[NDArrayFloat32 | None] = []
-                    y_list_discrete: list[NDArrayFloat32 | None] = []
+                caveat = analysis.caveat()
+                if caveat is not None and not quiet:
+                    ui.notification_show(caveat, type="warning")
 
-                    for polygon in polygon_points:
-                        x_list_discrete.extend(polygon[0, :])
-                        x_list_discrete.append(None)
+                request = replace(request, burn_in=analysis.burn_in)
+                start_render(replace(request, viewport=fit_view(request, analysis.bounds)), timings, preview=preview)
 
-                        y_list_discrete.extend(polygon[1, :])
-                        y_list_discrete.append(None)
+        def fit_view(request: RenderRequest, bounds: Bounds | None) -> Bounds:
+            """The current view, or a square around the attractor of a system that has not been drawn yet."""
+            system = (request.mode, request.coefficients, request.weights)
+            if system == state.fitted:
+                return state.viewport.get()
+            state.fitted = system
 
-                    if x_list_discrete:
-                        x_list_discrete.pop()
+            if bounds is None:
+                return state.viewport.get()
+            viewport = square_view(bounds, FractalDesigner.view_padding)
+            x_min, x_max, y_min, y_max = viewport
+            plot.widget.update_layout(xaxis_range=[x_min, x_max], yaxis_range=[y_min, y_max])  # pyright: ignore [reportOptionalMemberAccess, reportUnknownMemberType]
+            state.viewport.set(viewport)
+            return viewport
 
-                    if y_list_discrete:
-                        y_list_discrete.pop()
+        @reactive.calc
+        def live_request() -> RenderRequest | None:
+            return read_request(quiet=True)
 
-                    plot.widget.add_scatter(  # pyright: ignore [reportOptionalMemberAccess, reportUnknownMemberType]
-                        x=x_list_discrete,
-                        y=y_list_discrete,
-                        fill="toself",
-                        fillcolor=px.colors.qualitative.G10[i],
-                        name=f"Transformation {i}",
-                        legendgroup=f"Transformation {i}",
-                        line_color=px.colors.qualitative.G10[i],
-                    )
+        @reactive.effect
+        def queue_live_preview():
+            if not input.live_preview():
+                state.pending = None
+                return
 
-            elif input.radio_mode.get() == "continuous" and new_points:
-                x: NDArrayFloat32 = np.empty([len(new_points)], dtype=np.float32)
-                y: NDArrayFloat32 = np.empty([len(new_points)], dtype=np.float32)
-                indices: np.typing.NDArray[np.int32] = np.zeros([len(new_points)], dtype=np.int32)
+            request = live_request()
+            with reactive.isolate():
+                # Half-typed values are invalid, and leave the last preview on screen until they make sense again
+                if request is None or request == state.pending:
+                    return
+                state.pending = request
+                state.previewed = False
+                state.last_edit = time.monotonic()
+                state.edits.set(state.edits.get() + 1)
 
-                for i, (idx, transformation) in enumerate(new_points):
-                    x[i] = transformation[0]
-                    y[i] = transformation[1]
-                    indices[i] = int(idx)
+        def preview_of(request: RenderRequest) -> RenderRequest:
+            if request.mode == "discrete":
+                return replace(request, iterations=min(request.iterations, FractalDesigner.preview_depth))
+            return replace(request, iterations=min(request.iterations, FractalDesigner.preview_points))
 
-                unique_indices: set[int] = set(indices)
+        def start_live_render(request: RenderRequest, preview: bool) -> None:
+            finish_render("cancelled")
+            timings = RenderTimings(request.mode, session.id)
+            state.timings = timings
+            analyze_and_render(request, timings, preview=preview, quiet=True)
 
-                for index in unique_indices:
-                    plot.widget.add_scatter(  # pyright: ignore [reportOptionalMemberAccess, reportUnknownMemberType]
-                        x=x[np.where(indices == index)],
-                        y=y[np.where(indices == index)],
-                        marker_color=px.colors.qualitative.G10[index],
-                        name=f"Transformation {index}",
-                        mode="markers",
-                    )
+        @reactive.effect
+        def run_live_preview():
+            state.edits.get()
+            request = state.pending
+            if request is None:
+                return
 
-        @render.ui
-        @reactive.event(input.add_transformation, input.remove_transformation, input.graph_preset)
-        def create_transformation():
-            _num_transformations = self.num_transformations.get()
-            _transformation_servers = self.transformation_servers.get()
-
-            transformation_cards: list[ui.Tag] = []
-            hide_p = True if input.radio_mode.get() == "discrete" else False
-
-            if input.remove_transformation() > self.num_removed:
-                if _num_transformations > 0:
-                    for i in range(_num_transformations - 1):
-                        a = _transformation_servers[i].get()[0].get()
-                        b = _transformation_servers[i].get()[1].get()
-                        c = _transformation_servers[i].get()[2].get()
-                        d = _transformation_servers[i].get()[3].get()
-                        e = _transformation_servers[i].get()[4].get()
-                        f = _transformation_servers[i].get()[5].get()
-                        p = _transformation_servers[i].get()[6].get()
-                        transformation_cards.append(
-                            FractalDesigner.transformation_card(f"transformation_{i}", i, a, b, c, d, e, f, p, hide_p)
+            # A burst of edits only restarts the timers, so the preview follows the first pause and the full render
+            # follows the inputs settling
+            idle = time.monotonic() - state.last_edit
+            if not state.previewed:
+                if idle < FractalDesigner.preview_debounce:
+                    reactive.invalidate_later(FractalDesigner.preview_debounce - idle)
+                    return
+                state.previewed = True
+                preview = preview_of(request)
+                with reactive.isolate():
+                    start_live_render(preview, preview=True)
+                if preview == request:
+                    state.pending = None
+                    return
+
+            if idle < FractalDesigner.preview_settle:
+                reactive.invalidate_later(FractalDesigner.preview_settle - idle)
+                return
+            state.pending = None
+            with reactive.isolate():
+                start_live_render(request, preview=False)
+
+        @reactive.effect
+        @reactive.event(state.viewport)
+        def follow_viewport():
+            request = state.active_request.get()
+            viewport = state.viewport.get()
+            if request is None or request.viewport == viewport:
+                return
+
+            finish_render("cancelled")
+            timings = RenderTimings(request.mode, session.id)
+            state.timings = timings
+            start_render(replace(request, viewport=viewport), timings)
+
+        def start_render(request: RenderRequest, timings: RenderTimings, preview: bool = False) -> None:
+            compute_transformation.cancel()
+            compute_animation.cancel()
+            state.animation.set(None)
+            state.active_request.set(request)
+
+            if request.mode == "continuous":
+                request = replace(request, render_mode=input.render_mode.get())
+                if request.render_mode == "points" and request.iterations > FractalDesigner.max_browser_points:
+                    request = replace(request, render_mode="density")
+                    if not preview:
+                        ui.notification_show(
+                            f"More than {FractalDesigner.max_browser_points:,} points are too many for the browser to "
+                            "draw one by one, so they are shown as a density image.",
+                            type="warning",
                         )
-                    remove_transformation_servers()
-                    return transformation_cards
-            elif input.add_transformation() > self.num_added:
-                if _num_transformations == 0:
-                    transformation_cards.append(
-                        FractalDesigner.transformation_card("transformation_0", 0, hide_p=hide_p)
+
+            if request.render_mode == "density" and input.sharded.get() and not preview:
+                # A sharded render only returns the summed histogram, so it always draws in one step
+                request = replace(request, workers=FractalDesigner.shard_workers)
+            elif request.mode == "continuous" and input.progressive.get():
+                start_progressive(request, timings)
+                return
+
+            advance_chaos.cancel()
+            state.progressive.set(None)
+            compute_transformation.invoke(request, CancelToken(), timings)
+
+        @reactive.effect
+        def cancel_stale_computation():
+            request = state.active_request.get()
+            current: list[tuple[float, ...]] = []
+            for server in state.transformation_servers.get():
+                current.append(tuple(value() for value in server.get()))
+
+            if request is None:
+                return
+
+            # Adding, removing or editing a card makes the active request obsolete: zooming no longer re-renders it,
+            # and whatever is still being computed for it is cancelled
+            edited = [row[:6] for row in current] != [tuple(row) for row in request.coefficients] or (
+                request.weights is not None and tuple(row[6] for row in current) != request.weights
+            )
+            if not edited:
+                return
+
+            state.active_request.set(None)
+            with reactive.isolate():
+                running = compute_transformation.status() == "running" or advance_chaos.status() == "running"
+            if running:
+                compute_transformation.cancel()
+                advance_chaos.cancel()
+                finish_render("cancelled")
+
+        @reactive.effect
+        def report_computation_error():
+            for task in (analyze_request, compute_transformation, advance_chaos, compute_animation):
+                if task.status() == "error":
+                    error = task.error.get()
+                    m = ui.modal(
+                        str(error),
+                        title="Server Busy" if isinstance(error, QueueFullError) else "Computation Error",
+                        easy_close=True,
                     )
+                    ui.modal_show(m)
+                    with reactive.isolate():
+                        finish_render("error")
+
+        @reactive.effect
+        def show_transformation():
+            # report_computation_error explains a failed task, while raising its error here would end the session
+            if compute_transformation.status() == "error":
+                return
+            drawing, timings = compute_transformation.result()
+
+            with reactive.isolate():
+                draw_transformation(drawing, timings)
+                if timings is state.timings:
+                    finish_render()
+
+        def measure_attractor(counter: BoxCounter | None, batch: ChaosResult, timings: RenderTimings) -> BoxCounter:
+            """Add a batch of points to the box counts of the current render and publish the new estimate."""
+            with timings.stage("statistics"):
+                if counter is None:
+                    counter = BoxCounter.around(batch.x, batch.y, FractalDesigner.statistics_max_level)
                 else:
-                    for i in range(_num_transformations):
-                        a = _transformation_servers[i].get()[0].get()
-                        b = _transformation_servers[i].get()[1].get()
-                        c = _transformation_servers[i].get()[2].get()
-                        d = _transformation_servers[i].get()[3].get()
-                        e = _transformation_servers[i].get()[4].get()
-                        f = _transformation_servers[i].get()[5].get()
-                        p = _transformation_servers[i].get()[6].get()
-                        transformation_cards.append(
-                            FractalDesigner.transformation_card(f"transformation_{i}", i, a, b, c, d, e, f, p, hide_p)
-                        )
+                    counter.update(batch.x, batch.y)
+                state.statistics.set(counter.estimate())
+            return counter
 
-                    transformation_cards.append(
-                        self.transformation_card(
-                            f"transformation_{_num_transformations}", _num_transformations, hide_p=hide_p
-                        )
-                    )
+        @render.ui
+        def statistics_panel():
+            estimate = state.statistics.get()
+            if estimate is None:
+                return ui.p("Graph a fractal in continuous mode with points or progressive rendering to measure it.")
 
-                self.num_transformations.set(_num_transformations + 1)
-                create_transformation_servers()
-                return transformation_cards
-            elif input.graph_preset() > self.num_preset:
-                if input.preset() == "triangle":
-                    self.transformation_servers.set(
-                        [FractalDesigner.transformation_server(f"transformation_{i}") for i in range(3)]
-                    )
-                    ui.update_radio_buttons(id="radio_mode", selected="discrete")
-                    self.num_transformations.set(3)
-                    transformation_cards.append(FractalDesigner.transformation_card("transformation_0", 0, hide_p=True))
-                    transformation_cards.append(
-                        FractalDesigner.transformation_card("transformation_1", 1, e=0.25, f=0.5, hide_p=True)
-                    )
-                    transformation_cards.append(
-                        FractalDesigner.transformation_card("transformation_2", 2, e=0.5, hide_p=True)
-                    )
-                    ui.update_numeric(id="iterations_discrete", value=3)
-                    return transformation_cards
-                elif input.preset() == "fern":
-                    self.transformation_servers.set(
-                        [FractalDesigner.transformation_server(f"transformation_{i}") for i in range(4)]
-                    )
-                    ui.update_radio_buttons(id="radio_mode", selected="continuous")
-                    self.num_transformations.set(4)
-                    transformation_cards.append(
-                        FractalDesigner.transformation_card("transformation_0", 0, 0, 0, 0, 0.16, p=0.01, hide_p=False)
-                    )
-                    transformation_cards.append(
-                        FractalDesigner.transformation_card("transformation_1", 1, 0.85, 0.04, -0.04, 0.85, f=1.6, p=0.85, hide_p=False)
-                    )
-                    transformation_cards.append(
-                        FractalDesigner.transformation_card("transformation_2", 2, 0.2, -0.26, 0.23, 0.22, f=1.6, p=0.07, hide_p=False)
-                    )
-                    transformation_cards.append(
-                        FractalDesigner.transformation_card("transformation_3", 3, -0.15, 0.28, 0.26, 0.24, f=0.44, p=0.07, hide_p=False)
-                    )
-                    ui.update_numeric(id="iterations_continuous", value=2500)
-                    return transformation_cards
+            low, high = estimate.slope_range
+            finest = estimate.levels[-1] if estimate.levels else 0
+            dimension = "not enough points" if np.isnan(estimate.dimension) else f"{estimate.dimension:.3f}"
+            rows = [
+                ("Box-counting dimension", dimension),
+                ("Local slopes", "-" if np.isnan(low) else f"{low:.3f} to {high:.3f}"),
+                ("Grid levels fitted", f"{estimate.levels[0]} to {finest}" if estimate.levels else "-"),
+                ("Coverage", f"{estimate.coverage:.1%} of {2**finest} x {2**finest} boxes"),
+                ("Points", f"{estimate.num_points:,}"),
+            ]
+            return ui.tags.table(
+                *(ui.tags.tr(ui.tags.td(name), ui.tags.td(value)) for name, value in rows),
+                class_="table table-sm",
+            )
 
-        @reactive.calc
-        def create_transformation_servers():
-            _num_transformations = self.num_transformations.get()
-            _transformation_servers = self.transformation_servers.get()
-            if _num_transformations != 0 and _num_transformations < 8:
-                _transformation_servers.append(
-                    FractalDesigner.transformation_server(f"transformation_{_num_transformations - 1}")
+        @reactive.extended_task
+        async def compute_animation(
+            start: Preset, end: Preset, num_frames: int, token: CancelToken
+        ) -> tuple[list[BaseTraceType], Bounds]:
+            # Morphs are rare next to renders, so their module is only loaded on first use to keep startup short
+            from fractal_designer.animation import interpolate, sweep_traces
+
+            sweep = interpolate(start.coefficients, end.coefficients, num_frames, start.weights, end.weights)
+            # Every frame is encoded once in the job, so that playing the animation only swaps images
+            return await job_runner.run(
+                sweep_traces,
+                sweep,
+                plotly.colors.qualitative.G10,
+                FractalDesigner.animation_points,
+                FractalDesigner.density_resolution,
+                seed=FractalDesigner.chaos_seed,
+                should_stop=token,
+            )
+
+        @reactive.effect
+        @reactive.event(input.animate)
+        def start_animation():
+            num_frames = input.animation_frames()
+            if not isinstance(num_frames, int) or not 2 <= num_frames <= FractalDesigner.max_animation_frames:
+                m = ui.modal(
+                    f"The number of frames is invalid. Valid values are numbers that range between 2 and {FractalDesigner.max_animation_frames}",
+                    title="Type Error",
+                    easy_close=True,
                 )
-                self.transformation_servers.set(_transformation_servers)
-                self.num_added += 1
+                ui.modal_show(m)
+                return
 
-        @reactive.calc
-        def remove_transformation_servers():
-            _num_transformations = self.num_transformations.get()
-            _transformation_servers = self.transformation_servers.get()
-            if _num_transformations > 0:
-                _transformation_servers.pop()
-            self.transformation_servers.set(_transformation_servers)
-            self.num_transformations.set(_num_transformations - 1)
-            self.num_removed += 1
+            # The animation replaces the plot, so whatever was rendering or following the viewport stops
+            finish_render("cancelled")
+            analyze_request.cancel()
+            compute_transformation.cancel()
+            advance_chaos.cancel()
+            state.active_request.set(None)
+            state.progressive.set(None)
+            state.statistics.set(None)
+            state.animation.set(None)
+            state.fitted = None
+            compute_animation.invoke(
+                PRESETS[input.animate_from()],
+                PRESETS[input.animate_to()],
+                num_frames,
+                CancelToken(),
+            )
+
+        @reactive.effect
+        def show_animation():
+            if compute_animation.status() == "error":
+                return
+            traces, bounds = compute_animation.result()
+
+            with reactive.isolate():
+                state.animation.set(traces)
+                x_min, x_max, y_min, y_max = bounds
+                plot.widget.update_layout(xaxis_range=[x_min, x_max], yaxis_range=[y_min, y_max])  # pyright: ignore [reportOptionalMemberAccess, reportUnknownMemberType]
+
+        @render.ui
+        def animation_controls():
+            frames = state.animation.get()
+            if frames is None:
+                return None
+
+            # The figure widget cannot hold Plotly frames, so an animated slider steps through them instead
+            return ui.input_slider(
+                "animation_frame",
+                "Frame:",
+                0,
+                len(frames) - 1,
+                0,
+                step=1,
+                animate=ui.AnimationOptions(interval=FractalDesigner.animation_interval, loop=True),
+            )
+
+        @reactive.effect
+        def show_animation_frame():
+            frames = state.animation.get()
+            if frames is None:
+                return
+
+            index = min(input.animation_frame(), len(frames) - 1)
+            with plot.widget.batch_update():  # pyright: ignore [reportOptionalMemberAccess, reportUnknownMemberType]
+                plot.widget.data = []  # pyright: ignore [reportOptionalMemberAccess, reportUnknownMemberType]
+                plot.widget.add_trace(frames[index])  # pyright: ignore [reportOptionalMemberAccess, reportUnknownMemberType]
+
+        @render.ui
+        def debug_panel():
+            timings = state.last_timings.get()
+            if timings is None:
+                return ui.p("Graph a fractal to see where the time goes.")
+
+            return ui.tags.table(
+                *(
+                    ui.tags.tr(ui.tags.td(name), ui.tags.td(str(value)))
+                    for name, value in timings.items()
+                    if name not in ("event", "session")
+                ),
+                class_="table table-sm",
+            )
+
+        def draw_transformation(drawing: Drawing, timings: RenderTimings) -> None:
+            plot.widget.data = []  # pyright: ignore [reportOptionalMemberAccess, reportUnknownMemberType]
+            state.statistics.set(None)
+            timings.merge(drawing.timings)
+
+            result = drawing.result
+            if isinstance(result, DiscreteResult) and result.fraction < 1:
+                ui.notification_show(
+                    f"Only {result.fraction:.1%} of the polygons at this depth fit in memory, "
+                    "so an evenly spaced subset is shown.",
+                    type="warning",
+                )
+            elif isinstance(result, ChaosResult) and len(result):
+                measure_attractor(None, result, timings)
+
+            # Plotly serializes the traces and sends them to the browser while they are added
+            with timings.stage("send"):
+                plot.widget.add_traces(drawing.traces)  # pyright: ignore [reportOptionalMemberAccess, reportUnknownMemberType]
+
+        def insert_card(
+            a: float = 0.50,
+            b: float = 0,
+            c: float = 0,
+            d: float = 0.50,
+            e: float = 0,
+            f: float = 0,
+            p: float = 0,
+            hide_p: bool = True,
+        ) -> None:
+            servers = state.transformation_servers.get()
+            index = len(servers)
+            card_id = f"transformation_{index}"
+            # Edits stream in while typing only for the live preview; app.js switches the existing cards when it is
+            # toggled
+            update_on: Literal["change", "blur"] = "change" if input.live_preview() else "blur"
+
+            ui.insert_ui(
+                FractalDesigner.transformation_card(card_id, index, a, b, c, d, e, f, p, hide_p, update_on),
+                selector="#transformation_cards",
+                where="beforeEnd",
+            )
+
+            # Module servers outlive their cards, so re-adding a card reuses the server created for that slot
+            if index == len(state.card_servers):
+                state.card_servers.append(FractalDesigner.transformation_server(card_id))
+            state.transformation_servers.set([*servers, state.card_servers[index]])
+            state.num_transformations.set(index + 1)
+
+        def remove_card() -> None:
+            servers = state.transformation_servers.get()
+            if not servers:
+                return
+
+            ui.remove_ui(selector=f"#transformation_{len(servers) - 1}-card")
+            state.transformation_servers.set(servers[:-1])
+            state.num_transformations.set(len(servers) - 1)
+
+        @reactive.effect
+        @reactive.event(input.add_transformation)
+        def add_transformation():
+            if state.num_transformations.get() >= FractalDesigner.max_transformations:
+                ui.notification_show(
+                    f"At most {FractalDesigner.max_transformations} transformations are supported.", type="warning"
+                )
+                return
+
+            insert_card(hide_p=input.radio_mode.get() == "discrete")
+
+        @reactive.effect
+        @reactive.event(input.remove_transformation)
+        def remove_transformation():
+            remove_card()
+
+        @reactive.effect
+        @reactive.event(input.graph_preset)
+        def show_preset():
+            for _ in range(state.num_transformations.get()):
+                remove_card()
+
+            preset = PRESETS[input.preset()]
+            ui.update_radio_buttons(id="radio_mode", selected=preset.mode)
+            weights = preset.weights or (0,) * len(preset.coefficients)
+            for coefficients, weight in zip(preset.coefficients, weights):
+                insert_card(*coefficients, p=weight, hide_p=preset.weights is None)
+            ui.update_numeric(id=f"iterations_{preset.mode}", value=preset.iterations)
 
     def get_server(self) -> Callable[[Inputs, Outputs, Session], None]:
         return self.server
@@ -558,4 +1227,7 @@ class FractalDesigner:
 
 
 designer = FractalDesigner()
-app = App(designer.get_ui(), designer.get_server())
+routes: list[BaseRoute] = [Route("/metrics", metrics_endpoint)]
+if designer.assets.bundle is not None:
+    routes.append(Route(f"{ASSET_PREFIX}/{{name}}", designer.assets.bundle.endpoint))
+app = Starlette(routes=[*routes, Mount("/", app=App(designer.get_ui(), designer.get_server()))])
@@ -0,0 +1,313 @@
+"""
+Page assets for air-gapped deployments. By default the page loads KaTeX, its auto-render extension and webfontloader
+from public CDNs on every visit and typesets the transformation formula in the browser. After the CDN files have been
+copied into fractal_designer/vendor on a machine with network access:
+
+    python -m fractal_designer.assets vendor
+
+the app serves them instead, together with app.min.js and app.min.css, as one script and one stylesheet under
+content-hashed names in /assets, with the KaTeX fonts alongside. Every file is cached by the browser for a year,
+because a new version gets a new name. jQuery is not vendored, because Shiny already serves its own copy. If Node.js
+is installed, the formula is rendered to KaTeX markup once at startup. The result is cached next to the vendored
+KaTeX, and the KaTeX scripts are then left out of the bundle.
+
+FRACTAL_DESIGNER_ASSETS selects "cdn", "local", or "auto", which uses the local files when the vendor directory is
+complete.
+"""
+
+import argparse
+import base64
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import sys
+import urllib.request
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Literal
+
+from htmltools import Tag
+from shiny import ui
+from starlette.requests import Request
+from starlette.responses import Response
+
+PACKAGE_DIR = Path(__file__).resolve().parent
+VENDOR_DIR = PACKAGE_DIR / "vendor"
+ASSETS_VARIABLE = "FRACTAL_DESIGNER_ASSETS"
+ASSET_PREFIX = "/assets"
+# Fingerprinted names change with their content, so browsers never need to revalidate them
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+KATEX_CDN = "https://cdn.jsdelivr.net/npm/katex@0.16.25/dist"
+NODE_TIMEOUT = 10.0
+FONT_URL = re.compile(r"url\((fonts/[^)]+)\)")
+MEDIA_TYPES = {
+    ".js": "text/javascript; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".woff2": "font/woff2",
+    ".woff": "font/woff",
+    ".ttf": "font/ttf",
+}
+RENDER_MATH = (
+    "const katex = require(process.argv[1]);"
+    "process.stdout.write(katex.renderToString(process.argv[2], {displayMode: true, throwOnError: true}));"
+)
+
+
+@dataclass(frozen=True)
+class VendorFile:
+    name: str
+    url: str
+    integrity: str
+    kind: Literal["script", "stylesheet"]
+    # Only needed to typeset math in the browser, so it is left out when the formula is rendered at startup
+    math: bool = False
+
+
+VENDOR_FILES = (
+    VendorFile(
+        "webfontloader.js",
+        "https://cdn.jsdelivr.net/npm/webfontloader@1.6.28/webfontloader.js",
+        "sha256-4O4pS1SH31ZqrSO2A/2QJTVjTPqVe+jnYgOWUVr7EEc=",
+        "script",
+    ),
+    VendorFile(
+        "katex.min.css",
+        f"{KATEX_CDN}/katex.min.css",
+        "sha384-WcoG4HRXMzYzfCgiyfrySxx90XSl2rxY5mnVY5TwtWE6KLrArNKn0T/mOgNL0Mmi",
+        "stylesheet",
+    ),
+    VendorFile(
+        "katex.min.js",
+        f"{KATEX_CDN}/katex.min.js",
+        "sha384-J+9dG2KMoiR9hqcFao0IBLwxt6zpcyN68IgwzsCSkbreXUjmNVRhPFTssqdSGjwQ",
+        "script",
+        math=True,
+    ),
+    VendorFile(
+        "auto-render.min.js",
+        f"{KATEX_CDN}/contrib/auto-render.min.js",
+        "sha384-hCXGrW6PitJEwbkoStFjeJxv+fSOOQKOPbJxSfM6G5sWZjAyWhXiTIIAmQqnlLlh",
+        "script",
+        math=True,
+    ),
+)
+
+
+def cdn_head() -> list[Tag]:
+    """The head of the page as it loads from the CDNs, with the formula typeset in the browser."""
+    head: list[Tag] = [
+        ui.tags.script(
+            src="https://code.jquery.com/jquery-3.7.1.min.js",
+            integrity="sha256-/JqT3SQfawRcv/BIHPThkBvs0OEvtFFmqPF/lYI/Cxo=",
+            crossorigin="anonymous",
+        )
+    ]
+    for file in VENDOR_FILES:
+        if file.kind == "stylesheet":
+            head.append(
+                ui.tags.link(rel="stylesheet", href=file.url, integrity=file.integrity, crossorigin="anonymous")
+            )
+        else:
+            head.append(ui.tags.script(src=file.url, integrity=file.integrity, crossorigin="anonymous", defer=True))
+    return head
+
+
+def fingerprint(name: str, content: bytes) -> str:
+    path = Path(name)
+    return f"{path.stem}.{hashlib.sha256(content).hexdigest()[:12]}{path.suffix}"
+
+
+@dataclass(frozen=True)
+class Asset:
+    content: bytes
+    media_type: str
+    etag: str
+
+
+class AssetBundle:
+    """Files held in memory under fingerprinted names and served from ASSET_PREFIX."""
+
+    def __init__(self):
+        self.files: dict[str, Asset] = {}
+
+    def add(self, name: str, content: bytes) -> str:
+        """Add a file and return the URL it is served at."""
+        served = fingerprint(name, content)
+        media_type = MEDIA_TYPES.get(Path(name).suffix, "application/octet-stream")
+        self.files[served] = Asset(content, media_type, f'"{served}"')
+        return f"{ASSET_PREFIX}/{served}"
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(asset.content) for asset in self.files.values())
+
+    async def endpoint(self, request: Request) -> Response:
+        asset = self.files.get(request.path_params["name"])
+        if asset is None:
+            return Response(status_code=404)
+        headers = {"Cache-Control": CACHE_CONTROL, "ETag": asset.etag}
+        if request.headers.get("if-none-match") == asset.etag:
+            return Response(status_code=304, headers=headers)
+        return Response(asset.content, media_type=asset.media_type, headers=headers)
+
+
+@dataclass(frozen=True)
+class PageAssets:
+    head: list[Tag]
+    # KaTeX markup of the formula, or None when the browser typesets it
+    math: str | None = None
+    bundle: AssetBundle | None = None
+
+
+def render_math(tex: str, directory: Path = VENDOR_DIR) -> str | None:
+    """
+    KaTeX markup of display-mode tex, rendered by the vendored KaTeX under Node.js and cached next to it, or None when
+    neither a cached rendering nor Node.js is available.
+    """
+    katex = directory / "katex.min.js"
+    key = hashlib.sha256(katex.read_bytes() + tex.encode()).hexdigest()[:16]
+    cached = directory / "math" / f"{key}.html"
+    if cached.is_file():
+        return cached.read_text()
+
+    node = shutil.which("node")
+    if node is None:
+        return None
+    try:
+        result = subprocess.run(
+            [node, "-e", RENDER_MATH, str(katex), tex], capture_output=True, check=True, text=True, timeout=NODE_TIMEOUT
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+    try:
+        cached.parent.mkdir(exist_ok=True)
+        cached.write_text(result.stdout)
+    except OSError:
+        # A read-only install renders the formula again on the next start
+        pass
+    return result.stdout
+
+
+def missing_files(directory: Path = VENDOR_DIR) -> list[str]:
+    return [file.name for file in VENDOR_FILES if not (directory / file.name).is_file()]
+
+
+def local_assets(formula: str, directory: Path = VENDOR_DIR) -> PageAssets:
+    """Bundle the vendored files with the app's own script and stylesheet."""
+    math = render_math(formula, directory)
+    bundle = AssetBundle()
+
+    scripts = [
+        (directory / file.name).read_bytes()
+        for file in VENDOR_FILES
+        if file.kind == "script" and not (file.math and math is not None)
+    ]
+    scripts.append((PACKAGE_DIR / "js" / "app.min.js").read_bytes())
+
+    stylesheets: list[bytes] = []
+    for file in VENDOR_FILES:
+        if file.kind != "stylesheet":
+            continue
+        css = (directory / file.name).read_text()
+        # Fonts are referenced relative to the stylesheet, which no longer lives next to them once it is bundled
+        for font in sorted(set(FONT_URL.findall(css))):
+            path = directory / font
+            if path.is_file():
+                css = css.replace(f"url({font})", f"url({bundle.add(path.name, path.read_bytes())})")
+        stylesheets.append(css.encode())
+    stylesheets.append((PACKAGE_DIR / "css" / "app.min.css").read_bytes())
+
+    script = bundle.add("bundle.js", b";\n".join(scripts))
+    stylesheet = bundle.add("bundle.css", b"\n".join(stylesheets))
+    head = [ui.tags.link(rel="stylesheet", href=stylesheet), ui.tags.script(src=script, defer=True)]
+    return PageAssets(head, math, bundle)
+
+
+def load_assets(formula: str, mode: str | None = None) -> PageAssets:
+    """The page assets for mode, or for FRACTAL_DESIGNER_ASSETS when mode is None."""
+    mode = (mode or os.environ.get(ASSETS_VARIABLE) or "auto").lower()
+    if mode not in ("auto", "cdn", "local"):
+        raise ValueError(f"Unknown asset mode {mode!r}; choose one of auto, cdn, local")
+
+    missing = missing_files()
+    if mode == "cdn" or (mode == "auto" and missing):
+        return PageAssets(
+            [
+                *cdn_head(),
+                ui.include_js(PACKAGE_DIR / "js" / "app.js", defer=True),
+                ui.include_css(PACKAGE_DIR / "css" / "app.min.css"),
+            ]
+        )
+    if missing:
+        raise FileNotFoundError(
+            f"{', '.join(missing)} missing from {VENDOR_DIR}; run python -m fractal_designer.assets vendor"
+        )
+    return local_assets(formula)
+
+
+def verify(content: bytes, integrity: str) -> bool:
+    """Whether content matches a subresource integrity value such as sha384-<base64 digest>."""
+    algorithm, _, expected = integrity.partition("-")
+    return base64.b64encode(hashlib.new(algorithm, content).digest()).decode() == expected
+
+
+def fetch(url: str) -> bytes:
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return response.read()
+
+
+def vendor(directory: Path = VENDOR_DIR) -> list[Path]:
+    """Download the CDN files and the KaTeX fonts into directory, checking each file against its integrity hash."""
+    (directory / "fonts").mkdir(parents=True, exist_ok=True)
+    written: list[Path] = []
+    for file in VENDOR_FILES:
+        content = fetch(file.url)
+        if not verify(content, file.integrity):
+            raise ValueError(f"{file.url} does not match its integrity hash")
+        (directory / file.name).write_bytes(content)
+        written.append(directory / file.name)
+
+        if file.kind == "stylesheet":
+            for font in sorted(set(FONT_URL.findall(content.decode()))):
+                (directory / font).write_bytes(fetch(f"{KATEX_CDN}/{font}"))
+                written.append(directory / font)
+    return written
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m fractal_designer.assets", description="Prepare the page assets for offline use."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("vendor", help=f"download the CDN files into {VENDOR_DIR}")
+    commands.add_parser("check", help="build the local bundle and list what it serves")
+    args = parser.parse_args(argv)
+
+    if args.command == "vendor":
+        try:
+            paths = vendor()
+        except (OSError, ValueError) as error:
+            print(f"error: {error}", file=sys.stderr)
+            return 1
+        print(f"{len(paths)} files -> {VENDOR_DIR}")
+        return 0
+
+    missing = missing_files()
+    if missing:
+        print(f"error: {', '.join(missing)} missing from {VENDOR_DIR}", file=sys.stderr)
+        return 1
+    from fractal_designer.app import FORMULA
+
+    assets = local_assets(FORMULA)
+    assert assets.bundle is not None
+    for name, asset in sorted(assets.bundle.files.items()):
+        print(f"{ASSET_PREFIX}/{name}: {len(asset.content)} bytes")
+    print("formula pre-rendered" if assets.math is not None else "formula typeset in the browser (Node.js not found)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
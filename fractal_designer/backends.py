@@ -0,0 +1,295 @@
+"""
+Interchangeable compute backends for the IFS engines. A backend expands discrete systems, plays the chaos game, and
+plays the chaos game straight into a density histogram. The NumPy backend is always available. When Numba is
+installed, a compiled backend replaces the density path with one fused loop that samples a map, applies it and bins
+the point without creating any intermediate arrays. get_backend picks the fastest backend that can be loaded, or the
+one named by the FRACTAL_DESIGNER_BACKEND environment variable.
+"""
+
+import functools
+import importlib.util
+import os
+import warnings
+from collections.abc import Callable
+from typing import Protocol
+
+import numpy as np
+
+from fractal_designer import raster
+from fractal_designer.engine import (
+    DEFAULT_BURN_IN,
+    DEFAULT_MAX_BYTES,
+    ChaosResult,
+    DiscreteResult,
+    NDArrayFloat64,
+    NDArrayInt8,
+    _check,  # pyright: ignore [reportPrivateUsage]
+)
+from fractal_designer.raster import Bounds, NDArrayUInt32
+from fractal_designer.viewport import MAX_SAMPLING_ROUNDS, ViewportChaosGame, expand_visible
+
+DEFAULT_BATCH = 1_000_000
+BACKEND_VARIABLE = "FRACTAL_DESIGNER_BACKEND"
+
+Seed = int | np.random.SeedSequence | None
+
+
+class ComputeBackend(Protocol):
+    name: str
+
+    def iterate_discrete(
+        self,
+        maps: NDArrayFloat64,
+        depth: int,
+        bounds: Bounds,
+        resolution: tuple[int, int],
+        *,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        should_stop: Callable[[], bool] | None = None,
+    ) -> DiscreteResult: ...
+
+    def iterate_chaos(
+        self,
+        maps: NDArrayFloat64,
+        weights: tuple[float, ...],
+        num_points: int,
+        bounds: Bounds,
+        *,
+        burn_in: int = DEFAULT_BURN_IN,
+        seed: Seed = None,
+        should_stop: Callable[[], bool] | None = None,
+    ) -> ChaosResult: ...
+
+    def accumulate_density(
+        self,
+        counts: NDArrayUInt32,
+        maps: NDArrayFloat64,
+        weights: tuple[float, ...],
+        num_points: int,
+        bounds: Bounds,
+        *,
+        burn_in: int = DEFAULT_BURN_IN,
+        seed: Seed = None,
+        batch_size: int = DEFAULT_BATCH,
+        should_stop: Callable[[], bool] | None = None,
+    ) -> int:
+        """Add num_points chaos-game points in bounds to a (C, H, W) histogram in place and return how many it drew."""
+        ...
+
+
+class NumpyBackend:
+    name = "numpy"
+
+    def iterate_discrete(
+        self,
+        maps: NDArrayFloat64,
+        depth: int,
+        bounds: Bounds,
+        resolution: tuple[int, int],
+        *,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        should_stop: Callable[[], bool] | None = None,
+    ) -> DiscreteResult:
+        return expand_visible(maps, depth, bounds, resolution, max_bytes=max_bytes, should_stop=should_stop)
+
+    def iterate_chaos(
+        self,
+        maps: NDArrayFloat64,
+        weights: tuple[float, ...],
+        num_points: int,
+        bounds: Bounds,
+        *,
+        burn_in: int = DEFAULT_BURN_IN,
+        seed: Seed = None,
+        should_stop: Callable[[], bool] | None = None,
+    ) -> ChaosResult:
+        return ViewportChaosGame(maps, weights, bounds, burn_in=burn_in, seed=np.random.default_rng(seed)).advance(
+            num_points, should_stop
+        )
+
+    def accumulate_density(
+        self,
+        counts: NDArrayUInt32,
+        maps: NDArrayFloat64,
+        weights: tuple[float, ...],
+        num_points: int,
+        bounds: Bounds,
+        *,
+        burn_in: int = DEFAULT_BURN_IN,
+        seed: Seed = None,
+        batch_size: int = DEFAULT_BATCH,
+        should_stop: Callable[[], bool] | None = None,
+    ) -> int:
+        game = ViewportChaosGame(maps, weights, bounds, burn_in=burn_in, seed=np.random.default_rng(seed))
+        while game.num_points < num_points:
+            batch = game.advance(min(batch_size, num_points - game.num_points), should_stop)
+            raster.accumulate_density(counts, batch.x, batch.y, batch.indices, bounds)
+        return game.num_points
+
+
+def _chaos_density_kernel(
+    counts: NDArrayUInt32,
+    maps: NDArrayFloat64,
+    cumulative: NDArrayFloat64,
+    cylinders: NDArrayFloat64,
+    cylinder_cumulative: NDArrayFloat64,
+    labels: NDArrayInt8,
+    num_points: int,
+    max_attempts: int,
+    x: float,
+    y: float,
+    burn_in: int,
+    bounds: NDArrayFloat64,
+    seed: int,
+) -> tuple[float, float]:
+    """
+    One chain of the chaos game, binned as it runs. After each step the point is pushed through a visible cylinder,
+    as in ViewportChaosGame, unless there are none, in which case the point itself is binned with the map that made it.
+    """
+    np.random.seed(seed)
+    _, height, width = counts.shape
+    x_min, x_max, y_min, y_max = bounds[0], bounds[1], bounds[2], bounds[3]
+    x_scale = width / (x_max - x_min)
+    y_scale = height / (y_max - y_min)
+    use_cylinders = len(cylinder_cumulative) > 0
+
+    for _ in range(burn_in):
+        k = min(np.searchsorted(cumulative, np.random.random()), len(cumulative) - 1)
+        x, y = (
+            maps[k, 0, 0] * x + maps[k, 0, 1] * y + maps[k, 0, 2],
+            maps[k, 1, 0] * x + maps[k, 1, 1] * y + maps[k, 1, 2],
+        )
+
+    accepted = 0
+    attempts = 0
+    while accepted < num_points and attempts < max_attempts:
+        attempts += 1
+        k = min(np.searchsorted(cumulative, np.random.random()), len(cumulative) - 1)
+        x, y = (
+            maps[k, 0, 0] * x + maps[k, 0, 1] * y + maps[k, 0, 2],
+            maps[k, 1, 0] * x + maps[k, 1, 1] * y + maps[k, 1, 2],
+        )
+
+        point_x, point_y, channel = x, y, k
+        if use_cylinders:
+            j = min(np.searchsorted(cylinder_cumulative, np.random.random()), len(cylinder_cumulative) - 1)
+            point_x = cylinders[j, 0, 0] * x + cylinders[j, 0, 1] * y + cylinders[j, 0, 2]
+            point_y = cylinders[j, 1, 0] * x + cylinders[j, 1, 1] * y + cylinders[j, 1, 2]
+            channel = labels[j]
+
+        if x_min <= point_x < x_max and y_min <= point_y < y_max:
+            column = min(int((point_x - x_min) * x_scale), width - 1)
+            row = min(int((point_y - y_min) * y_scale), height - 1)
+            counts[channel, row, column] += 1
+            accepted += 1
+        elif not use_cylinders:
+            # Without cylinders every step counts, like ChaosGame, so a view that misses the attractor cannot stall
+            accepted += 1
+
+    return x, y
+
+
+def numba_installed() -> bool:
+    return importlib.util.find_spec("numba") is not None
+
+
+@functools.cache
+def _chaos_density() -> Callable[..., tuple[float, float]]:
+    """
+    The density kernel, compiled on first use. Numba takes longer to import than the rest of the app, so a process
+    that never renders a density with it never loads it. Without Numba, the kernel runs as plain Python.
+    """
+    if not numba_installed():
+        return _chaos_density_kernel
+    import numba  # pyright: ignore [reportMissingImports]
+
+    return numba.njit(cache=True, nogil=True)(_chaos_density_kernel)  # pyright: ignore [reportUnknownMemberType, reportUnknownVariableType]
+
+
+class NumbaBackend(NumpyBackend):
+    """
+    NumPy backend whose density path runs in a compiled loop. Its histograms differ from the NumPy ones point by point,
+    because the compiled loop runs a single chain with Numba's own generator, but they sample the same measure.
+    """
+
+    name = "numba"
+
+    def accumulate_density(
+        self,
+        counts: NDArrayUInt32,
+        maps: NDArrayFloat64,
+        weights: tuple[float, ...],
+        num_points: int,
+        bounds: Bounds,
+        *,
+        burn_in: int = DEFAULT_BURN_IN,
+        seed: Seed = None,
+        batch_size: int = DEFAULT_BATCH,
+        should_stop: Callable[[], bool] | None = None,
+    ) -> int:
+        rng = np.random.default_rng(seed)
+        game = ViewportChaosGame(maps, weights, bounds, seed=rng)
+        if not game.visible:
+            return num_points
+
+        if game.cylinders is None:
+            cylinders = np.zeros([0, 2, 3], dtype=np.float64)
+            cylinder_cumulative = np.zeros([0], dtype=np.float64)
+            labels = np.zeros([0], dtype=np.int8)
+        else:
+            cylinders = np.concatenate(
+                [game.cylinders.linear, game.cylinders.translation[:, :, np.newaxis]], axis=2
+            ).astype(np.float64)
+            cylinder_cumulative = game.cumulative
+            labels = game.cylinders.labels
+        cumulative = np.cumsum(game.game.probabilities)
+        bounds_array = np.array(bounds, dtype=np.float64)
+
+        x, y = (float(value) for value in rng.random(2))
+        drawn = 0
+        while drawn < num_points:
+            _check(should_stop)
+            size = min(batch_size, num_points - drawn)
+            x, y = _chaos_density()(
+                counts,
+                maps,
+                cumulative,
+                cylinders,
+                cylinder_cumulative,
+                labels,
+                size,
+                size * MAX_SAMPLING_ROUNDS,
+                x,
+                y,
+                burn_in,
+                bounds_array,
+                int(rng.integers(1 << 32)),
+            )
+            burn_in = 0
+            drawn += size
+        return drawn
+
+
+BACKENDS: dict[str, type[NumpyBackend]] = {"numpy": NumpyBackend, "numba": NumbaBackend}
+
+
+def available_backends() -> list[str]:
+    return [name for name in BACKENDS if name != "numba" or numba_installed()]
+
+
+def get_backend(name: str | None = None) -> ComputeBackend:
+    """
+    The backend called name, "auto" for the fastest one available, or None to read FRACTAL_DESIGNER_BACKEND. Asking
+    for Numba when it is not installed falls back to NumPy with a warning rather than failing.
+    """
+    name = (name or os.environ.get(BACKEND_VARIABLE) or "auto").lower()
+    if name == "auto":
+        return BACKENDS[available_backends()[-1]]()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown compute backend {name!r}; choose one of auto, {', '.join(BACKENDS)}")
+    if name not in available_backends():
+        warnings.warn(
+            f"The {name} backend is not installed, so the NumPy backend is used instead", RuntimeWarning, stacklevel=2
+        )
+        return NumpyBackend()
+    return BACKENDS[name]()
@@ -0,0 +1,436 @@
+"""
+Benchmarks for the IFS hot paths: contractivity analysis, discrete expansion, the chaos game, sharded density renders
+and trace building. Each case records wall time, peak traced memory and the size of the serialized figure, and results
+are written as JSON so that runs from different commits can be compared:
+
+    python -m fractal_designer.bench --output before.json
+    python -m fractal_designer.bench --output after.json --compare before.json
+
+The per-point random.choices loop and the list-of-tuples discrete expansion that the app used to run are kept here
+as reference implementations, so their cost can still be measured against the array engines.
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable, Sequence
+from dataclasses import asdict, dataclass, field
+from datetime import UTC, datetime
+from functools import partial
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import plotly.colors
+import plotly.graph_objects as go
+from plotly.basedatatypes import BaseTraceType
+
+from fractal_designer.analysis import analyze_system
+from fractal_designer.animation import DEFAULT_RESOLUTION, Sweep, interpolate, sweep_density
+from fractal_designer.backends import available_backends, get_backend
+from fractal_designer.engine import ChaosResult, DiscreteResult, NDArrayFloat64, chaos_game, stack_transformations
+from fractal_designer.lod import level_of_detail
+from fractal_designer.parallel import default_workers, sharded_density
+from fractal_designer.presets import PRESETS
+from fractal_designer.raster import accumulate_density, empty_density
+from fractal_designer.traces import density_traces, discrete_traces, lod_traces, point_traces
+from fractal_designer.viewport import expand_visible
+
+TRIANGLE = PRESETS["triangle"].coefficients
+FERN = PRESETS["fern"].coefficients
+FERN_WEIGHTS = PRESETS["fern"].weights or ()
+FERN_BOUNDS = (-3.0, 3.0, 0.0, 10.0)
+COLORS = plotly.colors.qualitative.G10
+UNIT_VIEW = (0.0, 1.0, 0.0, 1.0)
+PLOT_RESOLUTION = (500, 500)
+
+DEFAULT_THRESHOLD = 1.2
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    group: str
+    params: dict[str, Any]
+    seconds: list[float] = field(default_factory=list[float])
+    peak_bytes: int = 0
+    payload_bytes: int | None = None
+
+    @property
+    def best(self) -> float:
+        return min(self.seconds)
+
+    def to_json(self) -> dict[str, Any]:
+        data = asdict(self)
+        data["min"] = self.best
+        data["mean"] = statistics.fmean(self.seconds)
+        data["stdev"] = statistics.stdev(self.seconds) if len(self.seconds) > 1 else 0.0
+        return data
+
+
+def legacy_expand_discrete(coefficients: tuple[tuple[float, ...], ...], depth: int) -> list[tuple[int, NDArrayFloat64]]:
+    transformations = [np.array([[a, b, e], [c, d, f], [0, 0, 1]]) for a, b, c, d, e, f in coefficients]
+    old_points: list[tuple[int, NDArrayFloat64]] = [(0, np.array([[0, 0, 1], [0, 1, 1], [1, 1, 1], [1, 0, 1]]).T)]
+    new_points: list[tuple[int, NDArrayFloat64]] = []
+    for _ in range(depth):
+        new_points = []
+        for polygon in old_points:
+            for i, transformation in enumerate(transformations):
+                new_points.append((i, transformation @ polygon[1]))
+        old_points = new_points
+    return new_points
+
+
+def legacy_chaos_game(
+    coefficients: tuple[tuple[float, ...], ...], weights: tuple[float, ...], num_points: int
+) -> list[tuple[int, NDArrayFloat64]]:
+    transformations = [np.array([[a, b, e], [c, d, f], [0, 0, 1]]) for a, b, c, d, e, f in coefficients]
+    point: NDArrayFloat64 = np.array([0, 0, 1]).T
+    new_points: list[tuple[int, NDArrayFloat64]] = []
+    for _ in range(num_points):
+        transformation_idx = random.choices(range(len(transformations)), weights=weights)[0]
+        point = transformations[transformation_idx] @ point
+        new_points.append((transformation_idx, point))
+    return new_points
+
+
+def random_system(num_transformations: int, seed: int) -> tuple[tuple[tuple[float, ...], ...], tuple[float, ...]]:
+    """Random contractive system: every linear part is scaled to an operator norm of at most 0.7."""
+    rng = np.random.default_rng(seed)
+    coefficients: list[tuple[float, ...]] = []
+    for _ in range(num_transformations):
+        linear = rng.uniform(-1, 1, (2, 2))
+        linear *= rng.uniform(0.2, 0.7) / max(np.linalg.norm(linear, 2), 1e-9)
+        e, f = rng.uniform(0, 1, 2)
+        coefficients.append((linear[0, 0], linear[0, 1], linear[1, 0], linear[1, 1], e, f))
+    weights = rng.dirichlet(np.ones(num_transformations))
+    return tuple(coefficients), tuple(float(weight) for weight in weights)
+
+
+def random_maps(num_transformations: int) -> tuple[NDArrayFloat64, tuple[float, ...]]:
+    coefficients, weights = random_system(num_transformations, seed=num_transformations)
+    return stack_transformations(coefficients), weights
+
+
+def payload_size(traces: Sequence[BaseTraceType]) -> int:
+    return len(go.Figure(data=traces).to_json())
+
+
+def measure(
+    name: str,
+    group: str,
+    params: dict[str, Any],
+    func: Callable[[], Any],
+    repeat: int,
+    payload: Callable[[Any], int] | None = None,
+) -> BenchmarkResult:
+    result = BenchmarkResult(name, group, params)
+    output: Any = None
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = func()
+        result.seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        output = func()
+        _, result.peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    if payload is not None:
+        result.payload_bytes = payload(output)
+    return result
+
+
+def separate_frames(sweep: Sweep, num_points: int) -> list[Any]:
+    """The sweep rendered the way it would be without common random numbers: one seeded chaos game per frame."""
+    frames: list[Any] = []
+    for frame, (maps, weights) in enumerate(zip(sweep.maps, sweep.weights)):
+        result = chaos_game(maps, tuple(weights), num_points, seed=frame)
+        counts = empty_density(len(maps), DEFAULT_RESOLUTION)
+        accumulate_density(counts, result.x, result.y, result.indices, FERN_BOUNDS)
+        frames.append(counts)
+    return frames
+
+
+@dataclass(frozen=True)
+class Case:
+    name: str
+    group: str
+    params: dict[str, Any]
+    # Builds the inputs of the benchmark and returns the function to time, so that only selected cases pay for them
+    setup: Callable[[], Callable[[], Any]]
+    payload: Callable[[Any], int] | None = None
+
+
+def visible_triangle(depth: int) -> DiscreteResult:
+    """The triangle expanded the way the app expands it, pruned to the default view."""
+    return expand_visible(stack_transformations(TRIANGLE), depth, UNIT_VIEW, PLOT_RESOLUTION)
+
+
+def fern_sample(num_points: int) -> ChaosResult:
+    return chaos_game(stack_transformations(FERN), FERN_WEIGHTS, num_points, seed=0)
+
+
+def lod_view(result: DiscreteResult) -> list[BaseTraceType]:
+    return lod_traces(level_of_detail(result, 3, UNIT_VIEW, PLOT_RESOLUTION), 3, UNIT_VIEW, COLORS)
+
+
+def cases(quick: bool) -> list[Case]:
+    depths = (4, 6) if quick else (4, 6, 8, 10)
+    point_counts = (10_000, 100_000) if quick else (10_000, 100_000, 1_000_000, 10_000_000)
+    legacy_depths = (4,) if quick else (4, 6)
+    legacy_points = (1_000,) if quick else (1_000, 5_000)
+    system_sizes = (2, 4) if quick else (2, 3, 4, 5, 6, 7, 8)
+
+    triangle = stack_transformations(TRIANGLE)
+    fern = stack_transformations(FERN)
+    found: list[Case] = []
+
+    for depth in legacy_depths:
+        found.append(
+            Case(
+                f"legacy_discrete[triangle-{depth}]",
+                "legacy",
+                {"depth": depth},
+                lambda d=depth: partial(legacy_expand_discrete, TRIANGLE, d),
+            )
+        )
+    for num_points in legacy_points:
+        found.append(
+            Case(
+                f"legacy_chaos[fern-{num_points}]",
+                "legacy",
+                {"points": num_points},
+                lambda n=num_points: partial(legacy_chaos_game, FERN, FERN_WEIGHTS, n),
+            )
+        )
+
+    for depth in depths:
+        found.append(
+            Case(
+                f"discrete[triangle-{depth}]",
+                "discrete",
+                {"depth": depth},
+                lambda d=depth: partial(expand_visible, triangle, d, UNIT_VIEW, PLOT_RESOLUTION),
+            )
+        )
+        found.append(
+            Case(
+                f"discrete_traces[triangle-{depth}]",
+                "traces",
+                {"depth": depth},
+                lambda d=depth: partial(discrete_traces, visible_triangle(d), 3, COLORS),
+                payload_size,
+            )
+        )
+        found.append(
+            Case(
+                f"lod_traces[triangle-{depth}]",
+                "traces",
+                {"depth": depth},
+                lambda d=depth: partial(lod_view, visible_triangle(d)),
+                payload_size,
+            )
+        )
+
+    for num_points in point_counts:
+        found.append(
+            Case(
+                f"chaos[fern-{num_points}]",
+                "chaos",
+                {"points": num_points},
+                lambda n=num_points: partial(fern_sample, n),
+            )
+        )
+        if num_points <= 1_000_000:
+            found.append(
+                Case(
+                    f"point_traces[fern-{num_points}]",
+                    "traces",
+                    {"points": num_points},
+                    lambda n=num_points: partial(point_traces, fern_sample(n), COLORS),
+                    payload_size,
+                )
+            )
+        found.append(
+            Case(
+                f"density_traces[fern-{num_points}]",
+                "traces",
+                {"points": num_points},
+                lambda n=num_points: partial(density_traces, fern_sample(n), 4, FERN_BOUNDS, PLOT_RESOLUTION, COLORS),
+                payload_size,
+            )
+        )
+
+    for size in system_sizes:
+        depth = max(1, int(np.log(200_000) / np.log(size)))
+        found.append(
+            Case(
+                f"discrete[random-{size}]",
+                "discrete",
+                {"maps": size, "depth": depth},
+                lambda s=size, d=depth: partial(expand_visible, random_maps(s)[0], d, UNIT_VIEW, PLOT_RESOLUTION),
+            )
+        )
+        found.append(
+            Case(
+                f"chaos[random-{size}]",
+                "chaos",
+                {"maps": size, "points": 1_000_000},
+                lambda s=size: partial(chaos_game, *random_maps(s), 1_000_000, seed=0),
+            )
+        )
+        found.append(
+            Case(
+                f"analysis[random-{size}]",
+                "analysis",
+                {"maps": size},
+                # Uncached, so that every repeat pays for the full analysis
+                lambda s=size: partial(analyze_system.__wrapped__, *random_system(s, seed=s)),
+            )
+        )
+
+    for name in available_backends():
+        num_points = 1_000_000 if quick else 10_000_000
+        found.append(
+            Case(
+                f"backend_density[fern-{name}]",
+                "backend",
+                {"backend": name, "points": num_points},
+                lambda b=name, n=num_points: (
+                    lambda: get_backend(b).accumulate_density(
+                        empty_density(4, PLOT_RESOLUTION), fern, FERN_WEIGHTS, n, FERN_BOUNDS, seed=0
+                    )
+                ),
+            )
+        )
+
+    # Points per worker stay fixed, so near-linear scaling shows up as a flat wall time across worker counts
+    cores = default_workers()
+    for workers in sorted({1 << power for power in range(cores.bit_length())} | {cores}):
+        num_points = workers * (1_000_000 if quick else 5_000_000)
+        found.append(
+            Case(
+                f"sharded_density[fern-{workers}w]",
+                "parallel",
+                {"workers": workers, "points": num_points},
+                lambda w=workers, n=num_points: partial(
+                    sharded_density, fern, FERN_WEIGHTS, n, FERN_BOUNDS, PLOT_RESOLUTION, workers=w, seed=0
+                ),
+            )
+        )
+
+    # The same morph as one batched sweep and as separately seeded frames, at equal points per frame
+    num_frames = 10 if quick else 30
+    num_points = 100_000 if quick else 200_000
+    found.append(
+        Case(
+            f"sweep_density[triangle-fern-{num_frames}f]",
+            "animation",
+            {"frames": num_frames, "points": num_points},
+            lambda: partial(
+                sweep_density,
+                interpolate(TRIANGLE, FERN, num_frames, None, FERN_WEIGHTS),
+                num_points,
+                bounds=FERN_BOUNDS,
+                seed=0,
+            ),
+        )
+    )
+    found.append(
+        Case(
+            f"separate_frames[triangle-fern-{num_frames}f]",
+            "animation",
+            {"frames": num_frames, "points": num_points},
+            lambda: partial(separate_frames, interpolate(TRIANGLE, FERN, num_frames, None, FERN_WEIGHTS), num_points),
+        )
+    )
+
+    return found
+
+
+def run(quick: bool = False, repeat: int = 3, select: str | None = None) -> list[BenchmarkResult]:
+    results: list[BenchmarkResult] = []
+    for case in cases(quick):
+        if select is not None and select not in case.name:
+            continue
+        result = measure(
+            case.name, case.group, case.params, case.setup(), 1 if case.group == "legacy" else repeat, case.payload
+        )
+        results.append(result)
+        payload_text = "" if result.payload_bytes is None else f"  payload {result.payload_bytes / 1024:10.1f} KiB"
+        print(f"{case.name:40s} {result.best * 1000:10.2f} ms  peak {result.peak_bytes / 2**20:8.1f} MiB{payload_text}")
+    return results
+
+
+def metadata() -> dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(UTC).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": default_workers(),
+    }
+
+
+def compare(current: list[BenchmarkResult], baseline_path: Path, threshold: float) -> list[str]:
+    """Print the ratio of each benchmark against a saved run and return the names that got slower than threshold."""
+    baseline = {entry["name"]: entry for entry in json.loads(baseline_path.read_text())["results"]}
+    regressions: list[str] = []
+    print(f"\ncompared with {baseline_path}:")
+    for result in current:
+        previous = baseline.get(result.name)
+        if previous is None:
+            continue
+        ratio = result.best / previous["min"]
+        flag = "  REGRESSION" if ratio > threshold else ""
+        print(
+            f"{result.name:40s} {ratio:6.2f}x time  {result.peak_bytes / max(previous['peak_bytes'], 1):6.2f}x peak{flag}"
+        )
+        if ratio > threshold:
+            regressions.append(result.name)
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m fractal_designer.bench", description="Benchmark the IFS hot paths."
+    )
+    parser.add_argument("-o", "--output", type=Path, help="write results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="JSON file from an earlier run to compare against")
+    parser.add_argument(
+        "--threshold", type=float, default=DEFAULT_THRESHOLD, help="slowdown ratio reported as a regression"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark")
+    parser.add_argument("--quick", action="store_true", help="only run the smaller cases")
+    parser.add_argument("-k", dest="select", help="only run benchmarks whose name contains this text")
+    args = parser.parse_args(argv)
+
+    results = run(args.quick, args.repeat, args.select)
+
+    if args.output is not None:
+        document = {"meta": metadata(), "results": [result.to_json() for result in results]}
+        args.output.write_text(json.dumps(document, indent=2))
+
+    if args.compare is not None:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
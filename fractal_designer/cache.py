@@ -0,0 +1,129 @@
+"""
+Process-wide memoization of computed attractors. Results are keyed by a canonical hash of the rounded affine
+coefficients, probabilities and render parameters, and evicted least recently used first once their combined size
+exceeds a byte budget.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from typing import Protocol, TypeVar, cast
+
+import numpy as np
+
+DEFAULT_MAX_BYTES = 512 * 2**20
+DEFAULT_DECIMALS = 6
+
+
+class CacheEntry(Protocol):
+    @property
+    def nbytes(self) -> int: ...
+
+
+T = TypeVar("T", bound=CacheEntry)
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+    entries: int
+    nbytes: int
+    max_bytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def _canonical(values: Sequence[float], decimals: int) -> list[float]:
+    # Adding 0.0 folds -0.0 into 0.0 so that both spellings share a key
+    return [round(float(value), decimals) + 0.0 for value in values]
+
+
+def attractor_key(
+    mode: str,
+    coefficients: Sequence[Sequence[float]],
+    weights: Sequence[float] | None = None,
+    *,
+    decimals: int = DEFAULT_DECIMALS,
+    **params: float | str | None,
+) -> str:
+    payload = {
+        "mode": mode,
+        "coefficients": [_canonical(row, decimals) for row in coefficients],
+        "weights": None if weights is None else _canonical(weights, decimals),
+        "params": params,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def _freeze(value: object) -> None:
+    for attribute in vars(value).values():
+        if isinstance(attribute, np.ndarray):
+            attribute.flags.writeable = False
+
+
+class AttractorCache:
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str) -> CacheEntry | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        if entry.nbytes > self.max_bytes:
+            return
+        _freeze(entry)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous.nbytes
+            self._entries[key] = entry
+            self.nbytes += entry.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def get_or_compute(self, key: str, compute: Callable[[], T]) -> T:
+        entry = self.get(key)
+        if entry is not None:
+            # Keys are only shared by results of the same computation, so the entry is the T that compute returns
+            return cast(T, entry)
+        result = compute()
+        self.put(key, result)
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self.hits, self.misses, len(self._entries), self.nbytes, self.max_bytes)
+
+
+attractor_cache = AttractorCache()
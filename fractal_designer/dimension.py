@@ -0,0 +1,145 @@
+"""
+Streaming box-counting statistics for chaos-game output. A BoxCounter keeps one occupancy bitmap of the finest grid over
+a square around the attractor and derives the coarser grids from it by merging 2 x 2 blocks, so its memory is fixed by
+the finest level no matter how many points it has seen. The box-counting dimension is the slope of
+log2 N(k) against k, where N(k) is the number of occupied boxes on the 2^k x 2^k grid, fitted over the levels that the
+points seen so far resolve.
+"""
+
+import math
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+
+import numpy as np
+
+from fractal_designer.backends import DEFAULT_BATCH
+from fractal_designer.engine import (
+    ChaosGame,
+    NDArrayCoordinates,
+    NDArrayFloat64,
+    _check,  # pyright: ignore [reportPrivateUsage]
+)
+from fractal_designer.raster import Bounds, finite_bounds, square_view
+
+DEFAULT_MAX_LEVEL = 11
+MIN_LEVEL = 3
+# A level is only trusted while every occupied box holds this many points on average, so that it is not undersampled
+MIN_POINTS_PER_BOX = 8
+BOUNDS_PADDING = 0.01
+
+NDArrayInt64 = np.typing.NDArray[np.int64]
+
+
+@dataclass(frozen=True)
+class DimensionEstimate:
+    dimension: float
+    # Slopes of log2 N(k) between consecutive fitted levels
+    local_slopes: tuple[float, ...]
+    levels: tuple[int, ...]
+    box_counts: tuple[int, ...]
+    coverage: float
+    num_points: int
+    num_outside: int
+
+    @property
+    def slope_range(self) -> tuple[float, float]:
+        """
+        The smallest and largest local slope. Every level counts the same points, so the residuals of the fit are
+        correlated and a regression interval would be far too narrow; how much the slope moves across scales is the
+        honest measure of its uncertainty.
+        """
+        if not self.local_slopes:
+            return math.nan, math.nan
+        return min(self.local_slopes), max(self.local_slopes)
+
+
+class BoxCounter:
+    def __init__(self, bounds: Bounds, max_level: int = DEFAULT_MAX_LEVEL):
+        self.bounds = bounds
+        self.max_level = max_level
+        self.occupied = np.zeros([2**max_level, 2**max_level], dtype=np.bool_)
+        self.num_points = 0
+        self.num_outside = 0
+
+    @classmethod
+    def around(cls, x: NDArrayCoordinates, y: NDArrayCoordinates, max_level: int = DEFAULT_MAX_LEVEL) -> "BoxCounter":
+        """A counter over the bounding square of a first batch of points, which it has already consumed."""
+        # The square is padded a little so that points on its edge stay inside
+        counter = cls(square_view(finite_bounds(x, y) or (0.0, 1.0, 0.0, 1.0), BOUNDS_PADDING), max_level)
+        counter.update(x, y)
+        return counter
+
+    def update(self, x: NDArrayCoordinates, y: NDArrayCoordinates) -> None:
+        """Mark the boxes of a batch of points. Points outside the square are counted but otherwise ignored."""
+        size = len(self.occupied)
+        x_min, x_max, y_min, y_max = self.bounds
+        columns = np.floor((x - x_min) * (size / (x_max - x_min))).astype(np.intp)
+        rows = np.floor((y - y_min) * (size / (y_max - y_min))).astype(np.intp)
+        inside = (columns >= 0) & (columns < size) & (rows >= 0) & (rows < size)
+
+        self.occupied[rows[inside], columns[inside]] = True
+        self.num_points += int(np.count_nonzero(inside))
+        self.num_outside += len(x) - int(np.count_nonzero(inside))
+
+    def box_counts(self) -> NDArrayInt64:
+        """Occupied boxes on the 2^k x 2^k grid for k = 0 ... max_level."""
+        counts = np.zeros(self.max_level + 1, dtype=np.int64)
+        level = self.occupied
+        for k in range(self.max_level, -1, -1):
+            counts[k] = np.count_nonzero(level)
+            if k:
+                half = 1 << (k - 1)
+                level = level.reshape(half, 2, half, 2).any(axis=(1, 3))
+        return counts
+
+    def estimate(self) -> DimensionEstimate:
+        counts = self.box_counts()
+        levels = np.array(
+            [
+                k
+                for k in range(MIN_LEVEL, self.max_level + 1)
+                if counts[k] and counts[k] * MIN_POINTS_PER_BOX <= self.num_points
+            ],
+            dtype=np.int64,
+        )
+
+        dimension = math.nan
+        local_slopes: tuple[float, ...] = ()
+        if len(levels) >= 2:
+            log_counts: NDArrayFloat64 = np.log2(counts[levels].astype(np.float64))
+            dimension = float(np.polyfit(levels.astype(np.float64), log_counts, 1)[0])
+            local_slopes = tuple(float(slope) for slope in np.diff(log_counts) / np.diff(levels))
+
+        finest = int(levels[-1]) if len(levels) else 0
+        return DimensionEstimate(
+            dimension=dimension,
+            local_slopes=local_slopes,
+            levels=tuple(int(k) for k in levels),
+            box_counts=tuple(int(count) for count in counts),
+            coverage=float(counts[finest]) / 4**finest,
+            num_points=self.num_points,
+            num_outside=self.num_outside,
+        )
+
+
+def estimate_dimension(
+    maps: NDArrayFloat64,
+    weights: Sequence[float],
+    num_points: int,
+    *,
+    seed: int | None = None,
+    max_level: int = DEFAULT_MAX_LEVEL,
+    batch_size: int = DEFAULT_BATCH,
+    should_stop: Callable[[], bool] | None = None,
+) -> DimensionEstimate:
+    """Box-counting dimension of the attractor of maps from num_points chaos-game points, streamed in batches."""
+    game = ChaosGame(maps, weights, seed=seed)
+    counter: BoxCounter | None = None
+    while game.num_points < num_points:
+        _check(should_stop)
+        batch = game.advance(min(batch_size, num_points - game.num_points), should_stop)
+        if counter is None:
+            counter = BoxCounter.around(batch.x, batch.y, max_level)
+        else:
+            counter.update(batch.x, batch.y)
+    return (counter or BoxCounter((0.0, 1.0, 0.0, 1.0), max_level)).estimate()
@@ -0,0 +1,232 @@
+"""
+Array-based iterated function system (IFS) engines used by the designer. Transformations are stored as a stack of
+affine maps with shape (N, 2, 3), where each map is the top two rows of the homogeneous matrix
+[[a, b, e], [c, d, f], [0, 0, 1]].
+"""
+
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+
+import numpy as np
+
+NDArrayFloat32 = np.typing.NDArray[np.float32]
+NDArrayFloat64 = np.typing.NDArray[np.float64]
+NDArrayInt8 = np.typing.NDArray[np.int8]
+# Engines return float32 coordinates, except viewport renders that need float64 to resolve deep zooms
+NDArrayCoordinates = NDArrayFloat32 | NDArrayFloat64
+
+DEFAULT_NUM_CHAINS = 4096
+DEFAULT_BURN_IN = 32
+DEFAULT_MAX_BYTES = 256 * 2**20
+
+UNIT_SQUARE: NDArrayFloat32 = np.array([[0, 0, 1, 1], [0, 1, 1, 0]], dtype=np.float32)
+
+
+class ComputationCancelled(Exception):
+    pass
+
+
+def _check(should_stop: Callable[[], bool] | None) -> None:
+    if should_stop is not None and should_stop():
+        raise ComputationCancelled
+
+
+class MemoryBudgetError(ValueError):
+    def __init__(self, required: int, budget: int):
+        super().__init__(
+            f"Expanding this system needs about {required / 2**20:.1f} MiB, "
+            f"which exceeds the budget of {budget / 2**20:.1f} MiB"
+        )
+        self.required = required
+        self.budget = budget
+
+
+@dataclass(frozen=True)
+class ChaosResult:
+    x: NDArrayCoordinates
+    y: NDArrayCoordinates
+    indices: NDArrayInt8
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    @property
+    def nbytes(self) -> int:
+        return self.x.nbytes + self.y.nbytes + self.indices.nbytes
+
+
+@dataclass(frozen=True)
+class DiscreteResult:
+    polygons: NDArrayCoordinates
+    indices: NDArrayInt8
+    depth: int
+    fraction: float = 1.0
+
+    def __len__(self) -> int:
+        return len(self.polygons)
+
+    @property
+    def nbytes(self) -> int:
+        return self.polygons.nbytes + self.indices.nbytes
+
+
+def stack_transformations(coefficients: Sequence[Sequence[float]]) -> NDArrayFloat64:
+    """Stack (a, b, c, d, e, f) coefficient rows into an (N, 2, 3) array of affine maps."""
+    maps = np.zeros([len(coefficients), 2, 3], dtype=np.float64)
+    for i, (a, b, c, d, e, f, *_) in enumerate(coefficients):
+        maps[i] = [[a, b, e], [c, d, f]]
+    return maps
+
+
+def normalize_weights(weights: Sequence[float], num_transformations: int) -> NDArrayFloat64:
+    probabilities = np.asarray(weights, dtype=np.float64)
+    if probabilities.shape != (num_transformations,):
+        raise ValueError(f"Expected {num_transformations} probabilities, got {probabilities.size}")
+    if np.any(probabilities < 0) or probabilities.sum() <= 0:
+        raise ValueError("Probabilities must be non-negative and sum to a positive value")
+    return probabilities / probabilities.sum()
+
+
+class ChaosGame:
+    """
+    Random iteration algorithm run on many independent chains in lockstep. The generator and the position of every
+    chain are kept between calls to advance, so a render can be produced in batches, or extended later, without
+    starting again from zero.
+    """
+
+    def __init__(
+        self,
+        maps: NDArrayFloat64,
+        weights: Sequence[float],
+        *,
+        num_chains: int = DEFAULT_NUM_CHAINS,
+        burn_in: int = DEFAULT_BURN_IN,
+        seed: int | np.random.Generator | None = None,
+    ):
+        if len(maps) > np.iinfo(np.int8).max:
+            raise ValueError(f"At most {np.iinfo(np.int8).max} transformations are supported")
+
+        self.maps = maps
+        self.probabilities = normalize_weights(weights, len(maps))
+        self.num_chains = max(1, num_chains)
+        self.num_points = 0
+        self.rng = np.random.default_rng(seed)
+
+        self.x: NDArrayFloat64 = self.rng.random(self.num_chains)
+        self.y: NDArrayFloat64 = self.rng.random(self.num_chains)
+        self._iterate(self._draw(burn_in))
+
+    def _draw(self, num_steps: int) -> NDArrayInt8:
+        return self.rng.choice(len(self.maps), size=(num_steps, self.num_chains), p=self.probabilities).astype(np.int8)
+
+    def _iterate(
+        self,
+        indices: NDArrayInt8,
+        x_out: NDArrayFloat32 | None = None,
+        y_out: NDArrayFloat32 | None = None,
+        should_stop: Callable[[], bool] | None = None,
+    ) -> None:
+        a, b, e = self.maps[:, 0, 0], self.maps[:, 0, 1], self.maps[:, 0, 2]
+        c, d, f = self.maps[:, 1, 0], self.maps[:, 1, 1], self.maps[:, 1, 2]
+        x, y = self.x, self.y
+
+        for step, idx in enumerate(indices):
+            _check(should_stop)
+            x, y = a[idx] * x + b[idx] * y + e[idx], c[idx] * x + d[idx] * y + f[idx]
+            if x_out is not None and y_out is not None:
+                x_out[step] = x
+                y_out[step] = y
+
+        self.x, self.y = x, y
+
+    def advance(self, num_points: int, should_stop: Callable[[], bool] | None = None) -> ChaosResult:
+        """Draw every transformation index for the next batch up front, then advance all chains one step at a time."""
+        num_points = max(int(num_points), 0)
+        num_steps = -(-num_points // self.num_chains)
+
+        x_out = np.empty([num_steps, self.num_chains], dtype=np.float32)
+        y_out = np.empty([num_steps, self.num_chains], dtype=np.float32)
+        indices = self._draw(num_steps)
+        self._iterate(indices, x_out, y_out, should_stop)
+        self.num_points += num_points
+
+        return ChaosResult(
+            np.ascontiguousarray(x_out.reshape(-1)[:num_points]),
+            np.ascontiguousarray(y_out.reshape(-1)[:num_points]),
+            np.ascontiguousarray(indices.reshape(-1)[:num_points]),
+        )
+
+
+def chaos_game(
+    maps: NDArrayFloat64,
+    weights: Sequence[float],
+    num_points: int,
+    *,
+    num_chains: int = DEFAULT_NUM_CHAINS,
+    burn_in: int = DEFAULT_BURN_IN,
+    seed: int | np.random.Generator | None = None,
+    should_stop: Callable[[], bool] | None = None,
+) -> ChaosResult:
+    num_chains = max(1, min(num_chains, int(num_points)))
+    game = ChaosGame(maps, weights, num_chains=num_chains, burn_in=burn_in, seed=seed)
+    return game.advance(num_points, should_stop)
+
+
+def _polygon_bytes(num_vertices: int) -> int:
+    return 2 * num_vertices * np.dtype(np.float32).itemsize + np.dtype(np.int8).itemsize
+
+
+def estimate_discrete_bytes(num_transformations: int, depth: int, num_vertices: int = 4) -> int:
+    """Peak memory of expand_discrete, which keeps the previous and the current level alive at the same time."""
+    if depth <= 0 or num_transformations == 0:
+        return _polygon_bytes(num_vertices)
+    return (num_transformations**depth + num_transformations ** (depth - 1)) * _polygon_bytes(num_vertices)
+
+
+def expand_discrete(
+    maps: NDArrayFloat64,
+    depth: int,
+    *,
+    base: NDArrayFloat32 = UNIT_SQUARE,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    downsample: bool = False,
+    should_stop: Callable[[], bool] | None = None,
+) -> DiscreteResult:
+    """
+    Apply every transformation to every polygon of the previous level, one level at a time. Each level is a single
+    (k^n, 2, V) array and the next level is produced by one broadcasted einsum, so polygon i * k + j of level n + 1 is
+    transformation j applied to polygon i of level n. Levels that would exceed max_bytes either raise
+    MemoryBudgetError or, when downsample is set, are thinned to an evenly spaced subset of their parent polygons.
+    """
+    num_transformations = len(maps)
+    num_vertices = base.shape[1]
+    required = estimate_discrete_bytes(num_transformations, depth, num_vertices)
+    if required > max_bytes and not downsample:
+        raise MemoryBudgetError(required, max_bytes)
+
+    linear = maps[:, :, :2].astype(np.float32)
+    translation = maps[:, :, 2].astype(np.float32)
+    polygon_bytes = _polygon_bytes(num_vertices)
+
+    level: NDArrayFloat32 = base[np.newaxis].astype(np.float32)
+    indices: NDArrayInt8 = np.zeros([1], dtype=np.int8)
+    fraction = 1.0
+
+    if num_transformations == 0:
+        return DiscreteResult(np.empty([0, 2, num_vertices], dtype=np.float32), np.empty([0], dtype=np.int8), depth)
+
+    for _ in range(depth):
+        _check(should_stop)
+        num_parents = len(level)
+        if num_parents * (num_transformations + 1) * polygon_bytes > max_bytes:
+            keep = max(1, max_bytes // ((num_transformations + 1) * polygon_bytes))
+            level = level[np.linspace(0, num_parents - 1, keep).astype(np.intp)]
+            fraction *= keep / num_parents
+            num_parents = keep
+
+        level = np.einsum("kij,mjv->mkiv", linear, level, optimize=True)
+        level += translation[np.newaxis, :, :, np.newaxis]
+        level = level.reshape(num_parents * num_transformations, 2, num_vertices)
+        indices = np.tile(np.arange(num_transformations, dtype=np.int8), num_parents)
+
+    return DiscreteResult(level, indices, depth, fraction)
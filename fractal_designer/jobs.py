@@ -0,0 +1,91 @@
+"""
+Runs attractor computations away from the Shiny event loop. Every worker process owns one executor with a bounded
+number of pending jobs, so a single expensive render cannot queue up unbounded work or stall the other sessions
+served by the same worker.
+"""
+
+import asyncio
+import functools
+import os
+import threading
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Literal, ParamSpec, TypeVar
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+ExecutorKind = Literal["thread", "process"]
+
+
+class QueueFullError(RuntimeError):
+    def __init__(self, max_pending: int):
+        super().__init__(f"The server is busy with {max_pending} other renders. Please try again in a moment.")
+        self.max_pending = max_pending
+
+
+class CancelToken:
+    """Cooperative cancellation flag checked by the engines between steps or levels."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def __call__(self) -> bool:
+        return self._event.is_set()
+
+
+class JobRunner:
+    def __init__(self, max_workers: int | None = None, max_pending: int | None = None, kind: ExecutorKind = "thread"):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.max_workers
+        self.kind: ExecutorKind = kind
+        self.pending = 0
+        self._executor: Executor | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fractal")
+        return self._executor
+
+    async def run(self, func: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R:
+        """
+        Run func in the executor and await its result. Cancelling the awaiting task drops the job if it has not
+        started yet; jobs that are already running should be given a CancelToken so that they can stop early.
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise QueueFullError(self.max_pending)
+            self.pending += 1
+
+        future = asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+        try:
+            return await future
+        except asyncio.CancelledError:
+            future.cancel()
+            for value in (*args, *kwargs.values()):
+                if isinstance(value, CancelToken):
+                    value.cancel()
+            raise
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+job_runner = JobRunner()
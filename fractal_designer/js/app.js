@@ -1,12 +1,15 @@
 document.addEventListener("DOMContentLoaded", function () {
-    renderMathInElement(document.body, {
-        delimiters: [
-            { left: "$$", right: "$$", display: true },
-            { left: "\\[", right: "\\]", display: true },
-            { left: "$", right: "$", display: false },
-            { left: "\\(", right: "\\)", display: false },
-        ],
-    });
+    // Without the KaTeX scripts, the formula was already rendered on the server
+    if (typeof renderMathInElement === "function") {
+        renderMathInElement(document.body, {
+            delimiters: [
+                { left: "$$", right: "$$", display: true },
+                { left: "\\[", right: "\\]", display: true },
+                { left: "$", right: "$", display: false },
+                { left: "\\(", right: "\\)", display: false },
+            ],
+        });
+    }
     $("input[name=radio_mode], .add_transformation, .remove_transformation").on("change", function() {
         const button_value = $("input[type='radio'][name='radio_mode']:checked").val();
         if (button_value === "discrete" && $(".input-p")) {
@@ -18,6 +21,16 @@ document.addEventListener("DOMContentLoaded", function () {
 
         }
     });
+    // Card inputs send their values on blur, and as they are typed while the live preview follows them. Shiny reads
+    // the setting when it binds an input, so the cards are bound again
+    $("#live_preview").on("change", function() {
+        const update_on = this.checked ? "change" : "blur";
+        $(".matrix input").attr("data-update-on", update_on).data("update-on", update_on);
+        $(".matrix").each(function() {
+            Shiny.unbindAll(this);
+            Shiny.bindAll(this);
+        });
+    });
 });
 window.WebFontConfig = {
     custom: {
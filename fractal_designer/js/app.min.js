@@ -1 +1 @@
-document.addEventListener("DOMContentLoaded",function(){renderMathInElement(document.body,{delimiters:[{left:"$$",right:"$$",display:!0},{left:"\\[",right:"\\]",display:!0},{left:"$",right:"$",display:!1},{left:"\\(",right:"\\)",display:!1}]}),$("input[name=radio_mode], .add_transformation, .remove_transformation").on("change",function(){const e=$("input[type='radio'][name='radio_mode']:checked").val();"discrete"===e&&$(".input-p")?($(".wrapper").css("max-width","20em"),$(".input-p").css("display","none")):"continuous"===e&&$(".input-p")&&($(".wrapper").css("max-width","25em"),$(".input-p").css("display","block"))})}),window.WebFontConfig={custom:{families:["KaTeX_AMS","KaTeX_Caligraphic:n4,n7","KaTeX_Fraktur:n4,n7","KaTeX_Main:n4,n7,i4,i7","KaTeX_Math:i4,i7","KaTeX_Script","KaTeX_SansSerif:n4,n7,i4","KaTeX_Size1","KaTeX_Size2","KaTeX_Size3","KaTeX_Size4","KaTeX_Typewriter"]}};
\ No newline at end of file
+document.addEventListener("DOMContentLoaded",function(){"function"==typeof renderMathInElement&&renderMathInElement(document.body,{delimiters:[{left:"$$",right:"$$",display:!0},{left:"\\[",right:"\\]",display:!0},{left:"$",right:"$",display:!1},{left:"\\(",right:"\\)",display:!1}]}),$("input[name=radio_mode], .add_transformation, .remove_transformation").on("change",function(){const e=$("input[type='radio'][name='radio_mode']:checked").val();"discrete"===e&&$(".input-p")?($(".wrapper").css("max-width","20em"),$(".input-p").css("display","none")):"continuous"===e&&$(".input-p")&&($(".wrapper").css("max-width","25em"),$(".input-p").css("display","block"))}),$("#live_preview").on("change",function(){const e=this.checked?"change":"blur";$(".matrix input").attr("data-update-on",e).data("update-on",e),$(".matrix").each(function(){Shiny.unbindAll(this),Shiny.bindAll(this)})})}),window.WebFontConfig={custom:{families:["KaTeX_AMS","KaTeX_Caligraphic:n4,n7","KaTeX_Fraktur:n4,n7","KaTeX_Main:n4,n7,i4,i7","KaTeX_Math:i4,i7","KaTeX_Script","KaTeX_SansSerif:n4,n7,i4","KaTeX_Size1","KaTeX_Size2","KaTeX_Size3","KaTeX_Size4","KaTeX_Typewriter"]}};
\ No newline at end of file
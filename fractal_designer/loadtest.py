@@ -0,0 +1,385 @@
+"""
+Local load test for the designer. Starts the app in a child process, or targets one that is already running, and
+connects simulated sessions over the Shiny websocket protocol. Each session behaves like a user: it loads a preset,
+fills in the cards the way the browser would, changes the iteration count, adds and removes transformations and
+clicks Graph, with a random think time between actions:
+
+    python -m fractal_designer.loadtest --sessions 1 8 32 --duration 30
+
+Every action is timed from the message that triggers it to the server's reply. A graph click is answered when the new
+traces reach the plot widget, and any other action when the server flushes its outputs. While the sessions run, the
+harness probes /metrics, which is served by the same event loop, so the extra time those probes take over an idle
+server is the event-loop lag. When it started the server, it also samples the server's resident memory from /proc.
+Nothing is fetched from the network, so the test runs offline.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+import websockets
+
+from fractal_designer.presets import PRESETS, Preset
+
+DEFAULT_SESSIONS = (1, 4, 16)
+DEFAULT_DURATION = 20.0
+DEFAULT_THINK = 0.5
+ACTION_TIMEOUT = 60.0
+PROBE_INTERVAL = 0.25
+BASELINE_PROBES = 20
+STARTUP_TIMEOUT = 30.0
+ITERATIONS = {"discrete": (2, 6), "continuous": (10_000, 200_000)}
+PERCENTILES = (50, 95, 99)
+
+Message = dict[str, Any]
+
+
+@dataclass
+class LevelReport:
+    sessions: int
+    duration: float
+    actions: int = 0
+    renders: int = 0
+    rejected: int = 0
+    errors: int = 0
+    latency: dict[str, list[float]] = field(default_factory=dict[str, list[float]])
+    lag: list[float] = field(default_factory=list[float])
+    baseline_rss: int | None = None
+    peak_rss: int | None = None
+
+    @property
+    def throughput(self) -> float:
+        return self.actions / self.duration
+
+    @property
+    def rss_per_session(self) -> float | None:
+        if self.baseline_rss is None or self.peak_rss is None:
+            return None
+        return (self.peak_rss - self.baseline_rss) / self.sessions
+
+    def percentiles(self, samples: list[float]) -> dict[str, float]:
+        if not samples:
+            return {f"p{q}": float("nan") for q in PERCENTILES}
+        if len(samples) == 1:
+            return {f"p{q}": samples[0] for q in PERCENTILES}
+        cuts = statistics.quantiles(samples, n=100, method="inclusive")
+        return {f"p{q}": cuts[q - 1] for q in PERCENTILES}
+
+    def to_json(self) -> dict[str, Any]:
+        data = asdict(self)
+        data["latency"] = {
+            action: {"count": len(samples), **self.percentiles(samples)} for action, samples in self.latency.items()
+        }
+        data["lag"] = self.percentiles(self.lag)
+        data["throughput"] = self.throughput
+        data["rss_per_session"] = self.rss_per_session
+        return data
+
+
+class SimulatedSession:
+    """One headless browser tab, speaking just enough of the Shiny protocol to drive the designer."""
+
+    def __init__(self, url: str, report: LevelReport, rng: random.Random, think: float):
+        self.url = url
+        self.report = report
+        self.rng = rng
+        self.think = think
+        self.clicks: dict[str, int] = {}
+        self.mode = "discrete"
+        self.num_cards = 0
+        self.weights: tuple[float, ...] | None = None
+        self.websocket: websockets.ClientConnection | None = None
+
+    async def run(self, deadline: float) -> None:
+        try:
+            async with websockets.connect(self.url, max_size=None) as websocket:
+                self.websocket = websocket
+                await self.send("init", self.initial_inputs())
+                await self.receive_until(flushed)
+                while time.monotonic() < deadline:
+                    await self.step()
+                    await asyncio.sleep(self.rng.uniform(0, 2 * self.think))
+        except (OSError, TimeoutError, websockets.WebSocketException):
+            self.report.errors += 1
+
+    async def warm_up(self) -> None:
+        """Load and graph every preset once, so that work done on first use is not billed to the measured sessions."""
+        async with websockets.connect(self.url, max_size=None) as websocket:
+            self.websocket = websocket
+            await self.send("init", self.initial_inputs())
+            await self.receive_until(flushed)
+            for name in PRESETS:
+                await self.load_preset(name)
+                await self.graph()
+
+    def initial_inputs(self) -> dict[str, Any]:
+        inputs: dict[str, Any] = {
+            "radio_mode": self.mode,
+            "iterations_discrete": 1,
+            "iterations_continuous": 1,
+            "render_mode": "points",
+            "progressive": False,
+            "sharded": False,
+            "live_preview": False,
+            "debug": False,
+            "preset": "triangle",
+            ".clientdata_url_hostname": "127.0.0.1",
+            ".clientdata_url_search": "",
+            ".clientdata_pixelratio": 1,
+            ".clientdata_output_plot_hidden": False,
+        }
+        for button in ("add_transformation", "remove_transformation", "graph_transformations", "graph_preset"):
+            inputs[f"{button}:shiny.action"] = 0
+        return inputs
+
+    async def send(self, method: str, data: dict[str, Any]) -> None:
+        assert self.websocket is not None
+        await self.websocket.send(json.dumps({"method": method, "data": data}))
+
+    async def receive_until(self, done: Callable[[Message], bool]) -> Message:
+        assert self.websocket is not None
+        async with asyncio.timeout(ACTION_TIMEOUT):
+            while True:
+                message: Message = json.loads(await self.websocket.recv())
+                if done(message):
+                    return message
+
+    async def act(self, action: str, data: dict[str, Any], done: Callable[[Message], bool]) -> Message:
+        start = time.perf_counter()
+        await self.send("update", data)
+        message = await self.receive_until(done)
+        self.report.latency.setdefault(action, []).append(time.perf_counter() - start)
+        self.report.actions += 1
+        return message
+
+    def click(self, button: str) -> dict[str, int]:
+        self.clicks[button] = self.clicks.get(button, 0) + 1
+        return {f"{button}:shiny.action": self.clicks[button]}
+
+    async def step(self) -> None:
+        if self.num_cards == 0 or self.rng.random() < 0.2:
+            await self.load_preset(self.rng.choice(list(PRESETS)))
+        elif self.mode == "discrete" and self.rng.random() < 0.3:
+            await self.add_and_remove()
+        else:
+            low, high = ITERATIONS[self.mode]
+            iterations = self.rng.randint(low, high)
+            await self.act("iterations", {f"iterations_{self.mode}": iterations}, flushed)
+        await self.graph()
+
+    async def load_preset(self, name: str) -> None:
+        preset: Preset = PRESETS[name]
+        await self.act("preset", {"preset": name, **self.click("graph_preset")}, flushed)
+        # The browser binds the inserted cards and reports their values, which the harness does on its behalf
+        cards: dict[str, float] = {}
+        weights = preset.weights or (0.0,) * len(preset.coefficients)
+        for index, (coefficients, weight) in enumerate(zip(preset.coefficients, weights)):
+            for parameter, value in zip("abcdefp", (*coefficients, weight)):
+                cards[f"transformation_{index}-{parameter}"] = value
+        await self.act(
+            "cards", {**cards, "radio_mode": preset.mode, f"iterations_{preset.mode}": preset.iterations}, flushed
+        )
+        self.mode = preset.mode
+        self.num_cards = len(preset.coefficients)
+        self.weights = preset.weights
+
+    async def add_and_remove(self) -> None:
+        index = self.num_cards
+        await self.act("add", self.click("add_transformation"), flushed)
+        card = dict(zip("abcdefp", (0.5, 0.0, 0.0, 0.5, self.rng.random() / 2, self.rng.random() / 2, 0.0)))
+        await self.act(
+            "cards", {f"transformation_{index}-{parameter}": value for parameter, value in card.items()}, flushed
+        )
+        self.num_cards += 1
+        await self.graph()
+        await self.act("remove", self.click("remove_transformation"), flushed)
+        self.num_cards -= 1
+
+    async def graph(self) -> None:
+        message = await self.act("graph", self.click("graph_transformations"), drawn)
+        # A full job queue answers with a "Server Busy" dialog instead of a plot
+        if "modal" in message:
+            self.report.rejected += 1
+        else:
+            self.report.renders += 1
+
+
+def flushed(message: Message) -> bool:
+    return "values" in message
+
+
+def drawn(message: Message) -> bool:
+    """New traces reached the plot widget, or the server explained why it would not draw."""
+    custom: dict[str, str] = message.get("custom", {})
+    if "shinywidgets_comm_msg" in custom:
+        state = json.loads(custom["shinywidgets_comm_msg"])["content"]["data"].get("state", {})
+        return "_py2js_addTraces" in state
+    return "modal" in message
+
+
+async def probe(host: str, port: int) -> float:
+    """Seconds to fetch /metrics, which the server answers on the same event loop as the sessions."""
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET /metrics HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    return time.perf_counter() - start
+
+
+def resident_bytes(pid: int) -> int | None:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+async def monitor(host: str, port: int, pid: int | None, baseline: float, report: LevelReport, stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            report.lag.append(max(0.0, await probe(host, port) - baseline))
+        except OSError:
+            report.errors += 1
+        if pid is not None:
+            rss = resident_bytes(pid)
+            if rss is not None:
+                report.peak_rss = max(report.peak_rss or 0, rss)
+        try:
+            await asyncio.wait_for(stop.wait(), PROBE_INTERVAL)
+        except TimeoutError:
+            pass
+
+
+async def run_level(
+    host: str, port: int, pid: int | None, sessions: int, duration: float, think: float, seed: int
+) -> LevelReport:
+    report = LevelReport(sessions, duration)
+    url = f"ws://{host}:{port}/websocket/"
+    await SimulatedSession(url, LevelReport(1, 0.0), random.Random(seed), 0.0).warm_up()
+    baseline = statistics.median([await probe(host, port) for _ in range(BASELINE_PROBES)])
+    if pid is not None:
+        report.baseline_rss = report.peak_rss = resident_bytes(pid)
+
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(monitor(host, port, pid, baseline, report, stop))
+    start = time.monotonic()
+    await asyncio.gather(
+        *(
+            SimulatedSession(url, report, random.Random(seed + index), think).run(start + duration)
+            for index in range(sessions)
+        )
+    )
+    # Sessions finish the action in progress when time runs out, so throughput is measured over the real run
+    report.duration = time.monotonic() - start
+    stop.set()
+    await watcher
+    return report
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int) -> subprocess.Popen[bytes]:
+    """Serve the designer on port from the repository root, where it finds its JavaScript and CSS."""
+    root = Path(__file__).resolve().parent.parent
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "fractal_designer.app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=root,
+        env={**os.environ, "PYTHONPATH": str(root)},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"the server exited with status {server.returncode} while starting")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError(f"the server did not accept connections within {STARTUP_TIMEOUT:.0f} s")
+
+
+def print_report(report: LevelReport) -> None:
+    print(
+        f"{report.sessions} sessions: {report.actions} actions in {report.duration:.1f} s "
+        f"({report.throughput:.1f}/s, {report.renders / report.duration:.2f} renders/s), "
+        f"{report.rejected} renders rejected as busy, {report.errors} errors"
+    )
+    for action, samples in sorted(report.latency.items()):
+        cuts = report.percentiles(samples)
+        print(
+            f"  {action:<12} n={len(samples):<6}"
+            + "".join(f" {name} {value * 1000:8.1f} ms" for name, value in cuts.items())
+        )
+    lag = report.percentiles(report.lag)
+    print("  event loop  " + " " * 8 + "".join(f" {name} {value * 1000:8.1f} ms" for name, value in lag.items()))
+    if report.rss_per_session is not None and report.peak_rss is not None:
+        print(
+            f"  memory       peak {report.peak_rss / 2**20:.1f} MiB, {report.rss_per_session / 2**20:.2f} MiB/session"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m fractal_designer.loadtest", description="Load-test the designer with simulated sessions."
+    )
+    parser.add_argument(
+        "-n", "--sessions", type=int, nargs="+", default=DEFAULT_SESSIONS, help="concurrent sessions per level"
+    )
+    parser.add_argument("-d", "--duration", type=float, default=DEFAULT_DURATION, help="seconds per level")
+    parser.add_argument("--think", type=float, default=DEFAULT_THINK, help="mean seconds between actions")
+    parser.add_argument("--url", default=None, help="test a running server, such as http://127.0.0.1:8000")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the simulated users")
+    parser.add_argument("-o", "--output", type=Path, default=None, help="write the reports to this JSON file")
+    args = parser.parse_args(argv)
+
+    reports: list[LevelReport] = []
+    for sessions in args.sessions:
+        # Each level gets a fresh server, so that memory and caches left over from the last level do not count
+        server = None
+        if args.url is None:
+            host, port = "127.0.0.1", free_port()
+            server = start_server(port)
+        else:
+            address = args.url.split("://", 1)[-1].rstrip("/")
+            host, _, port_text = address.partition(":")
+            port = int(port_text or 80)
+        try:
+            pid = None if server is None else server.pid
+            report = asyncio.run(run_level(host, port, pid, sessions, args.duration, args.think, args.seed))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+        print_report(report)
+        reports.append(report)
+
+    if args.output is not None:
+        args.output.write_text(json.dumps([report.to_json() for report in reports], indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""
+Level of detail for discrete mode. Polygons that fit in a few pixels are not worth sending as vector shapes: the
+browser would receive and fill every one of them although it can only show a handful of pixels. They are rasterized
+into a coverage mask instead, which merges touching polygons of the same transformation into one block of pixels and
+costs a fixed number of bytes, and only the polygons large enough to show their shape stay vector traces. Polygons are
+judged by their bounding box rather than their area, so that a long sliver of almost no area is still drawn as a shape.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from fractal_designer.engine import DiscreteResult
+from fractal_designer.raster import Bounds, NDArrayUInt32, rasterize_parallelograms
+
+# Polygons whose bounding box is narrower than this many pixels along both axes are rasterized
+DEFAULT_MIN_PIXELS = 2.0
+
+
+@dataclass(frozen=True)
+class LevelOfDetail:
+    polygons: DiscreteResult
+    coverage: NDArrayUInt32 | None
+    num_rasterized: int
+
+
+def pixel_extents(result: DiscreteResult, bounds: Bounds, resolution: tuple[int, int]) -> np.typing.NDArray[np.float64]:
+    """Larger side of the bounding box of every polygon, in pixels."""
+    x_min, x_max, y_min, y_max = bounds
+    pixel = np.array([(x_max - x_min) / resolution[0], (y_max - y_min) / resolution[1]])
+    return (np.ptp(result.polygons, axis=2).astype(np.float64) / pixel).max(axis=1)
+
+
+def level_of_detail(
+    result: DiscreteResult,
+    num_transformations: int,
+    bounds: Bounds,
+    resolution: tuple[int, int],
+    min_pixels: float = DEFAULT_MIN_PIXELS,
+) -> LevelOfDetail:
+    """Split result into the polygons drawn as shapes and a coverage mask of the ones that fit in min_pixels."""
+    if not len(result) or result.polygons.shape[2] != 4:
+        return LevelOfDetail(result, None, 0)
+
+    small = pixel_extents(result, bounds, resolution) < min_pixels
+    num_small = int(np.count_nonzero(small))
+    if not num_small:
+        return LevelOfDetail(result, None, 0)
+
+    coverage = rasterize_parallelograms(
+        result.polygons[small], result.indices[small], num_transformations, bounds, resolution
+    )
+    large = DiscreteResult(result.polygons[~small], result.indices[~small], result.depth, result.fraction)
+    return LevelOfDetail(large, coverage, num_small)
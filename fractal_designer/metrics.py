@@ -0,0 +1,147 @@
+"""
+Lightweight instrumentation for the render path. Each render carries a RenderTimings that collects per-stage wall
+times and point/vertex counts; finished renders are written as one structured log line and folded into process-wide
+counters and latency histograms, which are served in the Prometheus text format at /metrics. Recording a stage costs
+two perf_counter calls and a dictionary update, so instrumentation stays on in production.
+"""
+
+import bisect
+import json
+import logging
+import threading
+import time
+from collections.abc import Generator
+from contextlib import contextmanager
+
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+
+from fractal_designer.cache import attractor_cache
+from fractal_designer.jobs import job_runner
+
+logger = logging.getLogger("fractal_designer.render")
+
+# Upper bounds in seconds, chosen to separate interactive renders from the multi-second continuous ones
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class RenderTimings:
+    def __init__(self, mode: str, session_id: str = ""):
+        self.mode = mode
+        self.session_id = session_id
+        self.started = time.perf_counter()
+        self.stages: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.outcome = "ok"
+
+    @contextmanager
+    def stage(self, name: str) -> Generator[None]:
+        """Time the enclosed block. Repeated stages, such as the batches of a progressive render, add up."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name: str, value: int) -> None:
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def merge(self, other: "RenderTimings") -> None:
+        """Add the stages and counts of timings taken elsewhere, such as in a job that worked on this render."""
+        for name, seconds in other.stages.items():
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+        for name, value in other.counts.items():
+            self.count(name, value)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def as_dict(self) -> dict[str, object]:
+        return {
+            "event": "render",
+            "session": self.session_id,
+            "mode": self.mode,
+            "outcome": self.outcome,
+            "total_ms": round(self.elapsed * 1000, 2),
+            **{f"{name}_ms": round(seconds * 1000, 2) for name, seconds in self.stages.items()},
+            **self.counts,
+        }
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+    def exposition(self, name: str, labels: str) -> list[str]:
+        lines: list[str] = []
+        cumulative = 0
+        for bound, bucket in zip((*self.buckets, float("inf")), self.counts):
+            cumulative += bucket
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {self.total:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+class RenderMetrics:
+    def __init__(self):
+        self.renders: dict[tuple[str, str], int] = {}
+        self.latency: dict[str, Histogram] = {}
+        self.stages: dict[tuple[str, str], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def record(self, timings: RenderTimings) -> None:
+        elapsed = timings.elapsed
+        with self._lock:
+            key = (timings.mode, timings.outcome)
+            self.renders[key] = self.renders.get(key, 0) + 1
+            if timings.outcome == "ok":
+                self.latency.setdefault(timings.mode, Histogram()).observe(elapsed)
+                for name, seconds in timings.stages.items():
+                    self.stages.setdefault((timings.mode, name), Histogram()).observe(seconds)
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(timings.as_dict()))
+
+    def exposition(self) -> str:
+        cache = attractor_cache.stats()
+        lines = ["# TYPE fractal_renders_total counter"]
+        with self._lock:
+            for (mode, outcome), count in sorted(self.renders.items()):
+                lines.append(f'fractal_renders_total{{mode="{mode}",outcome="{outcome}"}} {count}')
+            lines.append("# TYPE fractal_render_seconds histogram")
+            for mode, histogram in sorted(self.latency.items()):
+                lines += histogram.exposition("fractal_render_seconds", f'mode="{mode}"')
+            lines.append("# TYPE fractal_render_stage_seconds histogram")
+            for (mode, name), histogram in sorted(self.stages.items()):
+                lines += histogram.exposition("fractal_render_stage_seconds", f'mode="{mode}",stage="{name}"')
+        lines += [
+            "# TYPE fractal_cache_hits_total counter",
+            f"fractal_cache_hits_total {cache.hits}",
+            "# TYPE fractal_cache_misses_total counter",
+            f"fractal_cache_misses_total {cache.misses}",
+            "# TYPE fractal_cache_hit_ratio gauge",
+            f"fractal_cache_hit_ratio {cache.hit_rate:.4f}",
+            "# TYPE fractal_cache_entries gauge",
+            f"fractal_cache_entries {cache.entries}",
+            "# TYPE fractal_cache_bytes gauge",
+            f"fractal_cache_bytes {cache.nbytes}",
+            "# TYPE fractal_jobs_pending gauge",
+            f"fractal_jobs_pending {job_runner.pending}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+render_metrics = RenderMetrics()
+
+
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    return PlainTextResponse(render_metrics.exposition(), media_type="text/plain; version=0.0.4")
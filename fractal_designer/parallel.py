@@ -0,0 +1,196 @@
+"""
+Continuous-mode renders sharded across worker processes. Each worker runs its own chaos game from an independent
+SeedSequence child stream, with its own burn-in, and bins its points into a private density grid that lives in one
+shared-memory block, so no points cross a process boundary. The grids are summed once every worker has finished. The
+result depends only on the seed and the number of workers, not on how the workers are scheduled.
+"""
+
+import os
+import threading
+import traceback
+from collections.abc import Callable, Sequence
+from concurrent.futures import FIRST_EXCEPTION, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from fractal_designer.backends import DEFAULT_BATCH, get_backend
+from fractal_designer.engine import DEFAULT_BURN_IN, ComputationCancelled, NDArrayFloat64
+from fractal_designer.raster import Bounds, NDArrayUInt32
+
+# The shared block starts with a stop flag, padded so that the grids that follow are cache-line aligned
+CONTROL_BYTES = 64
+POLL_INTERVAL = 0.05
+
+
+@dataclass(frozen=True)
+class DensityResult:
+    counts: NDArrayUInt32
+    bounds: Bounds
+    num_points: int
+    workers: int
+
+    def __len__(self) -> int:
+        return self.num_points
+
+    @property
+    def nbytes(self) -> int:
+        return self.counts.nbytes
+
+
+@dataclass(frozen=True)
+class Shard:
+    memory: str
+    index: int
+    shape: tuple[int, int, int, int]
+    maps: NDArrayFloat64
+    weights: tuple[float, ...]
+    bounds: Bounds
+    num_points: int
+    seed: np.random.SeedSequence
+    batch_size: int
+    backend: str
+    burn_in: int = DEFAULT_BURN_IN
+
+
+class ShardPool:
+    """
+    Worker processes kept alive between renders, so that only the first sharded render pays for starting them. They
+    are spawned rather than forked, because forking a process that already runs threads is not safe.
+    """
+
+    def __init__(self):
+        self.workers = 0
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def executor(self, workers: int) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None or self.workers < workers:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+                self.workers = workers
+            return self._executor
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                self.workers = 0
+
+
+shard_pool = ShardPool()
+
+
+def default_workers() -> int:
+    return os.process_cpu_count() or 1
+
+
+def split_points(num_points: int, workers: int) -> list[int]:
+    """Divide num_points as evenly as possible, giving the remainder to the first workers."""
+    share, remainder = divmod(num_points, workers)
+    return [share + (index < remainder) for index in range(workers)]
+
+
+def _buffer(memory: SharedMemory) -> memoryview:
+    # Only a closed block has no buffer
+    assert memory.buf is not None
+    return memory.buf
+
+
+def _play(shard: Shard, buffer: memoryview) -> int:
+    counts: NDArrayUInt32 = np.ndarray(shard.shape, dtype=np.uint32, buffer=buffer, offset=CONTROL_BYTES)[shard.index]
+    return get_backend(shard.backend).accumulate_density(
+        counts,
+        shard.maps,
+        shard.weights,
+        shard.num_points,
+        shard.bounds,
+        burn_in=shard.burn_in,
+        seed=shard.seed,
+        batch_size=shard.batch_size,
+        should_stop=lambda: bool(buffer[0]),
+    )
+
+
+def run_shard(shard: Shard) -> int:
+    """Worker entry point: play one shard of the chaos game into its own grid and return the points it drew."""
+    memory = SharedMemory(name=shard.memory, track=False)
+    try:
+        return _play(shard, _buffer(memory))
+    except BaseException as error:
+        # Views of the block held by the failed frames would keep it from being closed
+        traceback.clear_frames(error.__traceback__)
+        raise
+    finally:
+        memory.close()
+
+
+def sharded_density(
+    maps: NDArrayFloat64,
+    weights: Sequence[float],
+    num_points: int,
+    bounds: Bounds,
+    resolution: tuple[int, int],
+    *,
+    workers: int | None = None,
+    burn_in: int = DEFAULT_BURN_IN,
+    seed: int | None = None,
+    batch_size: int = DEFAULT_BATCH,
+    backend: str | None = None,
+    should_stop: Callable[[], bool] | None = None,
+) -> DensityResult:
+    """
+    (C, H, W) density of num_points chaos-game points split across worker processes. Worker i draws from child i of
+    SeedSequence(seed), so a fixed seed, worker count and backend give the same histogram on every run.
+    """
+    backend = get_backend(backend).name
+    workers = max(1, min(workers or default_workers(), num_points or 1))
+    width, height = resolution
+    shape = (workers, len(maps), height, width)
+    size = CONTROL_BYTES + int(np.prod(shape)) * np.dtype(np.uint32).itemsize
+
+    # A new block is zero-filled, which clears both the stop flag and the grids
+    memory = SharedMemory(create=True, size=size)
+    buffer = _buffer(memory)
+    try:
+        executor = shard_pool.executor(workers)
+        futures: list[Future[int]] = [
+            executor.submit(
+                run_shard,
+                Shard(
+                    memory.name, index, shape, maps, tuple(weights), bounds, share, child, batch_size, backend, burn_in
+                ),
+            )
+            for index, (share, child) in enumerate(
+                zip(split_points(num_points, workers), np.random.SeedSequence(seed).spawn(workers))
+            )
+        ]
+
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_EXCEPTION)
+            if any(future.exception() is not None for future in done) or (should_stop is not None and should_stop()):
+                buffer[0] = 1
+                wait(pending)
+                break
+
+        # A worker stopped by the flag raises ComputationCancelled, which must not hide the error that set the flag
+        for future in futures:
+            error = future.exception()
+            if error is not None and not isinstance(error, ComputationCancelled):
+                raise error
+        if buffer[0]:
+            raise ComputationCancelled
+
+        drawn = sum(future.result() for future in futures)
+
+        counts = np.ndarray(shape, dtype=np.uint32, buffer=buffer, offset=CONTROL_BYTES).sum(axis=0, dtype=np.uint32)
+        return DensityResult(counts, bounds, drawn, workers)
+    finally:
+        memory.close()
+        memory.unlink()
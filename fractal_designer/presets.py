@@ -0,0 +1,38 @@
+"""
+The preset fractals offered by the designer. They are kept apart from the app, so that the benchmarks and the load
+test can use them without building the app and its assets.
+"""
+
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Preset:
+    label: str
+    mode: str
+    coefficients: tuple[tuple[float, float, float, float, float, float], ...]
+    weights: tuple[float, ...] | None
+    iterations: int
+
+
+PRESETS: dict[str, Preset] = {
+    "triangle": Preset(
+        "Sierpiński triangle",
+        "discrete",
+        ((0.5, 0, 0, 0.5, 0, 0), (0.5, 0, 0, 0.5, 0.25, 0.5), (0.5, 0, 0, 0.5, 0.5, 0)),
+        None,
+        3,
+    ),
+    "fern": Preset(
+        "Fern",
+        "continuous",
+        (
+            (0, 0, 0, 0.16, 0, 0),
+            (0.85, 0.04, -0.04, 0.85, 0, 1.6),
+            (0.2, -0.26, 0.23, 0.22, 0, 1.6),
+            (-0.15, 0.28, 0.26, 0.24, 0, 0.44),
+        ),
+        (0.01, 0.85, 0.07, 0.07),
+        2500,
+    ),
+}
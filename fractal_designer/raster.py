@@ -0,0 +1,244 @@
+"""
+Server-side density rendering for chaos-game output. Points are binned into a fixed-resolution histogram with one
+channel per transformation and tone mapped into a single RGB image, so the payload sent to the browser depends only on
+the resolution and not on the number of points.
+"""
+
+import base64
+import struct
+import zlib
+from collections.abc import Sequence
+from typing import cast
+
+import numpy as np
+import plotly.graph_objects as go
+from plotly.basedatatypes import BaseTraceType
+
+from fractal_designer.engine import NDArrayCoordinates, NDArrayFloat64, NDArrayInt8
+
+NDArrayUInt32 = np.typing.NDArray[np.uint32]
+NDArrayUInt8 = np.typing.NDArray[np.uint8]
+Bounds = tuple[float, float, float, float]
+
+BACKGROUND = (255, 255, 255)
+# Parallelograms are sampled in chunks of at most this many points
+MAX_RASTER_SAMPLES = 2**20
+
+
+def hex_to_rgb(color: str) -> tuple[int, int, int]:
+    color = color.lstrip("#")
+    return int(color[0:2], 16), int(color[2:4], 16), int(color[4:6], 16)
+
+
+def finite_bounds(x: NDArrayCoordinates, y: NDArrayCoordinates) -> Bounds | None:
+    """Bounding box of the points whose coordinates are both finite, or None if there are none."""
+    finite = np.isfinite(x) & np.isfinite(y)
+    if not finite.any():
+        return None
+    x, y = x[finite], y[finite]
+    return float(x.min()), float(x.max()), float(y.min()), float(y.max())
+
+
+def square_view(bounds: Bounds, padding: float) -> Bounds:
+    """The smallest square around bounds with a margin, so that the points are shown without distorting them."""
+    x_min, x_max, y_min, y_max = bounds
+    side = max(x_max - x_min, y_max - y_min, 1e-6) * (1 + 2 * padding)
+    x_center, y_center = (x_min + x_max) / 2, (y_min + y_max) / 2
+    return x_center - side / 2, x_center + side / 2, y_center - side / 2, y_center + side / 2
+
+
+def empty_density(num_transformations: int, resolution: tuple[int, int]) -> NDArrayUInt32:
+    width, height = resolution
+    return np.zeros([num_transformations, height, width], dtype=np.uint32)
+
+
+def accumulate_density(
+    counts: NDArrayUInt32, x: NDArrayCoordinates, y: NDArrayCoordinates, indices: NDArrayInt8, bounds: Bounds
+) -> NDArrayUInt32:
+    """Add a batch of points to a (C, H, W) histogram in place. Row 0 is the bottom of the image."""
+    _, height, width = counts.shape
+    x_min, x_max, y_min, y_max = bounds
+
+    # Python floats keep the precision of the points, so float64 points from a deep zoom are binned exactly
+    columns = ((x - x_min) * (width / (x_max - x_min))).astype(np.intp)
+    rows = ((y - y_min) * (height / (y_max - y_min))).astype(np.intp)
+    inside = (columns >= 0) & (columns < width) & (rows >= 0) & (rows < height)
+
+    flat = (indices[inside].astype(np.intp) * height + rows[inside]) * width + columns[inside]
+    counts += np.bincount(flat, minlength=counts.size).reshape(counts.shape).astype(np.uint32)
+    return counts
+
+
+def density(
+    x: NDArrayCoordinates,
+    y: NDArrayCoordinates,
+    indices: NDArrayInt8,
+    num_transformations: int,
+    bounds: Bounds,
+    resolution: tuple[int, int],
+) -> NDArrayUInt32:
+    return accumulate_density(empty_density(num_transformations, resolution), x, y, indices, bounds)
+
+
+def visible_range(
+    origin: NDArrayCoordinates, edge: NDArrayCoordinates, other: NDArrayCoordinates, bounds: Bounds
+) -> tuple[NDArrayFloat64, NDArrayFloat64]:
+    """
+    The range of t in [0, 1] for which the segment origin + t * edge, swept along the other edge, can meet bounds. Every
+    point of a parallelogram inside bounds has its parameter along edge in this range. Empty ranges have low > high.
+    """
+    low: NDArrayFloat64 = np.zeros(len(origin))
+    high: NDArrayFloat64 = np.ones(len(origin))
+    for axis, (lower, upper) in enumerate((bounds[:2], bounds[2:])):
+        start, step = origin[:, axis], edge[:, axis]
+        lower_limit = lower - np.maximum(other[:, axis], 0) - start
+        upper_limit = upper - np.minimum(other[:, axis], 0) - start
+        with np.errstate(divide="ignore", invalid="ignore"):
+            enter, leave = lower_limit / step, upper_limit / step
+        # An edge parallel to this axis is inside the slab for every t or for none
+        parallel = step == 0
+        inside = (lower_limit <= 0) & (upper_limit >= 0)
+        low = np.maximum(low, np.where(parallel, np.where(inside, 0, np.inf), np.minimum(enter, leave)))
+        high = np.minimum(high, np.where(parallel, np.where(inside, 1, -np.inf), np.maximum(enter, leave)))
+    return low, high
+
+
+def rasterize_parallelograms(
+    polygons: NDArrayCoordinates,
+    indices: NDArrayInt8,
+    num_transformations: int,
+    bounds: Bounds,
+    resolution: tuple[int, int],
+) -> NDArrayUInt32:
+    """
+    Coverage histogram of affine images of the unit square, whose vertices are ordered (0, 0), (0, 1), (1, 1), (1, 0)
+    as in engine.UNIT_SQUARE. Each parallelogram is first cut down to the part of it that can reach bounds, then sampled
+    on a grid that is finer than one pixel along both edges, with at most two more samples per edge than the histogram
+    has pixels along its longer side. Polygons that need the same grid size are sampled together, MAX_RASTER_SAMPLES
+    points at a time.
+    """
+    counts = empty_density(num_transformations, resolution)
+    origin = polygons[:, :, 0]
+    edge_u = polygons[:, :, 3] - origin
+    edge_v = polygons[:, :, 1] - origin
+    u_low, u_high = visible_range(origin, edge_u, edge_v, bounds)
+    v_low, v_high = visible_range(origin, edge_v, edge_u, bounds)
+    visible = (u_low <= u_high) & (v_low <= v_high)
+    if not visible.any():
+        return counts
+
+    # Samples are placed in the precision of the polygons, as they were before the cut
+    dtype = polygons.dtype
+    origin = (
+        origin[visible] + edge_u[visible] * u_low[visible, np.newaxis] + edge_v[visible] * v_low[visible, np.newaxis]
+    ).astype(dtype)
+    edge_u = (edge_u[visible] * (u_high - u_low)[visible, np.newaxis]).astype(dtype)
+    edge_v = (edge_v[visible] * (v_high - v_low)[visible, np.newaxis]).astype(dtype)
+    indices = indices[visible]
+
+    width, height = resolution
+    x_min, x_max, y_min, y_max = bounds
+    scale = np.array([width / (x_max - x_min), height / (y_max - y_min)], dtype=np.float32)
+    longest = np.maximum(np.abs(edge_u * scale).max(axis=1), np.abs(edge_v * scale).max(axis=1))
+    # Consecutive samples are less than a pixel apart, so that no pixel is skipped where an edge crosses a pixel border
+    samples = np.minimum(np.floor(longest) + 1, max(width, height) + 1).astype(np.intp) + 1
+
+    for size in np.unique(samples):
+        grid = np.linspace(0, 1, size, dtype=np.float32)
+        u, v = (axis.reshape(-1) for axis in np.meshgrid(grid, grid))
+        selected = np.flatnonzero(samples == size)
+        chunk = max(1, MAX_RASTER_SAMPLES // len(u))
+        coverage = empty_density(num_transformations, resolution)
+        for first in range(0, len(selected), chunk):
+            part = selected[first : first + chunk]
+            points = origin[part, :, np.newaxis] + edge_u[part, :, np.newaxis] * u + edge_v[part, :, np.newaxis] * v
+            channel = np.repeat(indices[part], len(u))
+            accumulate_density(coverage, points[:, 0].reshape(-1), points[:, 1].reshape(-1), channel, bounds)
+        counts += np.minimum(coverage, 1)
+
+    return counts
+
+
+def tone_map(counts: NDArrayUInt32, colors: Sequence[str], *, log: bool = True, gamma: float = 2.2) -> NDArrayUInt8:
+    """
+    Blend the per-transformation channels into an (H, W, 3) RGB image. Each pixel takes the count-weighted average of
+    the transformation colors, and its opacity over the background is the log (or linear) density raised to 1 / gamma.
+    """
+    palette = np.array([hex_to_rgb(colors[i % len(colors)]) for i in range(len(counts))], dtype=np.float32)
+    totals = counts.sum(axis=0, dtype=np.float64)
+    peak = totals.max(initial=0)
+
+    if peak == 0:
+        return np.full([*totals.shape, 3], BACKGROUND, dtype=np.uint8)
+
+    if log:
+        alpha = np.log1p(totals) / np.log1p(peak)
+    else:
+        alpha = totals / peak
+    alpha = (alpha ** (1 / gamma)).astype(np.float32)[..., np.newaxis]
+
+    color = np.einsum("chw,cr->hwr", counts.astype(np.float32), palette, optimize=True)
+    color /= np.maximum(totals, 1).astype(np.float32)[..., np.newaxis]
+
+    image = np.array(BACKGROUND, dtype=np.float32) * (1 - alpha) + color * alpha
+    return np.clip(image + 0.5, 0, 255).astype(np.uint8)
+
+
+def coverage_image(counts: NDArrayUInt32, colors: Sequence[str]) -> NDArrayUInt8:
+    """
+    An (H, W, 4) RGBA image of a coverage histogram: covered pixels are opaque and take the count-weighted average of
+    the transformation colors, and uncovered pixels are transparent so that the plot shows through.
+    """
+    palette = np.array([hex_to_rgb(colors[i % len(colors)]) for i in range(len(counts))], dtype=np.float32)
+    totals = counts.sum(axis=0, dtype=np.float64)
+
+    image = np.zeros([*totals.shape, 4], dtype=np.uint8)
+    covered = totals > 0
+    color = np.einsum("cn,cr->nr", counts[:, covered].astype(np.float32), palette, optimize=True)
+    color /= totals[covered].astype(np.float32)[:, np.newaxis]
+    image[covered, :3] = np.clip(color + 0.5, 0, 255).astype(np.uint8)
+    image[covered, 3] = 255
+    return image
+
+
+def encode_png(image: NDArrayUInt8) -> bytes:
+    """Encode an (H, W, 3) RGB or (H, W, 4) RGBA image as a PNG file, writing row 0 first."""
+    height, width, channels = image.shape
+    rows = np.concatenate([np.zeros([height, 1], dtype=np.uint8), image.reshape(height, width * channels)], axis=1)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    color_type = 6 if channels == 4 else 2
+    header = struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(rows.tobytes(), 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+def encode_plot_png(image: NDArrayUInt8) -> bytes:
+    """Encode an image whose row 0 is the bottom of the plot, like a tone-mapped histogram, as a PNG file."""
+    # PNG rows run top to bottom
+    return encode_png(np.flipud(image))
+
+
+def density_trace(image: NDArrayUInt8, bounds: Bounds) -> BaseTraceType:
+    """
+    Wrap a tone-mapped image in a single Image trace. The pixels are sent as a PNG data URI, which Plotly places with
+    row 0 at y0 just like a z array, but is far smaller than the raw channel values.
+    """
+    height, width, _ = image.shape
+    x_min, x_max, y_min, y_max = bounds
+    dx = (x_max - x_min) / width
+    dy = (y_max - y_min) / height
+    source = "data:image/png;base64," + base64.b64encode(encode_png(image)).decode("ascii")
+    # The pinned plotly stubs declare go.Image without shipping its stub file
+    return cast(
+        BaseTraceType,
+        go.Image(  # pyright: ignore [reportUnknownMemberType]
+            source=source, x0=x_min + dx / 2, dx=dx, y0=y_min + dy / 2, dy=dy, hoverinfo="skip"
+        ),
+    )
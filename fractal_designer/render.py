@@ -0,0 +1,332 @@
+"""
+Headless batch renderer. Reads IFS definitions from a JSON or TOML file and writes a PNG image plus raw .npy arrays
+for each one, using the same engines as the interactive designer:
+
+    python -m fractal_designer.render gallery.toml --output renders --jobs 8
+
+A definition file holds a list of fractals, each with a list of transformations:
+
+    [[fractals]]
+    name = "fern"
+    mode = "continuous"
+    iterations = 5_000_000
+    transformations = [
+        { a = 0.0, b = 0.0, c = 0.0, d = 0.16, e = 0.0, f = 0.0, p = 0.01 },
+        { a = 0.85, b = 0.04, c = -0.04, d = 0.85, e = 0.0, f = 1.6, p = 0.85 },
+    ]
+
+Optional keys are resolution ([width, height]), bounds ([x_min, x_max, y_min, y_max]) and seed. Definitions are
+rendered in parallel worker processes, and each worker streams its chaos-game output to disk in fixed-size batches,
+so memory use does not depend on the number of points or fractals. With --dimension, the box-counting dimension of
+each attractor is estimated from a separate streamed chaos game and printed with its summary.
+"""
+
+import argparse
+import json
+import sys
+import tomllib
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Literal, cast
+
+import numpy as np
+import plotly.colors
+
+from fractal_designer.analysis import analyze_system
+from fractal_designer.backends import BACKENDS, DEFAULT_BATCH, get_backend
+from fractal_designer.dimension import DimensionEstimate, estimate_dimension
+from fractal_designer.engine import (
+    DEFAULT_MAX_BYTES,
+    ChaosGame,
+    expand_discrete,
+    stack_transformations,
+)
+from fractal_designer.raster import (
+    Bounds,
+    accumulate_density,
+    empty_density,
+    encode_plot_png,
+    rasterize_parallelograms,
+    square_view,
+    tone_map,
+)
+
+DEFAULT_RESOLUTION = (1000, 1000)
+DIMENSION_POINTS = 5_000_000
+BOUNDS_PADDING = 0.02
+
+SaveKind = Literal["density", "points", "none"]
+
+
+@dataclass(frozen=True)
+class FractalDefinition:
+    name: str
+    mode: str
+    coefficients: tuple[tuple[float, float, float, float, float, float], ...]
+    weights: tuple[float, ...] | None
+    iterations: int
+    resolution: tuple[int, int] = DEFAULT_RESOLUTION
+    bounds: Bounds | None = None
+    seed: int = 0
+
+
+@dataclass(frozen=True)
+class RenderSummary:
+    name: str
+    files: tuple[str, ...]
+    count: int
+    unit: str
+    dimension: DimensionEstimate | None = None
+
+
+def parse_definition(raw: dict[str, Any], position: int) -> FractalDefinition:
+    name = str(raw.get("name", f"fractal_{position}"))
+    mode = raw.get("mode", "continuous")
+    if mode not in ("discrete", "continuous"):
+        raise ValueError(f"{name}: mode must be 'discrete' or 'continuous', not {mode!r}")
+
+    transformations: list[dict[str, float]] = raw.get("transformations", [])
+    if not transformations:
+        raise ValueError(f"{name}: at least one transformation is required")
+
+    try:
+        coefficients = tuple(
+            (
+                float(t["a"]),
+                float(t["b"]),
+                float(t["c"]),
+                float(t["d"]),
+                float(t["e"]),
+                float(t["f"]),
+            )
+            for t in transformations
+        )
+    except KeyError as error:
+        raise ValueError(f"{name}: every transformation needs a, b, c, d, e and f (missing {error})") from None
+
+    weights = None
+    if mode == "continuous":
+        if any("p" not in t for t in transformations):
+            raise ValueError(f"{name}: continuous mode needs a probability p for every transformation")
+        weights = tuple(float(t["p"]) for t in transformations)
+
+    bounds = raw.get("bounds")
+    return FractalDefinition(
+        name=name,
+        mode=mode,
+        coefficients=coefficients,
+        weights=weights,
+        iterations=int(raw.get("iterations", 1_000_000 if mode == "continuous" else 8)),
+        resolution=tuple(raw.get("resolution", DEFAULT_RESOLUTION)),
+        bounds=None if bounds is None else tuple(float(value) for value in bounds),  # pyright: ignore [reportArgumentType]
+        seed=int(raw.get("seed", 0)),
+    )
+
+
+def load_definitions(path: Path) -> list[FractalDefinition]:
+    document: dict[str, Any] | list[dict[str, Any]]
+    if path.suffix == ".toml":
+        with path.open("rb") as file:
+            document = tomllib.load(file)
+    else:
+        with path.open() as file:
+            document = json.load(file)
+
+    fractals: list[dict[str, Any]] = document if isinstance(document, list) else document.get("fractals", [])
+    return [parse_definition(raw, position) for position, raw in enumerate(fractals)]
+
+
+def _create_npy(path: Path, dtype: type[np.generic], shape: tuple[int, ...]) -> np.memmap[Any, np.dtype[Any]]:
+    """A .npy file of the given shape, mapped into memory so that it can be filled one batch at a time."""
+    # numpy ships open_memmap without annotations
+    return cast(
+        np.memmap[Any, np.dtype[Any]],
+        np.lib.format.open_memmap(  # pyright: ignore [reportUnknownMemberType]
+            path, mode="w+", dtype=dtype, shape=shape
+        ),
+    )
+
+
+def estimate_bounds(definition: FractalDefinition) -> Bounds:
+    """The attractor's box from the contractivity analysis, used when a definition does not give bounds."""
+    bounds = analyze_system(definition.coefficients, definition.weights).bounds
+    if bounds is None:
+        raise ValueError(f"{definition.name}: the chaos game diverges, so no bounds can be estimated")
+    return square_view(bounds, BOUNDS_PADDING)
+
+
+def render_definition(
+    definition: FractalDefinition,
+    output: Path,
+    save: SaveKind = "density",
+    batch_size: int = DEFAULT_BATCH,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    backend: str | None = None,
+    dimension: bool = False,
+) -> RenderSummary:
+    output.mkdir(parents=True, exist_ok=True)
+    maps = stack_transformations(definition.coefficients)
+    num_transformations = len(maps)
+    files: list[Path] = []
+
+    def path(suffix: str) -> Path:
+        return output / f"{definition.name}{suffix}"
+
+    if definition.mode == "discrete":
+        result = expand_discrete(maps, definition.iterations, max_bytes=max_bytes, downsample=True)
+        bounds = definition.bounds or square_view(
+            (
+                float(result.polygons[:, 0].min()),
+                float(result.polygons[:, 0].max()),
+                float(result.polygons[:, 1].min()),
+                float(result.polygons[:, 1].max()),
+            ),
+            BOUNDS_PADDING,
+        )
+        counts = rasterize_parallelograms(
+            result.polygons, result.indices, num_transformations, bounds, definition.resolution
+        )
+        if save == "points":
+            np.save(path(".polygons.npy"), result.polygons)
+            np.save(path(".indices.npy"), result.indices)
+            files += [path(".polygons.npy"), path(".indices.npy")]
+        num_points = len(result)
+    else:
+        bounds = definition.bounds or estimate_bounds(definition)
+        burn_in = analyze_system(definition.coefficients, definition.weights).burn_in
+        counts = empty_density(num_transformations, definition.resolution)
+
+        if save != "points":
+            # Without raw points to write, the backend can bin the chaos game without materializing it
+            num_points = get_backend(backend).accumulate_density(
+                counts,
+                maps,
+                definition.weights or (),
+                definition.iterations,
+                bounds,
+                burn_in=burn_in,
+                seed=definition.seed,
+                batch_size=batch_size,
+            )
+        else:
+            game = ChaosGame(maps, definition.weights or (), burn_in=burn_in, seed=definition.seed)
+            points = _create_npy(path(".points.npy"), np.float32, (definition.iterations, 2))
+            indices = _create_npy(path(".indices.npy"), np.int8, (definition.iterations,))
+            files += [path(".points.npy"), path(".indices.npy")]
+
+            while game.num_points < definition.iterations:
+                start = game.num_points
+                batch = game.advance(min(batch_size, definition.iterations - start))
+                accumulate_density(counts, batch.x, batch.y, batch.indices, bounds)
+                points[start : game.num_points, 0] = batch.x
+                points[start : game.num_points, 1] = batch.y
+                indices[start : game.num_points] = batch.indices
+
+            points.flush()
+            indices.flush()
+            num_points = game.num_points
+
+    if save == "density":
+        np.save(path(".density.npy"), counts)
+        files.append(path(".density.npy"))
+
+    image = tone_map(counts, plotly.colors.qualitative.G10, log=definition.mode == "continuous")
+    path(".png").write_bytes(encode_plot_png(image))
+    files.append(path(".png"))
+
+    estimate = None
+    if dimension:
+        # The estimate plays its own chaos game, so it works the same for discrete definitions
+        weights = definition.weights or (1.0,) * num_transformations
+        iterations = definition.iterations if definition.mode == "continuous" else DIMENSION_POINTS
+        estimate = estimate_dimension(maps, weights, iterations, seed=definition.seed, batch_size=batch_size)
+
+    unit = "polygons" if definition.mode == "discrete" else "points"
+    return RenderSummary(definition.name, tuple(str(file) for file in files), num_points, unit, estimate)
+
+
+def render_all(
+    definitions: Iterable[FractalDefinition],
+    output: Path,
+    jobs: int | None = None,
+    save: SaveKind = "density",
+    batch_size: int = DEFAULT_BATCH,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    backend: str | None = None,
+    dimension: bool = False,
+) -> Iterable[RenderSummary]:
+    """Render definitions across worker processes, yielding each summary as soon as its files are written."""
+    definitions = list(definitions)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(
+            render_definition,
+            definitions,
+            [output] * len(definitions),
+            [save] * len(definitions),
+            [batch_size] * len(definitions),
+            [max_bytes] * len(definitions),
+            [backend] * len(definitions),
+            [dimension] * len(definitions),
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m fractal_designer.render", description="Render IFS definitions to PNG and NPY files."
+    )
+    parser.add_argument("definitions", type=Path, help="JSON or TOML file of IFS definitions")
+    parser.add_argument("-o", "--output", type=Path, default=Path("renders"), help="directory for the output files")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument(
+        "--save",
+        choices=("density", "points", "none"),
+        default="density",
+        help="raw array written next to each PNG (default: density)",
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH, help="chaos-game points per batch")
+    parser.add_argument("--max-bytes", type=int, default=DEFAULT_MAX_BYTES, help="memory budget for discrete mode")
+    parser.add_argument(
+        "--backend",
+        choices=("auto", *BACKENDS),
+        default=None,
+        help="compute backend for continuous mode (default: $FRACTAL_DESIGNER_BACKEND, or the fastest available)",
+    )
+    parser.add_argument(
+        "--dimension", action="store_true", help="also estimate the box-counting dimension of each attractor"
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        definitions = load_definitions(args.definitions)
+    except (OSError, ValueError, tomllib.TOMLDecodeError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+
+    # Checked up front, so that one divergent system does not abort a batch after others have been rendered
+    for definition in definitions:
+        analysis = analyze_system(definition.coefficients, definition.weights)
+        problem = analysis.problem()
+        if problem is not None:
+            print(f"error: {definition.name}: {problem}", file=sys.stderr)
+            return 1
+        caveat = analysis.caveat()
+        if caveat is not None:
+            print(f"warning: {definition.name}: {caveat}", file=sys.stderr)
+
+    for summary in render_all(
+        definitions, args.output, args.jobs, args.save, args.batch_size, args.max_bytes, args.backend, args.dimension
+    ):
+        print(f"{summary.name}: {summary.count} {summary.unit} -> {', '.join(summary.files)}")
+        if summary.dimension is not None:
+            low, high = summary.dimension.slope_range
+            print(
+                f"{summary.name}: box-counting dimension {summary.dimension.dimension:.3f} "
+                f"(local slopes {low:.3f} to {high:.3f}, coverage {summary.dimension.coverage:.1%})"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+Builds the Plotly traces shown in the designer from engine results. Kept apart from the Shiny server so that the
+same trace building can be reused by the batch tools and measured on its own.
+"""
+
+from collections.abc import Sequence
+
+import plotly.graph_objects as go
+from plotly.basedatatypes import BaseTraceType
+
+from fractal_designer.engine import ChaosResult, DiscreteResult
+from fractal_designer.lod import LevelOfDetail
+from fractal_designer.raster import Bounds, coverage_image, density, density_trace, tone_map
+from fractal_designer.transport import compact, group_by_index, polygon_path
+
+
+def discrete_traces(result: DiscreteResult, num_transformations: int, colors: Sequence[str]) -> list[go.Scatter]:
+    order, offsets = group_by_index(result.indices, num_transformations)
+    traces: list[go.Scatter] = []
+
+    for i in range(num_transformations):
+        x, y = polygon_path(result.polygons[order[offsets[i] : offsets[i + 1]]])
+        traces.append(
+            go.Scatter(
+                x=x,
+                y=y,
+                fill="toself",
+                fillcolor=colors[i],
+                name=f"Transformation {i}",
+                legendgroup=f"Transformation {i}",
+                line_color=colors[i],
+            )
+        )
+
+    return traces
+
+
+def lod_traces(
+    lod: LevelOfDetail, num_transformations: int, bounds: Bounds, colors: Sequence[str]
+) -> list[BaseTraceType]:
+    """The coverage mask of the rasterized polygons as one image underneath the vector traces of the rest."""
+    traces: list[BaseTraceType] = []
+    if lod.coverage is not None:
+        traces.append(density_trace(coverage_image(lod.coverage, colors), bounds))
+    traces.extend(discrete_traces(lod.polygons, num_transformations, colors))
+    return traces
+
+
+def point_traces(result: ChaosResult, colors: Sequence[str]) -> list[go.Scatter]:
+    num_groups = int(result.indices.max()) + 1 if len(result) else 0
+    order, offsets = group_by_index(result.indices, num_groups)
+    x = compact(result.x)[order]
+    y = compact(result.y)[order]
+
+    return [
+        go.Scatter(
+            x=x[offsets[index] : offsets[index + 1]],
+            y=y[offsets[index] : offsets[index + 1]],
+            marker_color=colors[index],
+            name=f"Transformation {index}",
+            mode="markers",
+        )
+        for index in range(num_groups)
+        if offsets[index + 1] > offsets[index]
+    ]
+
+
+def density_traces(
+    result: ChaosResult,
+    num_transformations: int,
+    bounds: Bounds,
+    resolution: tuple[int, int],
+    colors: Sequence[str],
+) -> list[BaseTraceType]:
+    counts = density(result.x, result.y, result.indices, num_transformations, bounds, resolution)
+    return [density_trace(tone_map(counts, colors), bounds)]
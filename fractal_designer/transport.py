@@ -0,0 +1,51 @@
+"""
+Compact encodings of plot data for the widget comm. Plotly sends one-dimensional numeric NumPy arrays to the browser as
+binary typed arrays instead of JSON text, so traces are built from flat float arrays: polygons are separated by NaN,
+which Plotly treats like None, and points are grouped by transformation with a single stable sort.
+"""
+
+import numpy as np
+
+from fractal_designer.engine import NDArrayCoordinates, NDArrayInt8
+
+NDArrayIntp = np.typing.NDArray[np.intp]
+
+# float32 is used whenever its rounding error stays below 1/4096 of the span of the data, which is finer than a pixel
+FLOAT32_SPAN_BITS = 12
+
+
+def compact(values: NDArrayCoordinates) -> NDArrayCoordinates:
+    """values as float32 when that loses nothing visible, otherwise as float64, for deep zooms far from the origin."""
+    finite = values[np.isfinite(values)]
+    if not finite.size or values.dtype == np.float32:
+        return values.astype(np.float32, copy=False)
+
+    span = float(finite.max() - finite.min())
+    magnitude = float(np.abs(finite).max())
+    if magnitude * 2.0 ** (FLOAT32_SPAN_BITS - np.finfo(np.float32).nmant) <= span:
+        return values.astype(np.float32)
+    return values.astype(np.float64, copy=False)
+
+
+def group_by_index(indices: NDArrayInt8, num_groups: int) -> tuple[NDArrayIntp, NDArrayIntp]:
+    """
+    A permutation that sorts indices by value, and the offsets where each group starts, so that group i is
+    order[offsets[i]:offsets[i + 1]]. The sort is stable, which keeps the original order within a group.
+    """
+    order = np.argsort(indices, kind="stable")
+    counts = np.bincount(indices, minlength=num_groups)[:num_groups]
+    offsets = np.zeros(num_groups + 1, dtype=np.intp)
+    np.cumsum(counts, out=offsets[1:])
+    return order, offsets
+
+
+def polygon_path(polygons: NDArrayCoordinates) -> tuple[NDArrayCoordinates, NDArrayCoordinates]:
+    """Flatten (M, 2, V) polygons into x and y arrays with a NaN between consecutive polygons."""
+    num_polygons, _, num_vertices = polygons.shape
+    if not num_polygons:
+        return np.empty([0], dtype=np.float32), np.empty([0], dtype=np.float32)
+
+    path = np.full([2, num_polygons, num_vertices + 1], np.nan, dtype=polygons.dtype)
+    path[:, :, :num_vertices] = polygons.transpose(1, 0, 2)
+    path = path.reshape(2, -1)[:, :-1]
+    return compact(path[0]), compact(path[1])
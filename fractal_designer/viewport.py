@@ -0,0 +1,297 @@
+"""
+Viewport-aware rendering by pruning the IFS address tree. A node of the tree is a composite map s = w_i1 ∘ ... ∘ w_in
+and its descendants are s ∘ w_k. For a contractive system there is a disc R that contains the base polygon and is
+mapped into itself by every transformation, so everything drawn below node s lies inside s(R). Whole sub-trees can
+therefore be skipped as soon as the bounding box of s(R) misses the viewport, and expansion can stop once that box is
+smaller than a pixel, which keeps the work proportional to what is visible instead of to the depth.
+
+Coordinates are produced in float64 so that deep zooms keep sub-pixel precision.
+"""
+
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+
+import numpy as np
+
+from fractal_designer.engine import (
+    DEFAULT_BURN_IN,
+    DEFAULT_MAX_BYTES,
+    UNIT_SQUARE,
+    ChaosGame,
+    ChaosResult,
+    ComputationCancelled,
+    DiscreteResult,
+    NDArrayFloat32,
+    NDArrayFloat64,
+    NDArrayInt8,
+    expand_discrete,
+    normalize_weights,
+)
+from fractal_designer.raster import Bounds
+
+NDArrayBool = np.typing.NDArray[np.bool_]
+
+# Continuous mode refines cylinders until each covers at most this fraction of the larger side of the view
+CYLINDER_FRACTION = 1 / 16
+MAX_CYLINDERS = 65_536
+MAX_CYLINDER_DEPTH = 64
+MAX_SAMPLING_ROUNDS = 8
+SAMPLE_CHUNK = 1_000_000
+
+
+@dataclass(frozen=True)
+class InvariantBall:
+    center: NDArrayFloat64
+    radius: float
+
+
+@dataclass
+class Nodes:
+    """A level of the address tree: the composite maps x -> linear @ x + translation and the first map of each."""
+
+    linear: NDArrayFloat64
+    translation: NDArrayFloat64
+    labels: NDArrayInt8
+    probabilities: NDArrayFloat64
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def select(self, mask: NDArrayBool | np.typing.NDArray[np.intp]) -> "Nodes":
+        return Nodes(self.linear[mask], self.translation[mask], self.labels[mask], self.probabilities[mask])
+
+    def children(self, maps: NDArrayFloat64, probabilities: NDArrayFloat64, root: bool) -> "Nodes":
+        """Compose every node with every map on the inside, so that child m * k + j is node m ∘ w_j."""
+        num_nodes, num_transformations = len(self), len(maps)
+        linear = np.einsum("mij,kjl->mkil", self.linear, maps[:, :, :2]).reshape(-1, 2, 2)
+        translation = (
+            np.einsum("mij,kj->mki", self.linear, maps[:, :, 2]) + self.translation[:, np.newaxis, :]
+        ).reshape(-1, 2)
+        if root:
+            labels = np.tile(np.arange(num_transformations, dtype=np.int8), num_nodes)
+        else:
+            labels = np.repeat(self.labels, num_transformations)
+        weights = (self.probabilities[:, np.newaxis] * probabilities[np.newaxis, :]).reshape(-1)
+        return Nodes(linear, translation, labels, weights)
+
+    def boxes(self, ball: InvariantBall) -> tuple[NDArrayFloat64, NDArrayFloat64]:
+        """Centers and half extents of the bounding boxes of s(R) for every node s."""
+        centers = self.linear @ ball.center + self.translation
+        half = ball.radius * np.sqrt(np.sum(self.linear**2, axis=2))
+        return centers, half
+
+
+def root() -> Nodes:
+    return Nodes(np.eye(2)[np.newaxis].copy(), np.zeros([1, 2]), np.zeros([1], dtype=np.int8), np.ones([1]))
+
+
+def invariant_ball(maps: NDArrayFloat64, base: NDArrayFloat32 = UNIT_SQUARE) -> InvariantBall | None:
+    """
+    A disc that contains base and is mapped into itself by every transformation, or None when some transformation is
+    not a contraction and no such disc exists.
+    """
+    linear = maps[:, :, :2]
+    translation = maps[:, :, 2]
+    ratios = np.linalg.norm(linear, ord=2, axis=(1, 2))
+    if len(maps) == 0 or np.any(ratios >= 1):
+        return None
+
+    # Fixed points of the maps are points of the attractor, so their mean is a reasonable center
+    fixed = np.linalg.solve(np.eye(2)[np.newaxis] - linear, translation[:, :, np.newaxis])[:, :, 0]
+    center = fixed.mean(axis=0)
+    images: NDArrayFloat64 = np.einsum("kij,j->ki", linear, center) + translation
+    radius = max(
+        float(np.max(np.linalg.norm(images - center, axis=1) / (1 - ratios))),
+        float(np.max(np.linalg.norm(base.T.astype(np.float64) - center, axis=1))),
+    )
+    return InvariantBall(center, radius)
+
+
+def _visible(centers: NDArrayFloat64, half: NDArrayFloat64, bounds: Bounds) -> NDArrayBool:
+    x_min, x_max, y_min, y_max = bounds
+    return (
+        (centers[:, 0] + half[:, 0] >= x_min)
+        & (centers[:, 0] - half[:, 0] <= x_max)
+        & (centers[:, 1] + half[:, 1] >= y_min)
+        & (centers[:, 1] - half[:, 1] <= y_max)
+    )
+
+
+def _polygons(nodes: Nodes, base: NDArrayFloat32) -> NDArrayFloat64:
+    return np.einsum("mij,jv->miv", nodes.linear, base.astype(np.float64)) + nodes.translation[:, :, np.newaxis]
+
+
+def expand_visible(
+    maps: NDArrayFloat64,
+    depth: int,
+    bounds: Bounds,
+    resolution: tuple[int, int],
+    *,
+    base: NDArrayFloat32 = UNIT_SQUARE,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    should_stop: Callable[[], bool] | None = None,
+) -> DiscreteResult:
+    """
+    The polygons of expand_discrete(maps, depth) that can be seen in bounds at the given pixel resolution. Sub-trees
+    outside the view are dropped, and sub-trees smaller than a pixel are drawn as their root polygon. Systems that are
+    not contractive cannot be pruned and fall back to expand_discrete.
+    """
+    ball = invariant_ball(maps, base)
+    if ball is None:
+        return expand_discrete(maps, depth, base=base, max_bytes=max_bytes, downsample=True, should_stop=should_stop)
+
+    num_transformations = len(maps)
+    num_vertices = base.shape[1]
+    x_min, x_max, y_min, y_max = bounds
+    pixel = np.array([(x_max - x_min) / resolution[0], (y_max - y_min) / resolution[1]])
+    # Composite map, label and probability of a node, plus its float64 polygon
+    node_bytes = 6 * 8 + 1 + 8 + 2 * num_vertices * 8
+
+    ones = np.ones(num_transformations)
+    frontier = root()
+    finished: list[Nodes] = []
+    fraction = 1.0
+
+    for level in range(depth):
+        if should_stop is not None and should_stop():
+            raise ComputationCancelled
+        if len(frontier) * (num_transformations + 1) * node_bytes > max_bytes:
+            keep = max(1, max_bytes // ((num_transformations + 1) * node_bytes))
+            fraction *= keep / len(frontier)
+            frontier = frontier.select(np.linspace(0, len(frontier) - 1, keep).astype(np.intp))
+
+        frontier = frontier.children(maps, ones, root=level == 0)
+        centers, half = frontier.boxes(ball)
+        visible = _visible(centers, half, bounds)
+        small = np.all(2 * half < pixel, axis=1)
+
+        finished.append(frontier.select(visible & small))
+        frontier = frontier.select(visible & ~small)
+        if not len(frontier):
+            break
+
+    finished.append(frontier)
+    nodes = [part for part in finished if len(part)]
+    if not nodes:
+        return DiscreteResult(np.empty([0, 2, num_vertices]), np.empty([0], dtype=np.int8), depth, fraction)
+
+    polygons = np.concatenate([_polygons(part, base) for part in nodes])
+    labels = np.concatenate([part.labels for part in nodes])
+    return DiscreteResult(polygons, labels, depth, fraction)
+
+
+def visible_cylinders(
+    maps: NDArrayFloat64, probabilities: NDArrayFloat64, bounds: Bounds, ball: InvariantBall
+) -> Nodes:
+    """
+    Split the attractor into cylinders s(A) that are small compared to the view and keep the ones that can be seen.
+    Cylinders are refined at least once, so that every one of them has a first map to color it by.
+    """
+    x_min, x_max, y_min, y_max = bounds
+    target = max(x_max - x_min, y_max - y_min) * CYLINDER_FRACTION
+
+    frontier = root()
+    finished: list[Nodes] = []
+
+    for level in range(MAX_CYLINDER_DEPTH):
+        frontier = frontier.children(maps, probabilities, root=level == 0)
+        centers, half = frontier.boxes(ball)
+        keep = _visible(centers, half, bounds) & (frontier.probabilities > 0)
+        small = np.all(2 * half <= target, axis=1)
+
+        finished.append(frontier.select(keep & small))
+        frontier = frontier.select(keep & ~small)
+        if not len(frontier) or len(frontier) * len(maps) > MAX_CYLINDERS:
+            break
+
+    finished.append(frontier)
+    return Nodes(
+        np.concatenate([part.linear for part in finished]),
+        np.concatenate([part.translation for part in finished]),
+        np.concatenate([part.labels for part in finished]),
+        np.concatenate([part.probabilities for part in finished]),
+    )
+
+
+class ViewportChaosGame:
+    """
+    Chaos game that only spends samples on the visible part of the attractor. Points of the full attractor are pushed
+    through a visible cylinder chosen with the cylinder's probability, which samples the invariant measure restricted
+    to those cylinders, and points that still land outside the view are discarded. Has the same interface as ChaosGame.
+    """
+
+    def __init__(
+        self,
+        maps: NDArrayFloat64,
+        weights: Sequence[float],
+        bounds: Bounds,
+        *,
+        burn_in: int = DEFAULT_BURN_IN,
+        seed: int | np.random.Generator | None = None,
+    ):
+        self.bounds = bounds
+        self.game = ChaosGame(maps, weights, burn_in=burn_in, seed=seed)
+        self.rng = self.game.rng
+        self.num_points = 0
+
+        ball = invariant_ball(maps)
+        self.cylinders: Nodes | None = None
+        if ball is not None:
+            cylinders = visible_cylinders(maps, normalize_weights(weights, len(maps)), bounds, ball)
+            if cylinders.probabilities.sum() > 0:
+                self.cylinders = cylinders
+                self.cumulative = np.cumsum(cylinders.probabilities) / cylinders.probabilities.sum()
+                self.coefficients = (
+                    cylinders.linear[:, 0, 0],
+                    cylinders.linear[:, 0, 1],
+                    cylinders.translation[:, 0],
+                    cylinders.linear[:, 1, 0],
+                    cylinders.linear[:, 1, 1],
+                    cylinders.translation[:, 1],
+                )
+        self.visible = ball is None or self.cylinders is not None
+        self.acceptance = 1.0
+
+    def _sample(self, num_points: int, should_stop: Callable[[], bool] | None) -> ChaosResult:
+        assert self.cylinders is not None
+        points = self.game.advance(num_points, should_stop)
+        chosen = np.minimum(np.searchsorted(self.cumulative, self.rng.random(num_points)), len(self.cumulative) - 1)
+
+        a, b, e, c, d, f = (coefficient[chosen] for coefficient in self.coefficients)
+        x = points.x.astype(np.float64)
+        y = points.y.astype(np.float64)
+        x, y = a * x + b * y + e, c * x + d * y + f
+
+        x_min, x_max, y_min, y_max = self.bounds
+        inside = (x >= x_min) & (x <= x_max) & (y >= y_min) & (y <= y_max)
+        return ChaosResult(x[inside], y[inside], self.cylinders.labels[chosen[inside]])
+
+    def advance(self, num_points: int, should_stop: Callable[[], bool] | None = None) -> ChaosResult:
+        num_points = max(int(num_points), 0)
+        if self.cylinders is None and not self.visible:
+            # The view misses the attractor, but the batch still counts so that a render cannot stall
+            self.num_points += num_points
+            return ChaosResult(np.empty([0]), np.empty([0]), np.empty([0], dtype=np.int8))
+        if self.cylinders is None:
+            result = self.game.advance(num_points, should_stop)
+            self.num_points += num_points
+            return result
+
+        batches: list[ChaosResult] = []
+        produced = 0
+        rounds = MAX_SAMPLING_ROUNDS + num_points // SAMPLE_CHUNK
+        while produced < num_points and rounds > 0:
+            rounds -= 1
+            wanted = (num_points - produced) / max(self.acceptance, 1 / MAX_SAMPLING_ROUNDS) * 1.1
+            attempt = min(int(wanted) + 1, SAMPLE_CHUNK)
+            batch = self._sample(attempt, should_stop)
+            self.acceptance = max(len(batch), 1) / attempt
+            batches.append(batch)
+            produced += len(batch)
+
+        self.num_points += num_points
+        return ChaosResult(
+            np.concatenate([batch.x for batch in batches], dtype=np.float64)[:num_points],
+            np.concatenate([batch.y for batch in batches], dtype=np.float64)[:num_points],
+            np.concatenate([batch.indices for batch in batches])[:num_points],
+        )
@@ -0,0 +1,15 @@
+import pytest
+
+from fractal_designer.engine import NDArrayFloat64, stack_transformations
+
+from .systems import FERN, SIERPINSKI
+
+
+@pytest.fixture
+def sierpinski() -> NDArrayFloat64:
+    return stack_transformations(SIERPINSKI)
+
+
+@pytest.fixture
+def fern() -> NDArrayFloat64:
+    return stack_transformations(FERN)
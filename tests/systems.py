@@ -0,0 +1,24 @@
+"""IFS used across the tests, with attractors whose shape and dimension are known."""
+
+import numpy as np
+
+from fractal_designer.engine import NDArrayCoordinates, NDArrayFloat64
+
+SIERPINSKI = (
+    (0.5, 0.0, 0.0, 0.5, 0.0, 0.0),
+    (0.5, 0.0, 0.0, 0.5, 0.25, 0.5),
+    (0.5, 0.0, 0.0, 0.5, 0.5, 0.0),
+)
+FERN = (
+    (0.0, 0.0, 0.0, 0.16, 0.0, 0.0),
+    (0.85, 0.04, -0.04, 0.85, 0.0, 1.6),
+    (0.2, -0.26, 0.23, 0.22, 0.0, 1.6),
+    (-0.15, 0.28, 0.26, 0.24, 0.0, 0.44),
+)
+FERN_WEIGHTS = (0.01, 0.85, 0.07, 0.07)
+
+
+def sorted_polygons(polygons: NDArrayCoordinates) -> NDArrayFloat64:
+    """Polygons in a canonical order, so that expansions that visit the tree differently can be compared."""
+    flat = np.round(polygons.reshape(len(polygons), -1).astype(np.float64), 5)
+    return flat[np.lexsort(flat.T[::-1])]
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from fractal_designer.analysis import MAX_BURN_IN, MIN_BURN_IN, analyze_system, norms_and_radii
+
+from .systems import FERN, FERN_WEIGHTS, SIERPINSKI
+
+
+def test_norms_and_radii_match_numpy() -> None:
+    linear = np.random.default_rng(1).normal(size=(200, 2, 2))
+    norms, radii = norms_and_radii(linear)
+    np.testing.assert_allclose(norms, np.linalg.norm(linear, ord=2, axis=(1, 2)), atol=1e-12)
+    np.testing.assert_allclose(radii, np.abs(np.linalg.eigvals(linear)).max(axis=1), atol=1e-12)
+
+
+def test_sierpinski_is_contractive() -> None:
+    analysis = analyze_system(SIERPINSKI)
+    assert analysis.problem() is None
+    assert analysis.contraction == pytest.approx(0.5)
+    np.testing.assert_allclose(analysis.fixed_points, [[0, 0], [0.5, 1], [1, 0]], atol=1e-12)
+    assert analysis.bounds is not None
+    np.testing.assert_allclose(analysis.bounds, (0, 1, 0, 1), atol=1e-5)
+
+
+def test_fern_bounds_contain_its_fixed_points() -> None:
+    analysis = analyze_system(FERN, FERN_WEIGHTS)
+    assert analysis.problem() is None
+    assert analysis.lyapunov is not None and analysis.lyapunov < 0
+    assert MIN_BURN_IN <= analysis.burn_in < MAX_BURN_IN
+    assert analysis.bounds is not None
+    x_min, x_max, y_min, y_max = analysis.bounds
+    for x, y in analysis.fixed_points:
+        assert x_min <= x <= x_max and y_min <= y <= y_max
+
+
+def test_expanding_discrete_system_is_rejected() -> None:
+    expanding = ((1.2, 0.0, 0.0, 1.2, 0.0, 0.0), SIERPINSKI[1])
+    analysis = analyze_system(expanding)
+    problem = analysis.problem()
+    assert problem is not None and "Transformation 0" in problem
+
+
+def test_shear_is_drawn_but_unproven() -> None:
+    # Every power of this shear shrinks in the long run, but none of the first few shrinks distances
+    analysis = analyze_system(((0.9, 2.0, 0.0, 0.9, 0.0, 0.0),))
+    assert analysis.problem() is None
+    assert not analysis.contractive
+    assert analysis.caveat() is not None
+
+
+def test_rotation_is_rejected() -> None:
+    # A rotation neither stretches nor shrinks, so the iterates never settle
+    assert analyze_system(((0.0, -1.0, 1.0, 0.0, 0.0, 0.0),)).problem() is not None
+
+
+def test_chaos_game_only_needs_to_contract_on_average() -> None:
+    expanding = ((1.2, 0.0, 0.0, 1.2, 0.0, 0.0), (0.3, 0.0, 0.0, 0.3, 0.5, 0.0))
+    assert analyze_system(expanding, (0.3, 0.7)).problem() is None
+    assert analyze_system(expanding, (0.9, 0.1)).problem() is not None
+
+
+def test_maps_that_are_never_chosen_are_ignored() -> None:
+    system = ((2.0, 0.0, 0.0, 2.0, 0.0, 0.0), (0.5, 0.0, 0.0, 0.5, 0.5, 0.0))
+    assert analyze_system(system, (0.0, 1.0)).problem() is None
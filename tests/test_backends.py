@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from fractal_designer import backends
+from fractal_designer.backends import NumbaBackend, NumpyBackend, get_backend
+from fractal_designer.engine import NDArrayFloat64
+from fractal_designer.raster import Bounds, empty_density
+
+WEIGHTS = (1 / 3, 1 / 3, 1 / 3)
+
+
+def density_frequencies(backend: NumpyBackend, maps: NDArrayFloat64, bounds: Bounds) -> NDArrayFloat64:
+    counts = empty_density(len(maps), (8, 8))
+    drawn = backend.accumulate_density(counts, maps, WEIGHTS, 30_000, bounds, seed=3)
+    assert drawn == 30_000 and int(counts.sum()) == 30_000
+    return counts / counts.sum()
+
+
+@pytest.mark.parametrize("bounds", [(0.0, 1.0, 0.0, 1.0), (0.25, 0.5, 0.0, 0.25)])
+def test_kernel_matches_numpy(sierpinski: NDArrayFloat64, bounds: Bounds, monkeypatch: pytest.MonkeyPatch) -> None:
+    # The plain Python kernel is what Numba compiles, so this checks the compiled backend without needing Numba
+    monkeypatch.setattr(backends, "_chaos_density", lambda: backends._chaos_density_kernel)  # pyright: ignore [reportPrivateUsage]
+    expected = density_frequencies(NumpyBackend(), sierpinski, bounds)
+    actual = density_frequencies(NumbaBackend(), sierpinski, bounds)
+    # Both sample the same measure with different random numbers, so only the frequencies agree
+    np.testing.assert_array_equal(actual > 0, expected > 0)
+    np.testing.assert_allclose(actual, expected, atol=0.01)
+
+
+def test_missing_numba_falls_back_to_numpy(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(backends, "numba_installed", lambda: False)
+    with pytest.warns(RuntimeWarning, match="numba backend is not installed"):
+        backend = get_backend("numba")
+    assert type(backend) is NumpyBackend
+    assert get_backend("auto").name == "numpy"
@@ -0,0 +1,61 @@
+import numpy as np
+
+from fractal_designer.cache import AttractorCache, attractor_key
+from fractal_designer.engine import ChaosResult
+
+from .systems import SIERPINSKI
+
+
+def entry(num_points: int) -> ChaosResult:
+    """A result of 9 bytes per point: two float32 coordinates and an int8 index."""
+    return ChaosResult(
+        np.zeros(num_points, dtype=np.float32), np.zeros(num_points, dtype=np.float32), np.zeros(num_points, np.int8)
+    )
+
+
+def test_attractor_key_is_stable_under_rounding() -> None:
+    nudged = tuple(tuple(value + 1e-9 for value in row) for row in SIERPINSKI)
+    assert attractor_key("discrete", SIERPINSKI, depth=4) == attractor_key("discrete", nudged, depth=4)
+    assert attractor_key("discrete", [(0.0,) * 6], depth=4) == attractor_key("discrete", [(-0.0,) * 6], depth=4)
+
+
+def test_attractor_key_separates_parameters() -> None:
+    key = attractor_key("continuous", SIERPINSKI, (0.2, 0.3, 0.5), num_points=1000)
+    assert key != attractor_key("continuous", SIERPINSKI, (0.2, 0.3, 0.5), num_points=2000)
+    assert key != attractor_key("continuous", SIERPINSKI, (0.3, 0.2, 0.5), num_points=1000)
+    assert key != attractor_key("density", SIERPINSKI, (0.2, 0.3, 0.5), num_points=1000)
+
+
+def test_cache_evicts_least_recently_used_by_bytes() -> None:
+    cache = AttractorCache(max_bytes=9 * 250)
+    for name in "abc":
+        cache.put(name, entry(100))
+    assert len(cache) == 2 and "a" not in cache
+    assert cache.nbytes == 9 * 200
+
+    # Reading b makes c the least recently used entry
+    assert cache.get("b") is not None
+    cache.put("d", entry(100))
+    assert "b" in cache and "c" not in cache and "d" in cache
+
+
+def test_cache_skips_entries_over_budget() -> None:
+    cache = AttractorCache(max_bytes=100)
+    cache.put("big", entry(100))
+    assert len(cache) == 0 and cache.nbytes == 0
+
+
+def test_get_or_compute_counts_hits_and_freezes_entries() -> None:
+    cache = AttractorCache()
+    calls: list[int] = []
+
+    def compute() -> ChaosResult:
+        calls.append(1)
+        return entry(10)
+
+    first = cache.get_or_compute("key", compute)
+    second = cache.get_or_compute("key", compute)
+    assert first is second and len(calls) == 1
+    assert not first.x.flags.writeable
+    stats = cache.stats()
+    assert (stats.hits, stats.misses) == (1, 1)
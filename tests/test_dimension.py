@@ -0,0 +1,29 @@
+import math
+
+import numpy as np
+import pytest
+
+from fractal_designer.dimension import BoxCounter, estimate_dimension
+from fractal_designer.engine import NDArrayFloat64
+
+
+def test_sierpinski_dimension(sierpinski: NDArrayFloat64) -> None:
+    estimate = estimate_dimension(sierpinski, (1, 1, 1), 1_000_000, seed=0, max_level=9)
+    assert estimate.dimension == pytest.approx(math.log2(3), abs=0.03)
+    low, high = estimate.slope_range
+    assert low < math.log2(3) < high
+    assert estimate.num_outside == 0
+
+
+def test_box_counts_of_a_filled_square() -> None:
+    counter = BoxCounter((0.0, 1.0, 0.0, 1.0), max_level=4)
+    centers = (np.arange(16) + 0.5) / 16
+    x, y = np.meshgrid(centers, centers)
+    counter.update(x.ravel(), y.ravel())
+    np.testing.assert_array_equal(counter.box_counts(), [1, 4, 16, 64, 256])
+
+
+def test_points_outside_are_counted_separately() -> None:
+    counter = BoxCounter((0.0, 1.0, 0.0, 1.0), max_level=3)
+    counter.update(np.array([0.5, 2.0]), np.array([0.5, 0.5]))
+    assert (counter.num_points, counter.num_outside) == (1, 1)
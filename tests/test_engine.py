@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from fractal_designer.engine import (
+    ChaosGame,
+    ComputationCancelled,
+    MemoryBudgetError,
+    NDArrayFloat64,
+    chaos_game,
+    estimate_discrete_bytes,
+    expand_discrete,
+    normalize_weights,
+    stack_transformations,
+)
+from fractal_designer.viewport import expand_visible
+
+from .systems import FERN_WEIGHTS, sorted_polygons
+
+
+def test_stack_transformations_layout() -> None:
+    maps = stack_transformations([(1, 2, 3, 4, 5, 6)])
+    np.testing.assert_array_equal(maps[0], [[1, 2, 5], [3, 4, 6]])
+
+
+def test_normalize_weights_rejects_bad_input() -> None:
+    np.testing.assert_allclose(normalize_weights([1, 3], 2), [0.25, 0.75])
+    with pytest.raises(ValueError):
+        normalize_weights([1, 1], 3)
+    with pytest.raises(ValueError):
+        normalize_weights([-1, 2], 2)
+
+
+def test_chaos_game_is_reproducible(fern: NDArrayFloat64) -> None:
+    first = chaos_game(fern, FERN_WEIGHTS, 10_000, seed=3)
+    second = chaos_game(fern, FERN_WEIGHTS, 10_000, seed=3)
+    assert len(first) == 10_000
+    np.testing.assert_array_equal(first.x, second.x)
+    np.testing.assert_array_equal(first.indices, second.indices)
+
+
+def test_chaos_game_continues_across_batches(sierpinski: NDArrayFloat64) -> None:
+    game = ChaosGame(sierpinski, (1, 1, 1), seed=0)
+    batches = [game.advance(1000) for _ in range(3)]
+    assert game.num_points == 3000
+    for batch in batches:
+        # The Sierpinski triangle lies inside the unit square
+        assert batch.x.min() >= 0 and batch.x.max() <= 1
+        assert batch.y.min() >= 0 and batch.y.max() <= 1
+        assert set(np.unique(batch.indices)) <= {0, 1, 2}
+
+
+def test_chaos_game_stops_when_asked(sierpinski: NDArrayFloat64) -> None:
+    with pytest.raises(ComputationCancelled):
+        ChaosGame(sierpinski, (1, 1, 1), seed=0).advance(10_000, lambda: True)
+
+
+def test_expand_discrete_counts(sierpinski: NDArrayFloat64) -> None:
+    result = expand_discrete(sierpinski, 4)
+    assert len(result) == 3**4
+    assert result.polygons.shape == (81, 2, 4)
+    assert result.fraction == 1.0
+    np.testing.assert_array_equal(result.indices[:3], [0, 1, 2])
+
+
+def test_expand_discrete_memory_budget(sierpinski: NDArrayFloat64) -> None:
+    budget = estimate_discrete_bytes(3, 8) // 10
+    with pytest.raises(MemoryBudgetError):
+        expand_discrete(sierpinski, 8, max_bytes=budget)
+    thinned = expand_discrete(sierpinski, 8, max_bytes=budget, downsample=True)
+    assert len(thinned) < 3**8
+    assert thinned.fraction < 1
+
+
+def test_expand_visible_matches_expand_discrete_on_full_view(sierpinski: NDArrayFloat64) -> None:
+    depth = 5
+    full = expand_discrete(sierpinski, depth)
+    # At a resolution this fine no sub-tree is below a pixel, so nothing is pruned or collapsed
+    visible = expand_visible(sierpinski, depth, (-1.0, 2.0, -1.0, 2.0), (10**6, 10**6))
+    assert visible.fraction == 1.0
+    np.testing.assert_allclose(sorted_polygons(visible.polygons), sorted_polygons(full.polygons), atol=1e-5)
+
+
+def test_expand_visible_prunes_outside_view(sierpinski: NDArrayFloat64) -> None:
+    visible = expand_visible(sierpinski, 6, (0.0, 0.25, 0.0, 0.25), (500, 500))
+    assert 0 < len(visible) < 3**6
+    # Every polygon kept touches the view
+    assert (visible.polygons[:, 0].min(axis=1) <= 0.25).all()
+    assert (visible.polygons[:, 1].min(axis=1) <= 0.25).all()
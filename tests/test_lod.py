@@ -0,0 +1,32 @@
+import numpy as np
+
+from fractal_designer.engine import NDArrayFloat64, expand_discrete, stack_transformations
+from fractal_designer.lod import level_of_detail
+from fractal_designer.raster import rasterize_parallelograms
+
+
+def test_slivers_stay_shapes_at_deep_zoom(fern: NDArrayFloat64) -> None:
+    # The stem map squashes the unit square into a segment that is millions of pixels long at this zoom
+    result = expand_discrete(fern, 6)
+    lod = level_of_detail(result, 4, (-1e-6, 1e-6, 0.01, 0.01 + 2e-6), (500, 500))
+    assert lod.num_rasterized + len(lod.polygons) == len(result)
+    assert len(lod.polygons) > 0
+
+
+def test_tiny_polygons_are_rasterized(sierpinski: NDArrayFloat64) -> None:
+    result = expand_discrete(sierpinski, 8)
+    lod = level_of_detail(result, 3, (0.0, 1.0, 0.0, 1.0), (100, 100))
+    assert lod.num_rasterized == len(result)
+    assert lod.coverage is not None and lod.coverage.any()
+
+
+def test_polygon_larger_than_the_view_covers_it() -> None:
+    square = expand_discrete(stack_transformations([(1, 0, 0, 1, 0, 0)]), 1)
+    coverage = rasterize_parallelograms(square.polygons, square.indices, 1, (0.4, 0.6, 0.4, 0.6), (50, 50))
+    assert np.all(coverage == 1)
+
+
+def test_polygons_outside_the_view_are_skipped() -> None:
+    square = expand_discrete(stack_transformations([(1, 0, 0, 1, 5, 5)]), 1)
+    coverage = rasterize_parallelograms(square.polygons, square.indices, 1, (0.0, 1.0, 0.0, 1.0), (50, 50))
+    assert not coverage.any()
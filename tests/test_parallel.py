@@ -0,0 +1,38 @@
+from collections.abc import Iterator
+
+import numpy as np
+import pytest
+
+from fractal_designer.engine import NDArrayFloat64
+from fractal_designer.parallel import shard_pool, sharded_density, split_points
+
+from .systems import FERN_WEIGHTS
+
+FERN_BOUNDS = (-3.0, 3.0, -0.5, 10.5)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def stop_workers() -> Iterator[None]:
+    yield
+    shard_pool.shutdown()
+
+
+def test_split_points() -> None:
+    assert split_points(10, 3) == [4, 3, 3]
+    assert sum(split_points(1_000_001, 8)) == 1_000_001
+
+
+def test_sharded_density_is_reproducible(fern: NDArrayFloat64) -> None:
+    first = sharded_density(fern, FERN_WEIGHTS, 50_000, FERN_BOUNDS, (64, 64), workers=2, seed=7)
+    second = sharded_density(fern, FERN_WEIGHTS, 50_000, FERN_BOUNDS, (64, 64), workers=2, seed=7)
+    assert first.num_points == 50_000 and first.workers == 2
+    assert first.counts.shape == (4, 64, 64)
+    np.testing.assert_array_equal(first.counts, second.counts)
+    # The bounds hold the whole fern, so every point lands in the grid
+    assert int(first.counts.sum()) == 50_000
+
+
+def test_sharded_density_depends_on_seed(fern: NDArrayFloat64) -> None:
+    first = sharded_density(fern, FERN_WEIGHTS, 20_000, FERN_BOUNDS, (64, 64), workers=2, seed=1)
+    second = sharded_density(fern, FERN_WEIGHTS, 20_000, FERN_BOUNDS, (64, 64), workers=2, seed=2)
+    assert not np.array_equal(first.counts, second.counts)